@@ -1,10 +1,45 @@
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, Response, stream_with_context, g
 import os
-from file_manager import file_manager
+import json
+import time
+from urllib.parse import quote
+from file_manager import file_manager, BATCH_MAX_WORKERS, RANGE_READ_SIZE
+from archiver import stream_archive, archive_filename, ArchiveError, ARCHIVE_FORMATS
+from metrics import Counter, Gauge, Histogram, REGISTRY, CountingIterable
+from profiler import profiler
+from watcher import watcher, WatchError
+import compression
+import queue
 
 app = Flask(__name__)
 
+# Compact JSON in debug mode too, and skip key sorting on large listings
+app.json.compact = True
+app.json.sort_keys = False
+
+# Request and subprocess metrics exposed on /metrics
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time spent handling requests', ['route', 'method'])
+REQUEST_COUNT = Counter('http_requests_total', 'Requests handled', ['route', 'method', 'status'])
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests currently being handled')
+REQUEST_BYTES = Counter('http_request_bytes_total', 'Request body bytes received', ['route'])
+RESPONSE_BYTES = Counter('http_response_bytes_total', 'Response body bytes sent', ['route'])
+COMMAND_DURATION = Histogram('execute_command_duration_seconds', 'Duration of /api/execute commands')
+COMMAND_EXIT_CODES = Counter('execute_command_exit_codes_total', 'Exit codes of /api/execute commands', ['code'])
+WATCH_SUBSCRIPTIONS = Gauge('directory_watch_subscriptions', 'Open /api/watch event streams')
+FS_CALL_DURATION = Histogram('file_manager_call_duration_seconds', 'Duration of FileManager calls', ['method'])
+
+file_manager.observer = lambda method, seconds: FS_CALL_DURATION.observe(seconds, (method,))
+
+# Upper bound on the number of operations accepted by /api/batch
+MAX_BATCH_OPERATIONS = 5000
+
+# Upper bound on the number of paths accepted by /api/sniff
+MAX_SNIFF_PATHS = 1000
+
+# Seconds between keepalive comments on idle /api/watch streams, so closed clients are noticed
+WATCH_KEEPALIVE = 15
+
 # HTML template for the file manager interface
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -16,8 +51,9 @@ HTML_TEMPLATE = '''
         body { font-family: Arial, sans-serif; margin: 20px; }
         .container { max-width: 1200px; margin: 0 auto; }
         .path-bar { background: #f5f5f5; padding: 10px; border-radius: 5px; margin-bottom: 20px; }
-        .file-list { border: 1px solid #ddd; border-radius: 5px; }
+        .file-list { border: 1px solid #ddd; border-radius: 5px; max-height: 600px; overflow-y: auto; }
         .file-item { padding: 10px; border-bottom: 1px solid #eee; display: flex; justify-content: space-between; align-items: center; }
+        .file-list .file-item { height: 60px; box-sizing: border-box; overflow: hidden; white-space: nowrap; }
         .file-item:hover { background: #f9f9f9; }
         .file-name { font-weight: bold; color: #333; cursor: pointer; }
         .file-info { color: #666; font-size: 0.9em; }
@@ -30,6 +66,9 @@ HTML_TEMPLATE = '''
         .btn-secondary { background: #6c757d; color: white; }
         .editor { margin-top: 20px; }
         .editor textarea { width: 100%; height: 400px; font-family: monospace; }
+        .paged-editor { height: 400px; overflow-y: auto; border: 1px solid #ddd; }
+        .paged-editor textarea { display: block; height: auto; border: none; resize: none; overflow: hidden; white-space: pre; margin: 0; }
+        .paged-status { color: #666; font-size: 0.9em; padding: 5px; }
         .hidden { display: none; }
         .toolbar { margin-bottom: 20px; }
         .toolbar button { margin-right: 10px; }
@@ -65,13 +104,14 @@ HTML_TEMPLATE = '''
         }
         .terminal-output { 
             height: 400px; 
-            overflow-y: auto; 
+            overflow: auto; 
             padding: 12px 16px; 
-            white-space: pre-wrap;
+            white-space: pre;
             font-size: 13px;
-            line-height: 1.45;
+            line-height: 19px;
             background: #0d1117;
         }
+        .terminal-output > div > div { width: max-content; min-width: 100%; }
         .terminal-input { 
             display: flex; 
             padding: 12px 16px; 
@@ -99,8 +139,10 @@ HTML_TEMPLATE = '''
             color: #6e7681;
         }
         .terminal-line { 
-            margin-bottom: 2px; 
-            word-wrap: break-word;
+            height: 19px; 
+        }
+        .terminal-muted-line {
+            color: #6e7681;
         }
         .terminal-command-line { 
             color: #58a6ff; 
@@ -140,6 +182,8 @@ HTML_TEMPLATE = '''
             <button class="btn btn-primary" onclick="createFile()">New File</button>
             <button class="btn btn-secondary" onclick="refresh()">Refresh</button>
             <button class="btn btn-secondary" onclick="toggleTerminal()">Terminal</button>
+            <button class="btn btn-secondary" onclick="moveSelected()" id="move-selected-btn" disabled>Move Selected</button>
+            <button class="btn btn-danger" onclick="deleteSelected()" id="delete-selected-btn" disabled>Delete Selected</button>
         </div>
         
         <div class="path-bar">
@@ -154,6 +198,7 @@ HTML_TEMPLATE = '''
         <div class="editor hidden" id="editor">
             <h3>Edit File: <span id="edit-filename"></span></h3>
             <textarea id="file-content"></textarea>
+            <div class="paged-editor hidden" id="paged-content"></div>
             <br>
             <button class="btn btn-primary" onclick="saveFile()">Save</button>
             <button class="btn btn-secondary" onclick="closeEditor()">Cancel</button>
@@ -170,11 +215,7 @@ HTML_TEMPLATE = '''
                     <button class="btn btn-secondary" onclick="toggleTerminal()">✕</button>
                 </div>
             </div>
-            <div class="terminal-output" id="terminal-output">
-                <div class="terminal-line terminal-success-line">Welcome to Replit Shell</div>
-                <div class="terminal-line" style="color: #6e7681;">Type commands to interact with your environment</div>
-                <div class="terminal-line"></div>
-            </div>
+            <div class="terminal-output" id="terminal-output"></div>
             <div class="terminal-input">
                 <span class="terminal-prompt" id="terminal-prompt">~$</span>
                 <input type="text" class="terminal-command" id="terminal-command" placeholder="Type a command..." autocomplete="off">
@@ -183,83 +224,475 @@ HTML_TEMPLATE = '''
     </div>
 
     <script>
+        // Windowed list: only the rows in (or near) the viewport are in the DOM.
+        // Rows must all be rowHeight pixels tall.
+        class VirtualList {
+            constructor(viewport, rowHeight, renderRow) {
+                this.viewport = viewport;
+                this.rowHeight = rowHeight;
+                this.renderRow = renderRow;
+                this.count = 0;
+                this.overscan = 10;
+                this.placeholder = '';
+                this.frame = null;
+                this.window = null;
+                
+                viewport.innerHTML = '';
+                this.spacer = document.createElement('div');
+                this.content = document.createElement('div');
+                this.spacer.appendChild(this.content);
+                viewport.appendChild(this.spacer);
+                viewport.addEventListener('scroll', () => this.schedule());
+                window.addEventListener('resize', () => this.schedule());
+            }
+            
+            setCount(count, placeholder = '') {
+                this.count = count;
+                this.placeholder = placeholder;
+                this.spacer.style.height = count ? `${count * this.rowHeight}px` : '';
+                this.refresh();
+            }
+            
+            // Re-render the visible rows even if the window did not move
+            refresh() {
+                this.window = null;
+                this.schedule();
+            }
+            
+            schedule() {
+                if (this.frame === null) {
+                    this.frame = requestAnimationFrame(() => {
+                        this.frame = null;
+                        this.render();
+                    });
+                }
+            }
+            
+            render() {
+                if (!this.count) {
+                    this.content.style.transform = '';
+                    this.content.innerHTML = this.placeholder;
+                    this.window = null;
+                    return;
+                }
+                const first = Math.max(0, Math.floor(this.viewport.scrollTop / this.rowHeight) - this.overscan);
+                const visible = Math.ceil(this.viewport.clientHeight / this.rowHeight) + 2 * this.overscan;
+                const last = Math.min(this.count, first + visible);
+                const key = `${first}:${last}`;
+                if (key === this.window) return;
+                this.window = key;
+                
+                let html = '';
+                for (let i = first; i < last; i++) {
+                    html += this.renderRow(i);
+                }
+                this.content.style.transform = `translateY(${first * this.rowHeight}px)`;
+                this.content.innerHTML = html;
+            }
+            
+            isAtBottom() {
+                const viewport = this.viewport;
+                return viewport.scrollHeight - viewport.scrollTop - viewport.clientHeight < this.rowHeight;
+            }
+            
+            scrollToBottom() {
+                this.viewport.scrollTop = this.viewport.scrollHeight;
+            }
+        }
+        
+        const FILE_ROW_HEIGHT = 60;
+        let fileList = null;
+        
         let currentPath = '.';
+        let renderedPath = null;
+        let selectedPaths = new Set();
+        // path -> {etag, data} of recent listings, revalidated with If-None-Match
+        const listingCache = new Map();
+        const LISTING_CACHE_SIZE = 50;
+        // Only the fields the list actually shows are requested
+        const LISTING_COLUMNS = ['name', 'type', 'size', 'mtime'];
+        
+        function fetchListing(path) {
+            const cached = listingCache.get(path);
+            const headers = cached ? {'If-None-Match': cached.etag} : {};
+            return fetch(`/api/directory?path=${encodeURIComponent(path)}&format=compact&fields=${LISTING_COLUMNS.join(',')}`, {headers: headers})
+                .then(response => {
+                    if (response.status === 304 && cached) {
+                        return {data: cached.data, unchanged: true};
+                    }
+                    return response.json().then(data => {
+                        const etag = response.headers.get('ETag');
+                        listingCache.delete(path);
+                        if (etag && !data.error) {
+                            listingCache.set(path, {etag: etag, data: data});
+                            if (listingCache.size > LISTING_CACHE_SIZE) {
+                                listingCache.delete(listingCache.keys().next().value);
+                            }
+                        }
+                        return {data: data, unchanged: false};
+                    });
+                });
+        }
         
         function loadDirectory(path = '.') {
             currentPath = path;
             document.getElementById('current-path').textContent = path;
             document.getElementById('up-btn').style.display = path === '.' ? 'none' : 'inline-block';
             
-            fetch('/api/directory', {
+            fetchListing(path)
+            .then(({data, unchanged}) => {
+                // Nothing changed since this listing was rendered; keep the DOM and selection
+                if (unchanged && renderedPath === path) {
+                    return;
+                }
+                renderedPath = path;
+                selectedPaths.clear();
+                updateSelectionButtons();
+                
+                if (data.error) {
+                    currentListing = null;
+                    watchDirectory(null);
+                    showListingMessage(`Error: ${data.error}`);
+                    return;
+                }
+                
+                currentListing = data;
+                renderListing(data);
+                watchDirectory(path);
+            })
+            .catch(error => {
+                renderedPath = null;
+                showListingMessage(`Error: ${error.message}`);
+            });
+        }
+        
+        function getFileList() {
+            if (fileList === null) {
+                fileList = new VirtualList(document.getElementById('file-list'), FILE_ROW_HEIGHT, renderFileRow);
+            }
+            return fileList;
+        }
+        
+        function showListingMessage(message) {
+            getFileList().setCount(0, `<div class="file-item">${message}</div>`);
+        }
+        
+        // A new listing starts at the top; live updates keep the scroll position
+        function renderListing(data, keepScroll = false) {
+            const list = getFileList();
+            if (!keepScroll) {
+                list.viewport.scrollTop = 0;
+            }
+            list.setCount(listingLength(data), '<div class="file-item">Empty directory</div>');
+        }
+        
+        function renderFileRow(index) {
+            const item = listingItem(currentListing, index);
+            const icon = item.type === 'directory' ? '📁' : '📄';
+            const className = item.type === 'directory' ? 'directory' : 'file';
+            const size = item.type === 'file' ? `(${formatSize(item.size)})` : '';
+            
+            return `
+                <div class="file-item">
+                    <input type="checkbox" class="select-item" ${selectedPaths.has(item.path) ? 'checked' : ''} onclick="toggleSelected('${item.path}', this.checked)">
+                    <div style="flex: 1; margin-left: 10px; overflow: hidden;" onclick="${item.type === 'directory' ? `loadDirectory('${item.path}')` : `editFile('${item.path}')`}">
+                        <span class="file-name ${className}">${icon} ${item.name}</span>
+                        <div class="file-info">${item.type} ${size} - Modified: ${new Date(item.modified).toLocaleString()}</div>
+                    </div>
+                    <div class="actions">
+                        ${item.type === 'directory' ? `<button class="btn btn-secondary" onclick="downloadArchive('${item.path}')">Download</button>` : ''}
+                        <button class="btn btn-secondary" onclick="renameItem('${item.path}', '${item.name}')">Rename</button>
+                        <button class="btn btn-danger" onclick="deleteItem('${item.path}')">Delete</button>
+                    </div>
+                </div>
+            `;
+        }
+        
+        // Live updates: the server pushes changes to the displayed directory over SSE
+        let currentListing = null;
+        let watchSource = null;
+        let watchedPath = null;
+        
+        function watchDirectory(path) {
+            if (!window.EventSource || watchedPath === path) return;
+            if (watchSource) {
+                watchSource.close();
+                watchSource = null;
+            }
+            watchedPath = path;
+            if (path === null) return;
+            
+            watchSource = new EventSource(`/api/watch?path=${encodeURIComponent(path)}`);
+            // Subscribed (or reconnected): revalidate to pick up anything missed meanwhile
+            watchSource.addEventListener('ready', () => {
+                if (currentPath === path) refresh();
+            });
+            watchSource.onmessage = event => applyWatchEvent(JSON.parse(event.data));
+        }
+        
+        function applyWatchEvent(event) {
+            if (event.path !== currentPath || !currentListing) return;
+            // The cached ETag no longer describes the listing
+            listingCache.delete(event.path);
+            if (event.resync) {
+                refresh();
+                return;
+            }
+            
+            const columns = currentListing.columns;
+            const prefix = currentListing.path.endsWith('/') ? currentListing.path : currentListing.path + '/';
+            event.changes.forEach(change => {
+                // Names are kept sorted, so find the slot by binary search
+                let low = 0, high = columns.name.length;
+                while (low < high) {
+                    const mid = (low + high) >> 1;
+                    if (columns.name[mid] < change.name) low = mid + 1; else high = mid;
+                }
+                const exists = columns.name[low] === change.name;
+                
+                if (change.op === 'remove') {
+                    if (exists) LISTING_COLUMNS.forEach(key => columns[key].splice(low, 1));
+                    selectedPaths.delete(prefix + change.name);
+                } else if (exists) {
+                    LISTING_COLUMNS.forEach(key => { columns[key][low] = change[key]; });
+                } else {
+                    LISTING_COLUMNS.forEach(key => columns[key].splice(low, 0, change[key]));
+                }
+            });
+            updateSelectionButtons();
+            renderListing(currentListing, true);
+        }
+        
+        function listingLength(data) {
+            return data.format === 'compact' ? data.columns.name.length : data.items.length;
+        }
+        
+        // Build the item object for one row, expanding compact (columnar) listings on demand
+        function listingItem(data, index) {
+            if (data.format !== 'compact') return data.items[index];
+            const columns = data.columns;
+            const name = columns.name[index];
+            const prefix = data.path.endsWith('/') ? data.path : data.path + '/';
+            return {
+                name: name,
+                path: prefix + name,
+                type: columns.type[index] === 'd' ? 'directory' : 'file',
+                size: columns.size[index],
+                modified: columns.mtime[index] * 1000
+            };
+        }
+        
+        let editorState = null;
+        
+        function splitLines(text) {
+            return text.match(/[^\\n]*\\n|[^\\n]+$/g) || [];
+        }
+        
+        // Single changed line range between two texts, or null if they are equal
+        function computeLineChange(oldText, newText) {
+            const oldLines = splitLines(oldText);
+            const newLines = splitLines(newText);
+            let prefix = 0;
+            while (prefix < oldLines.length && prefix < newLines.length && oldLines[prefix] === newLines[prefix]) {
+                prefix++;
+            }
+            let suffix = 0;
+            while (suffix < oldLines.length - prefix && suffix < newLines.length - prefix &&
+                   oldLines[oldLines.length - 1 - suffix] === newLines[newLines.length - 1 - suffix]) {
+                suffix++;
+            }
+            if (prefix === oldLines.length && prefix === newLines.length) {
+                return null;
+            }
+            return {
+                start: prefix,
+                end: oldLines.length - suffix,
+                content: newLines.slice(prefix, newLines.length - suffix).join('')
+            };
+        }
+        
+        function editFile(filePath) {
+            fetch('/api/file/read', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({path: path})
+                body: JSON.stringify({path: filePath})
             })
             .then(response => response.json())
             .then(data => {
+                if (data.too_large) {
+                    openPagedEditor(filePath);
+                    return;
+                }
                 if (data.error) {
-                    document.getElementById('file-list').innerHTML = `<div class="file-item">Error: ${data.error}</div>`;
+                    alert('Error: ' + data.error);
                     return;
                 }
                 
-                let html = '';
-                data.items.forEach(item => {
-                    const icon = item.type === 'directory' ? '📁' : '📄';
-                    const className = item.type === 'directory' ? 'directory' : 'file';
-                    const size = item.type === 'file' ? `(${formatSize(item.size)})` : '';
-                    
-                    html += `
-                        <div class="file-item">
-                            <div onclick="${item.type === 'directory' ? `loadDirectory('${item.path}')` : `editFile('${item.path}')`}">
-                                <span class="file-name ${className}">${icon} ${item.name}</span>
-                                <div class="file-info">${item.type} ${size} - Modified: ${new Date(item.modified).toLocaleString()}</div>
-                            </div>
-                            <div class="actions">
-                                <button class="btn btn-secondary" onclick="renameItem('${item.path}', '${item.name}')">Rename</button>
-                                <button class="btn btn-danger" onclick="deleteItem('${item.path}')">Delete</button>
-                            </div>
-                        </div>
-                    `;
-                });
+                editorState = {path: filePath, content: data.content, sha256: data.sha256};
+                showEditor(filePath, false);
+                document.getElementById('file-content').value = data.content;
+            });
+        }
+        
+        function showEditor(filePath, paged) {
+            document.getElementById('edit-filename').textContent = filePath;
+            document.getElementById('file-content').classList.toggle('hidden', paged);
+            document.getElementById('paged-content').classList.toggle('hidden', !paged);
+            document.getElementById('editor').classList.remove('hidden');
+        }
+        
+        // Paged editor for files too large to load at once: windows of whole lines are
+        // fetched from /api/file/range as the user scrolls, and only edited windows are saved
+        const PAGED_WINDOW_SIZE = 256 * 1024;
+        const utf8 = new TextEncoder();
+        
+        function openPagedEditor(filePath) {
+            const container = document.getElementById('paged-content');
+            container.innerHTML = '<div class="paged-status" id="paged-status"></div>';
+            container.onscroll = () => {
+                if (container.scrollTop + container.clientHeight > container.scrollHeight - 200) {
+                    loadNextWindow();
+                }
+            };
+            editorState = {path: filePath, paged: true, version: null, windows: [], nextOffset: 0, eof: false, loading: false};
+            showEditor(filePath, true);
+            loadNextWindow();
+        }
+        
+        function loadNextWindow() {
+            const state = editorState;
+            if (!state || !state.paged || state.eof || state.loading) return;
+            state.loading = true;
+            
+            const params = new URLSearchParams({path: state.path, offset: state.nextOffset, length: PAGED_WINDOW_SIZE});
+            fetch(`/api/file/range?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                state.loading = false;
+                if (editorState !== state) return;
+                if (data.error) {
+                    alert('Error: ' + data.error);
+                    return;
+                }
+                if (state.version && data.version !== state.version) {
+                    if (confirm('The file changed on disk while it was open. Reload it?')) {
+                        openPagedEditor(state.path);
+                    }
+                    return;
+                }
+                
+                state.version = data.version;
+                const textarea = document.createElement('textarea');
+                textarea.value = data.content;
+                textarea.rows = Math.max(1, data.content.split('\\n').length - (data.content.endsWith('\\n') ? 1 : 0));
+                const container = document.getElementById('paged-content');
+                container.insertBefore(textarea, document.getElementById('paged-status'));
+                // Compare against the value as the textarea normalized it (CRLF becomes LF)
+                state.windows.push({offset: data.offset, length: data.length, newline: data.newline,
+                                    original: textarea.value, textarea: textarea});
+                state.nextOffset = data.next_offset;
+                state.eof = data.eof;
+                document.getElementById('paged-status').textContent =
+                    `${formatSize(state.nextOffset)} of ${formatSize(data.size)} loaded` + (state.eof ? '' : ' - scroll for more');
                 
-                document.getElementById('file-list').innerHTML = html || '<div class="file-item">Empty directory</div>';
+                // Keep loading until the view is filled
+                if (!state.eof && container.scrollHeight <= container.clientHeight) {
+                    loadNextWindow();
+                }
             })
             .catch(error => {
-                document.getElementById('file-list').innerHTML = `<div class="file-item">Error: ${error.message}</div>`;
+                state.loading = false;
+                alert('Error: ' + error.message);
             });
         }
         
-        function editFile(filePath) {
-            fetch('/api/file/read', {
+        function savePagedFile() {
+            const state = editorState;
+            const edited = state.windows.filter(w => w.textarea.value !== w.original);
+            if (!edited.length) {
+                closeEditor();
+                return;
+            }
+            
+            const contents = new Map(edited.map(w => [w, w.newline === '\\r\\n' ? w.textarea.value.replace(/\\n/g, '\\r\\n') : w.textarea.value]));
+            fetch('/api/file/ranges', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({path: filePath})
+                body: JSON.stringify({
+                    path: state.path,
+                    version: state.version,
+                    ranges: edited.map(w => ({offset: w.offset, length: w.length, content: contents.get(w)}))
+                })
             })
             .then(response => response.json())
             .then(data => {
+                if (data.conflict) {
+                    if (confirm('The file was changed by someone else since it was opened. Reload it? Unsaved edits will be lost.')) {
+                        openPagedEditor(state.path);
+                    }
+                    return;
+                }
                 if (data.error) {
                     alert('Error: ' + data.error);
                     return;
                 }
                 
-                document.getElementById('edit-filename').textContent = filePath;
-                document.getElementById('file-content').value = data.content;
-                document.getElementById('editor').classList.remove('hidden');
+                // Later windows move by however much the edited ones grew or shrank
+                let delta = 0;
+                state.windows.forEach(w => {
+                    w.offset += delta;
+                    if (contents.has(w)) {
+                        const length = utf8.encode(contents.get(w)).length;
+                        delta += length - w.length;
+                        w.length = length;
+                        w.original = w.textarea.value;
+                    }
+                });
+                state.nextOffset += delta;
+                state.version = data.version;
+                alert('File saved successfully');
+                refresh();
             });
         }
         
         function saveFile() {
+            if (editorState && editorState.paged) {
+                savePagedFile();
+                return;
+            }
             const filePath = document.getElementById('edit-filename').textContent;
             const content = document.getElementById('file-content').value;
             
-            fetch('/api/file/write', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({path: filePath, content: content})
-            })
+            // Send only the changed line range when we know what the file looked like
+            let request;
+            if (editorState && editorState.path === filePath && editorState.sha256) {
+                const change = computeLineChange(editorState.content, content);
+                if (!change) {
+                    closeEditor();
+                    return;
+                }
+                request = fetch('/api/file/patch', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({path: filePath, base_sha256: editorState.sha256, changes: [change]})
+                });
+            } else {
+                request = fetch('/api/file/write', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({path: filePath, content: content})
+                });
+            }
+            
+            request
             .then(response => response.json())
             .then(data => {
-                if (data.error) {
+                if (data.conflict) {
+                    if (confirm('The file was changed by someone else since it was opened. Overwrite it?')) {
+                        editorState = null;
+                        saveFile();
+                    }
+                } else if (data.error) {
                     alert('Error: ' + data.error);
                 } else {
                     alert('File saved successfully');
@@ -270,6 +703,8 @@ HTML_TEMPLATE = '''
         }
         
         function closeEditor() {
+            editorState = null;
+            document.getElementById('paged-content').innerHTML = '';
             document.getElementById('editor').classList.add('hidden');
         }
         
@@ -291,6 +726,65 @@ HTML_TEMPLATE = '''
             }
         }
         
+        function downloadArchive(path) {
+            const format = prompt('Archive format (zip, tar, tar.gz, tar.zst):', 'zip');
+            if (format) {
+                window.location = `/api/download/archive?path=${encodeURIComponent(path)}&format=${encodeURIComponent(format)}`;
+            }
+        }
+        
+        function toggleSelected(path, checked) {
+            if (checked) {
+                selectedPaths.add(path);
+            } else {
+                selectedPaths.delete(path);
+            }
+            updateSelectionButtons();
+        }
+        
+        function updateSelectionButtons() {
+            const disabled = selectedPaths.size === 0;
+            document.getElementById('delete-selected-btn').disabled = disabled;
+            document.getElementById('move-selected-btn').disabled = disabled;
+        }
+        
+        function runBatch(operations) {
+            return fetch('/api/batch', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({operations: operations})
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    alert('Error: ' + data.error);
+                    return;
+                }
+                const failures = data.results
+                    .map((result, index) => result.error ? `${operations[index].path || operations[index].source}: ${result.error}` : null)
+                    .filter(message => message);
+                if (failures.length) {
+                    alert(`${failures.length} of ${operations.length} operations failed:\\n` + failures.slice(0, 20).join('\\n'));
+                }
+                refresh();
+            });
+        }
+        
+        function deleteSelected() {
+            const paths = Array.from(selectedPaths);
+            if (paths.length && confirm(`Are you sure you want to delete ${paths.length} item(s)?`)) {
+                runBatch(paths.map(path => ({op: 'delete', path: path})));
+            }
+        }
+        
+        function moveSelected() {
+            const paths = Array.from(selectedPaths);
+            const destination = paths.length && prompt('Move selected items to directory:', currentPath);
+            if (destination) {
+                runBatch(paths.map(path => ({op: 'move', source: path, destination: destination})));
+            }
+        }
+        
         function renameItem(path, currentName) {
             const newName = prompt('Enter new name:', currentName);
             if (newName && newName !== currentName) {
@@ -373,6 +867,9 @@ HTML_TEMPLATE = '''
             
             if (isHidden) {
                 terminal.classList.remove('hidden');
+                // Rows could not be measured while hidden
+                terminalList.refresh();
+                terminalList.scrollToBottom();
                 document.getElementById('terminal-command').focus();
             } else {
                 terminal.classList.add('hidden');
@@ -383,31 +880,43 @@ HTML_TEMPLATE = '''
         let historyIndex = -1;
         let currentWorkingDir = '.';
         
+        // Scrollback is kept as pre-formatted HTML rows, capped at TERMINAL_MAX_LINES
+        const TERMINAL_ROW_HEIGHT = 19;
+        const TERMINAL_MAX_LINES = 5000;
+        let terminalLines = [];
+        let terminalList = null;
+        
+        function escapeHtml(text) {
+            return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+                .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+        }
+        
         function addTerminalLine(content, type = 'output') {
-            const output = document.getElementById('terminal-output');
-            const line = document.createElement('div');
-            line.className = `terminal-line terminal-${type}-line`;
+            const atBottom = terminalList.isAtBottom();
+            const className = `terminal-line terminal-${type}-line`;
             
-            // Handle special formatting for different content types
-            if (type === 'output' && content) {
-                // Color directories, files, etc.
-                const formattedContent = formatTerminalOutput(content);
-                line.innerHTML = formattedContent;
-            } else {
-                line.textContent = content;
+            // Only the newly arrived lines are formatted, once
+            String(content).replace(/\\n$/, '').split('\\n').forEach(text => {
+                const html = type === 'output' ? formatTerminalOutput(text) : escapeHtml(text);
+                terminalLines.push(`<div class="${className}">${html}</div>`);
+            });
+            if (terminalLines.length > TERMINAL_MAX_LINES) {
+                terminalLines.splice(0, terminalLines.length - TERMINAL_MAX_LINES);
             }
             
-            output.appendChild(line);
-            output.scrollTop = output.scrollHeight;
+            terminalList.setCount(terminalLines.length);
+            if (atBottom) {
+                terminalList.scrollToBottom();
+            }
         }
         
-        function formatTerminalOutput(content) {
-            // Simple formatting for common outputs
-            return content
-                .replace(/^d[rwx-]{9}/gm, '<span class="terminal-directory">$&</span>')
-                .replace(/^-[rwx-]{9}/gm, '<span class="terminal-file">$&</span>')
-                .replace(/\b([a-zA-Z_][a-zA-Z0-9_]*\.py)\b/g, '<span class="terminal-file">$1</span>')
-                .replace(/\b([a-zA-Z_][a-zA-Z0-9_]*\/)\b/g, '<span class="terminal-directory">$1</span>');
+        function formatTerminalOutput(line) {
+            // Simple formatting for common outputs, applied to one line
+            return escapeHtml(line)
+                .replace(/^d[rwx-]{9}/, '<span class="terminal-directory">$&</span>')
+                .replace(/^-[rwx-]{9}/, '<span class="terminal-file">$&</span>')
+                .replace(/\\b([a-zA-Z_][a-zA-Z0-9_]*\\.py)\\b/g, '<span class="terminal-file">$1</span>')
+                .replace(/\\b([a-zA-Z_][a-zA-Z0-9_]*\\/)(?=\\s|$)/g, '<span class="terminal-directory">$1</span>');
         }
         
         function updateTerminalPrompt() {
@@ -492,11 +1001,6 @@ HTML_TEMPLATE = '''
                 } else if (data.output) {
                     currentWorkingDir = data.output.trim();
                     updateTerminalPrompt();
-                    // Also update the file manager if we're in the same directory
-                    if (currentWorkingDir === currentPath || 
-                        (currentWorkingDir.endsWith(currentPath) && currentPath !== '.')) {
-                        refresh();
-                    }
                 }
             })
             .catch(error => {
@@ -505,7 +1009,8 @@ HTML_TEMPLATE = '''
         }
         
         function clearTerminal() {
-            document.getElementById('terminal-output').innerHTML = '';
+            terminalLines = [];
+            terminalList.setCount(0);
         }
         
         // Terminal command input handler
@@ -561,6 +1066,11 @@ HTML_TEMPLATE = '''
             }
             
             // Initialize terminal
+            terminalList = new VirtualList(document.getElementById('terminal-output'), TERMINAL_ROW_HEIGHT,
+                index => terminalLines[index]);
+            addTerminalLine('Welcome to Replit Shell', 'success');
+            addTerminalLine('Type commands to interact with your environment', 'muted');
+            addTerminalLine('', 'output');
             updateTerminalPrompt();
         });
         
@@ -571,26 +1081,194 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
+def _route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    profiler.start(f'{request.method} {_route_label()}')
+    if request.content_length:
+        REQUEST_BYTES.inc(request.content_length, (_route_label(),))
+
+@app.after_request
+def record_request_metrics(response):
+    route = _route_label()
+    REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_start, (route, request.method))
+    REQUEST_COUNT.inc(1, (route, request.method, str(response.status_code)))
+    
+    # Streamed bodies are counted as they are sent, and stay in flight until they finish
+    if response.is_streamed:
+        def finished(total):
+            RESPONSE_BYTES.inc(total, (route,))
+            REQUESTS_IN_FLIGHT.dec()
+        
+        g.metrics_streamed = True
+        response.response = CountingIterable(response.response, finished)
+    elif response.content_length:
+        RESPONSE_BYTES.inc(response.content_length, (route,))
+    return response
+
+# Registered after the metrics hook so it runs first and byte counts reflect the compressed body
+@app.after_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or not compression.is_compressible(response.mimetype)):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(compression.ENCODINGS)
+    if not encoding:
+        return response
+    
+    with profiler.phase('compress'):
+        if response.is_streamed:
+            response.response = compression.CompressedStream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < compression.MIN_SIZE:
+                return response
+            response.set_data(compression.compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # Each encoding is a distinct representation, so it needs its own strong ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'metrics_start' in g and not g.get('metrics_streamed'):
+        REQUESTS_IN_FLIGHT.dec()
+    profiler.finish(path=request.path)
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profiler', methods=['GET', 'POST'])
+def profiler_admin():
+    if request.method == 'POST':
+        data = request.get_json()
+        try:
+            profiler.configure(
+                enabled=data.get('enabled'),
+                sample_rate=data.get('sample_rate'),
+                max_slow=data.get('max_slow')
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)})
+        if data.get('reset'):
+            profiler.reset()
+    
+    limit = request.args.get('limit', type=int)
+    return jsonify(dict(profiler.status(), slowest=profiler.slowest(limit)))
+
+@app.route('/api/admin/profiler/flamegraph')
+def profiler_flamegraph():
+    # Collapsed stacks, as consumed by flamegraph.pl or speedscope
+    return Response(profiler.collapsed_stacks(), mimetype='text/plain')
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    with profiler.phase('template'):
+        return render_template_string(HTML_TEMPLATE)
+
+def _request_params():
+    """Read parameters from the query string for GET and the JSON body otherwise"""
+    if request.method == 'GET':
+        return request.args
+    return request.get_json()
+
+def _matching_etag(etag):
+    """Find which representation of etag (plain or compressed) If-None-Match names, if any"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    for candidate in [etag] + [f'{etag}-{encoding}' for encoding in compression.ENCODINGS]:
+        if if_none_match.contains(candidate):
+            return candidate
+    return None
+
+def _conditional_json(etag, build):
+    """Answer GET requests with 304 while the ETag still matches, otherwise jsonify build()"""
+    matched = _matching_etag(etag) if request.method == 'GET' and etag else None
+    if matched:
+        response = Response(status=304)
+        response.set_etag(matched)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    result = build()
+    with profiler.phase('serialize'):
+        response = jsonify(result)
+    if request.method == 'GET' and etag and 'error' not in result:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/api/directory', methods=['POST'])
+@app.route('/api/directory', methods=['GET', 'POST'])
 def get_directory():
-    data = request.get_json()
+    data = _request_params()
     path = data.get('path', '.')
-    result = file_manager.get_directory_contents(path)
-    return jsonify(result)
+    compact = data.get('format') == 'compact'
+    fields = data.get('fields')
+    etag = file_manager.get_etag(path, 'directory') if request.method == 'GET' else None
+    return _conditional_json(etag, lambda: file_manager.get_directory_contents(path, compact=compact, fields=fields))
 
-@app.route('/api/file/read', methods=['POST'])
-def read_file():
+@app.route('/api/sniff', methods=['POST'])
+def sniff_types():
     data = request.get_json()
+    paths = data.get('paths')
+    if not isinstance(paths, list) or not paths:
+        return jsonify({'error': 'paths must be a non-empty list'})
+    if len(paths) > MAX_SNIFF_PATHS:
+        return jsonify({'error': f'Too many paths (limit {MAX_SNIFF_PATHS})'})
+    if not all(isinstance(path, str) for path in paths):
+        return jsonify({'error': 'paths must be strings'}), 400
+    
+    result = file_manager.sniff_types(paths)
+    with profiler.phase('serialize'):
+        return jsonify(result)
+
+@app.route('/api/watch', methods=['GET'])
+def watch_directory():
+    path = request.args.get('path', '.')
+    try:
+        subscription = watcher.subscribe(path)
+    except WatchError as e:
+        return jsonify({'error': str(e)})
+    
+    def events():
+        WATCH_SUBSCRIPTIONS.inc()
+        try:
+            # Sent once subscribed; clients revalidate their listing to cover changes made before this
+            yield 'event: ready\ndata: {}\n\n'
+            while True:
+                try:
+                    event = subscription.get(timeout=WATCH_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {json.dumps(event)}\n\n'
+        finally:
+            watcher.unsubscribe(subscription)
+            WATCH_SUBSCRIPTIONS.dec()
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/file/read', methods=['GET', 'POST'])
+def read_file():
+    data = _request_params()
     path = data.get('path')
     if not path:
         return jsonify({'error': 'Path is required'})
     
-    result = file_manager.read_file(path)
-    return jsonify(result)
+    etag = file_manager.get_etag(path, 'file') if request.method == 'GET' else None
+    return _conditional_json(etag, lambda: file_manager.read_file(path))
 
 @app.route('/api/file/write', methods=['POST'])
 def write_file():
@@ -601,7 +1279,52 @@ def write_file():
     if not path:
         return jsonify({'error': 'Path is required'})
     
-    result = file_manager.write_file(path, content)
+    result = file_manager.write_file(path, content, data.get('fsync'))
+    return jsonify(result)
+
+@app.route('/api/file/patch', methods=['POST'])
+def patch_file():
+    data = request.get_json()
+    path = data.get('path')
+    base_sha256 = data.get('base_sha256')
+    
+    if not path or not base_sha256:
+        return jsonify({'error': 'Path and base_sha256 are required'})
+    
+    result = file_manager.patch_file(
+        path,
+        base_sha256,
+        changes=data.get('changes'),
+        diff=data.get('diff'),
+        fsync=data.get('fsync')
+    )
+    return jsonify(result)
+
+@app.route('/api/file/range', methods=['GET'])
+def read_file_range():
+    path = request.args.get('path')
+    if not path:
+        return jsonify({'error': 'Path is required'})
+    
+    result = file_manager.read_range(
+        path,
+        offset=request.args.get('offset', 0),
+        length=request.args.get('length', RANGE_READ_SIZE)
+    )
+    with profiler.phase('serialize'):
+        return jsonify(result)
+
+@app.route('/api/file/ranges', methods=['POST'])
+def write_file_ranges():
+    data = request.get_json()
+    path = data.get('path')
+    version = data.get('version')
+    ranges = data.get('ranges')
+    
+    if not path or not version or not isinstance(ranges, list):
+        return jsonify({'error': 'Path, version and a list of ranges are required'})
+    
+    result = file_manager.write_ranges(path, version, ranges, fsync=data.get('fsync'))
     return jsonify(result)
 
 @app.route('/api/directory/create', methods=['POST'])
@@ -662,15 +1385,170 @@ def copy_item():
     result = file_manager.copy_item(source, destination)
     return jsonify(result)
 
-@app.route('/api/tree', methods=['POST'])
-def get_file_tree():
+@app.route('/api/batch', methods=['POST'])
+def batch_operations():
+    data = request.get_json()
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Operations list is required'})
+    
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'Too many operations (max {MAX_BATCH_OPERATIONS})'})
+    
+    try:
+        max_workers = max(1, min(int(data.get('max_workers', BATCH_MAX_WORKERS)), BATCH_MAX_WORKERS))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_workers must be an integer'})
+    
+    # Streaming mode emits one JSON line per operation as soon as it finishes
+    if data.get('stream'):
+        def generate():
+            for index, result in file_manager.run_batch(operations, max_workers):
+                yield json.dumps({'index': index, 'result': result}) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    results = [None] * len(operations)
+    for index, result in file_manager.run_batch(operations, max_workers):
+        results[index] = result
+    
+    failed = sum(1 for result in results if 'error' in result)
+    return jsonify({
+        'results': results,
+        'succeeded': len(results) - failed,
+        'failed': failed
+    })
+
+@app.route('/api/hash', methods=['POST'])
+def hash_file():
+    data = request.get_json()
+    path = data.get('path')
+    algorithm = data.get('algorithm', 'sha256')
+    
+    if not path:
+        return jsonify({'error': 'Path is required'})
+    
+    result = file_manager.hash_file(path, algorithm)
+    return jsonify(result)
+
+@app.route('/api/hash/directory', methods=['POST'])
+def hash_directory():
+    data = request.get_json()
+    path = data.get('path')
+    algorithm = data.get('algorithm', 'sha256')
+    
+    if not path:
+        return jsonify({'error': 'Path is required'})
+    
+    result = file_manager.hash_directory(
+        path,
+        algorithm,
+        recursive=data.get('recursive', True),
+        include_hidden=data.get('include_hidden', True)
+    )
+    
+    # Manifest mode returns text in the format understood by `sha256sum -c` and friends
+    if data.get('manifest') and 'error' not in result:
+        lines = [f"{item['digest']}  {item['relative_path']}\n" for item in result['files']]
+        return Response(''.join(lines), mimetype='text/plain')
+    
+    return jsonify(result)
+
+@app.route('/api/duplicates', methods=['POST'])
+def find_duplicates():
     data = request.get_json()
     path = data.get('path', '.')
-    max_depth = data.get('max_depth', 3)
     
-    result = file_manager.get_file_tree(path, max_depth)
+    try:
+        min_size = int(data.get('min_size', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'min_size must be an integer'})
+    
+    result = file_manager.start_duplicate_scan(
+        path,
+        min_size=min_size,
+        algorithm=data.get('algorithm', 'sha256'),
+        include_hidden=data.get('include_hidden', True)
+    )
+    if 'error' in result or not data.get('stream'):
+        return jsonify(result)
+    
+    # Streaming mode follows the job and emits each duplicate group as it is found
+    job_id = result['job_id']
+    
+    def generate():
+        since = 0
+        while True:
+            status = file_manager.get_job(job_id, since)
+            for group in status['groups']:
+                yield json.dumps({'job_id': job_id, 'group': group}) + '\n'
+            since = status['next']
+            if status['status'] != 'running':
+                yield json.dumps({'job_id': job_id, 'status': status['status'], 'stats': status['stats'],
+                                  'error': status['error']}) + '\n'
+                return
+            time.sleep(0.2)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/duplicates/status', methods=['POST'])
+def duplicates_status():
+    data = request.get_json()
+    job_id = data.get('job_id')
+    
+    if not job_id:
+        return jsonify({'error': 'Job ID is required'})
+    
+    try:
+        since = max(0, int(data.get('since', 0)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'since must be an integer'})
+    
+    result = file_manager.get_job(job_id, since)
     return jsonify(result)
 
+@app.route('/api/duplicates/cancel', methods=['POST'])
+def duplicates_cancel():
+    data = request.get_json()
+    job_id = data.get('job_id')
+    
+    if not job_id:
+        return jsonify({'error': 'Job ID is required'})
+    
+    result = file_manager.cancel_job(job_id)
+    return jsonify(result)
+
+@app.route('/api/download/archive', methods=['GET'])
+def download_archive():
+    path = request.args.get('path', '.')
+    archive_format = request.args.get('format', 'zip')
+    
+    try:
+        chunks = stream_archive(path, archive_format, request.args.get('level'), request.args.get('threads'))
+    except ArchiveError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    filename = archive_filename(path, archive_format)
+    fallback = filename.encode('ascii', 'replace').decode('ascii').replace('"', '')
+    return Response(
+        stream_with_context(chunks),
+        mimetype=ARCHIVE_FORMATS[archive_format]['mimetype'],
+        headers={'Content-Disposition': f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"}
+    )
+
+@app.route('/api/tree', methods=['GET', 'POST'])
+def get_file_tree():
+    data = _request_params()
+    path = data.get('path', '.')
+    if request.method == 'GET':
+        max_depth = request.args.get('max_depth', 3, type=int)
+    else:
+        max_depth = data.get('max_depth', 3)
+    
+    etag = file_manager.get_etag(path, 'tree', max_depth) if request.method == 'GET' else None
+    return _conditional_json(etag, lambda: file_manager.get_file_tree(path, max_depth))
+
 @app.route('/api/execute', methods=['POST'])
 def execute_command():
     import subprocess
@@ -686,36 +1564,51 @@ def execute_command():
     if cwd == '.' or not cwd:
         cwd = os.getcwd()
     
+    start = time.perf_counter()
+    exit_code = 'error'
     try:
         # Execute command and capture output
-        result = subprocess.run(
-            command, 
-            shell=True, 
-            capture_output=True, 
-            text=True, 
-            timeout=300,
-            cwd=cwd,
-            env=dict(os.environ, PYTHONUNBUFFERED='1')
-        )
-        
-        output = result.stdout
-        stderr = result.stderr
-        return_code = result.returncode
-        
-        return jsonify({
-            'output': output,
-            'stderr': stderr,
-            'return_code': return_code,
-            'command': command,
-            'cwd': cwd
-        })
+        with profiler.phase('spawn'):
+            process = subprocess.Popen(
+                command, 
+                shell=True, 
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True, 
+                cwd=cwd,
+                env=dict(os.environ, PYTHONUNBUFFERED='1')
+            )
+        
+        try:
+            with profiler.phase('wait'):
+                output, stderr = process.communicate(timeout=300)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+        
+        return_code = process.returncode
+        exit_code = str(return_code)
+        
+        with profiler.phase('serialize'):
+            return jsonify({
+                'output': output,
+                'stderr': stderr,
+                'return_code': return_code,
+                'command': command,
+                'cwd': cwd
+            })
     
     except subprocess.TimeoutExpired:
+        exit_code = 'timeout'
         return jsonify({'error': 'Command timed out after 300 seconds'})
     except FileNotFoundError:
         return jsonify({'error': f'Directory not found: {cwd}'})
     except Exception as e:
         return jsonify({'error': str(e)})
+    finally:
+        COMMAND_DURATION.observe(time.perf_counter() - start)
+        COMMAND_EXIT_CODES.inc(1, (exit_code,))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8082, debug=True)
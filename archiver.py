@@ -0,0 +1,300 @@
+"""
+Streaming archive builder
+Produces zip / tar / tar.gz / tar.zst archives of a directory on the fly,
+without writing a temporary archive to disk
+"""
+
+import os
+import gzip
+import queue
+import stat
+import tarfile
+import time
+import zipfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Archive formats: file extension, mimetype and default compression level
+ARCHIVE_FORMATS = {
+    'zip': {'extension': '.zip', 'mimetype': 'application/zip', 'level': 6, 'levels': (0, 9)},
+    'tar': {'extension': '.tar', 'mimetype': 'application/x-tar', 'level': None, 'levels': None},
+    'tar.gz': {'extension': '.tar.gz', 'mimetype': 'application/gzip', 'level': 6, 'levels': (1, 9)},
+    'tar.zst': {'extension': '.tar.zst', 'mimetype': 'application/zstd', 'level': 3, 'levels': (1, 22)},
+}
+
+# Size of the chunks handed to the consumer, and of the blocks compressed in parallel for tar.gz
+CHUNK_SIZE = 1024 * 1024
+
+# Number of chunks buffered between the archiving thread and the consumer
+QUEUE_DEPTH = 8
+
+DEFAULT_THREADS = min(8, os.cpu_count() or 1)
+
+
+class ArchiveError(Exception):
+    """Raised for invalid archive requests"""
+
+
+class _Closed(Exception):
+    """Raised inside the archiving thread once the consumer has gone away"""
+
+
+class _QueueSink:
+    """Write-only file object that hands fixed-size chunks to a consumer queue"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        if self.closed:
+            raise _Closed()
+        self.buffer += data
+        while len(self.buffer) >= CHUNK_SIZE:
+            self._put(bytes(self.buffer[:CHUNK_SIZE]))
+            del self.buffer[:CHUNK_SIZE]
+        return len(data)
+
+    def _put(self, chunk):
+        # Block while the consumer is behind, but notice when it has gone away
+        while True:
+            if self.closed:
+                raise _Closed()
+            try:
+                self.chunks.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        if self.buffer:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+
+
+class _ParallelGzipWriter:
+    """Gzip writer that compresses blocks on a thread pool
+
+    Each block becomes its own gzip member; concatenated members form a
+    valid gzip stream that gzip, tar and Python's gzip module all read.
+    """
+
+    def __init__(self, sink, level, threads):
+        self.sink = sink
+        self.level = level
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.pending = []
+        self.max_pending = threads * 2
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= CHUNK_SIZE:
+            self._submit(bytes(self.buffer[:CHUNK_SIZE]))
+            del self.buffer[:CHUNK_SIZE]
+        return len(data)
+
+    def _submit(self, block):
+        self.pending.append(self.executor.submit(gzip.compress, block, self.level))
+        # Write completed blocks in order and keep memory bounded
+        while len(self.pending) >= self.max_pending or (self.pending and self.pending[0].done()):
+            self.sink.write(self.pending.pop(0).result())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        try:
+            if self.buffer:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self.sink.write(self.pending.pop(0).result())
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _GzipStreamWriter:
+    """Single-threaded streaming gzip writer"""
+
+    def __init__(self, sink, level):
+        self.sink = sink
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, data):
+        compressed = self.compressor.compress(data)
+        if compressed:
+            self.sink.write(compressed)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sink.write(self.compressor.flush())
+
+
+def archive_filename(path, archive_format):
+    """Get the download file name for an archive of path"""
+    name = os.path.basename(os.path.normpath(os.path.abspath(path))) or 'root'
+    return name + ARCHIVE_FORMATS[archive_format]['extension']
+
+
+def validate_options(archive_format, level=None, threads=None):
+    """Check archive options, returning (level, threads) with defaults filled in"""
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ArchiveError(f"Unsupported archive format: {archive_format} (use {', '.join(ARCHIVE_FORMATS)})")
+
+    spec = ARCHIVE_FORMATS[archive_format]
+    if level is None:
+        level = spec['level']
+    elif spec['levels'] is not None:
+        try:
+            level = int(level)
+        except (TypeError, ValueError):
+            raise ArchiveError('Compression level must be an integer')
+        low, high = spec['levels']
+        if not low <= level <= high:
+            raise ArchiveError(f'Compression level for {archive_format} must be between {low} and {high}')
+
+    try:
+        threads = DEFAULT_THREADS if threads is None else min(max(1, int(threads)), os.cpu_count() or 1)
+    except (TypeError, ValueError):
+        raise ArchiveError('Thread count must be an integer')
+
+    if archive_format == 'tar.zst':
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ArchiveError('tar.zst archives require the zstandard package')
+
+    return level, threads
+
+
+def _walk(root_path):
+    """Yield (path, arcname) for the directory root_path and everything below it
+
+    Symlinked directories are yielded as entries of their own rather than
+    descended into, so the writers can store them as symlinks.
+    """
+    root_path = os.path.abspath(root_path)
+    base = os.path.basename(root_path.rstrip(os.sep)) or 'root'
+    for directory, dir_names, file_names in os.walk(root_path):
+        dir_names.sort()
+        relative = os.path.relpath(directory, root_path)
+        arc_directory = base if relative == '.' else os.path.join(base, relative)
+        yield directory, arc_directory
+        linked_dirs = [name for name in dir_names if os.path.islink(os.path.join(directory, name))]
+        for name in sorted(file_names + linked_dirs):
+            yield os.path.join(directory, name), os.path.join(arc_directory, name)
+
+
+def _zip_symlink(archive, path, arcname, st):
+    """Store a symlink in a zip archive the way Info-ZIP does: a Unix mode and the target as data"""
+    date_time = time.localtime(st.st_mtime)[:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(arcname, date_time)
+    info.create_system = 3
+    info.external_attr = (st.st_mode & 0xFFFF) << 16
+    archive.writestr(info, os.readlink(path))
+
+
+def _write_zip(sink, root_path, level):
+    compression = zipfile.ZIP_STORED if level == 0 else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(sink, 'w', compression=compression, compresslevel=level or None) as archive:
+        for path, arcname in _walk(root_path):
+            try:
+                st = os.lstat(path)
+                if stat.S_ISLNK(st.st_mode):
+                    if os.path.isdir(path):
+                        _zip_symlink(archive, path, arcname, st)
+                        continue
+                    st = os.stat(path)  # Symlinked files are stored by content; dangling ones raise
+                # FIFOs, sockets and devices have no content to store, and opening a FIFO blocks
+                if stat.S_ISREG(st.st_mode) or stat.S_ISDIR(st.st_mode):
+                    archive.write(path, arcname)
+            except OSError:
+                continue
+
+
+def _write_tar(fileobj, root_path):
+    # tarfile stores symlinks and special files as headers without opening them
+    with tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT) as archive:
+        for path, arcname in _walk(root_path):
+            try:
+                archive.add(path, arcname, recursive=False)
+            except OSError:
+                continue
+
+
+def write_archive(fileobj, root_path, archive_format='zip', level=None, threads=None):
+    """Write an archive of root_path to a writable file object"""
+    level, threads = validate_options(archive_format, level, threads)
+
+    if archive_format == 'zip':
+        _write_zip(fileobj, root_path, level)
+    elif archive_format == 'tar':
+        _write_tar(fileobj, root_path)
+    elif archive_format == 'tar.gz':
+        writer = _ParallelGzipWriter(fileobj, level, threads) if threads > 1 else _GzipStreamWriter(fileobj, level)
+        try:
+            _write_tar(writer, root_path)
+        finally:
+            writer.close()
+    elif archive_format == 'tar.zst':
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+        with compressor.stream_writer(fileobj, closefd=False) as writer:
+            _write_tar(writer, root_path)
+
+
+def stream_archive(root_path, archive_format='zip', level=None, threads=None):
+    """Get an iterator yielding an archive of root_path chunk by chunk as it is built
+
+    Options are validated up front so callers can report errors before
+    streaming starts. The archive is produced on a background thread; if the
+    consumer stops iterating (e.g. the client disconnects) the thread stops too.
+    """
+    level, threads = validate_options(archive_format, level, threads)
+    if not os.path.isdir(root_path):
+        raise ArchiveError('Path is not a directory')
+    return _iter_archive(root_path, archive_format, level, threads)
+
+
+def _iter_archive(root_path, archive_format, level, threads):
+    chunks = queue.Queue(maxsize=QUEUE_DEPTH)
+    sink = _QueueSink(chunks)
+    done = object()
+    errors = []
+
+    def produce():
+        try:
+            write_archive(sink, root_path, archive_format, level, threads)
+            sink.finish()
+        except _Closed:
+            return
+        except Exception as e:
+            errors.append(e)
+        try:
+            sink._put(done)
+        except _Closed:
+            pass
+
+    thread = threading.Thread(target=produce, name='archiver', daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+        if errors:
+            raise errors[0]
+    finally:
+        sink.closed = True
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Telegram bot load benchmark
+Runs m.TelegramBot against the fake Bot API server and simulates many chats
+issuing commands, uploads and downloads
+
+Usage:
+    python -m benchmarks.bench_bot --chats 20 --actions 10 --output bot.json
+    python -m benchmarks.bench_bot --baseline bot.json
+    python -m benchmarks.bench_bot --mode webhook
+"""
+
+import os
+import sys
+import time
+import socket
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import add_common_arguments, finish, metadata, summarize
+from benchmarks.fake_bot_api import FakeBotAPI
+
+# Relative frequency of each simulated action
+ACTION_WEIGHTS = {
+    'shell': 5,
+    'pwd': 2,
+    'start': 1,
+    'upload': 1,
+    'download': 1,
+}
+
+
+def _reply_predicate(chat_id, action):
+    """Match the event that marks an action as complete for a chat"""
+    if action == 'download':
+        return lambda event: event['chat_id'] == chat_id and event['method'] == 'sendDocument'
+    if action == 'upload':
+        return lambda event: (event['chat_id'] == chat_id and event['method'] == 'sendMessage'
+                              and 'upload' in event.get('text', '').lower())
+    return lambda event: event['chat_id'] == chat_id and event['method'] == 'sendMessage'
+
+
+def run_chat(api, chat_id, actions, upload_size, timeout, samples, failures, rng):
+    """Simulate one chat issuing actions one after another"""
+    for index in range(actions):
+        action = rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        start_index = api.event_count()
+        start = time.perf_counter()
+
+        if action == 'shell':
+            api.push_update(chat_id, text=f'echo chat {chat_id} action {index}')
+        elif action == 'pwd':
+            api.push_update(chat_id, text='pwd')
+        elif action == 'start':
+            api.push_update(chat_id, text='/start')
+        elif action == 'upload':
+            document = api.add_file(os.urandom(upload_size), f'upload_{chat_id}_{index}.bin')
+            api.push_update(chat_id, document=document)
+        elif action == 'download':
+            api.push_update(chat_id, text='/download download_sample.bin')
+
+        found = api.wait_for_event(_reply_predicate(chat_id, action), start=start_index, timeout=timeout)
+        if found is None:
+            failures.append(action)
+            continue
+        samples.setdefault(action, []).append(found[1]['time'] - start)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chats', type=int, default=10, help='concurrent simulated chats (default: %(default)s)')
+    parser.add_argument('--actions', type=int, default=10, help='actions per chat (default: %(default)s)')
+    parser.add_argument('--upload-size', type=int, default=64 * 1024, help='bytes per simulated upload')
+    parser.add_argument('--download-size', type=int, default=256 * 1024, help='bytes of the file served by /download')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for each reply')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the action mix')
+    parser.add_argument('--mode', choices=('poll', 'webhook'), default='poll',
+                        help='receive updates by long polling or through the webhook receiver')
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    api = FakeBotAPI().start()
+    workdir = tempfile.mkdtemp(prefix='bot_bench_')
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    bot = None
+    bot_thread = None
+    try:
+        with open('download_sample.bin', 'wb') as f:
+            f.write(os.urandom(args.download_size))
+
+        webhook_url = ''
+        if args.mode == 'webhook':
+            port = _free_port()
+            os.environ.update(WEBHOOK_LISTEN='127.0.0.1', WEBHOOK_PORT=str(port))
+            webhook_url = f'http://127.0.0.1:{port}/webhook'
+
+        import m
+        startup_start = time.perf_counter()
+        bot = m.TelegramBot('123456:BENCHMARK', api_root=api.url, webhook_url=webhook_url)
+        bot_thread = threading.Thread(target=bot.run, name='bot-main-loop', daemon=True)
+        bot_thread.start()
+        # Time to first poll (or webhook registration), import time excluded since m is already loaded
+        bot.startup.ready.wait(args.timeout)
+        startup = time.perf_counter() - startup_start
+
+        samples = {}
+        failures = []
+        rng = random.Random(args.seed)
+        chats = [
+            threading.Thread(
+                target=run_chat,
+                args=(api, 1000 + chat, args.actions, args.upload_size, args.timeout, samples, failures,
+                      random.Random(rng.random())),
+                name=f'chat-{chat}'
+            )
+            for chat in range(args.chats)
+        ]
+
+        wall_start = time.perf_counter()
+        for chat in chats:
+            chat.start()
+        for chat in chats:
+            chat.join()
+        wall = time.perf_counter() - wall_start
+    finally:
+        if bot is not None:
+            bot.stop()
+        api.close()
+        if bot_thread is not None:
+            bot_thread.join(timeout=5)
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {f'bot/{action}': summarize(values) for action, values in samples.items()}
+    all_samples = [value for values in samples.values() for value in values]
+    if all_samples:
+        results['bot/all'] = summarize(all_samples)
+    results['bot/startup'] = summarize([startup])
+
+    completed = len(all_samples)
+    meta = metadata(
+        benchmark='bot',
+        mode=args.mode,
+        chats=args.chats,
+        actions_per_chat=args.actions,
+        completed=completed,
+        failed=len(failures),
+        wall_seconds=round(wall, 3),
+        throughput_per_second=round(completed / wall, 2) if wall else None,
+        startup_ms=round(startup * 1000, 3),
+    )
+    print(f"{completed} actions in {wall:.2f}s ({meta['throughput_per_second']}/s), "
+          f"{len(failures)} timed out, bot startup {meta['startup_ms']} ms\n")
+    return finish(args, meta, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+FileManager benchmarks
+Times the FileManager API directly and through the Flask endpoints on synthetic trees
+
+Usage:
+    python -m benchmarks.bench_file_manager --output bench.json
+    python -m benchmarks.bench_file_manager --baseline bench.json --fail-on-regression
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import add_common_arguments, finish, measure, metadata
+
+# Tree shapes per scale: wide (one flat directory), deep (nested chain),
+# many_small (a few levels of small files) and few_huge (a handful of big files)
+SCALES = {
+    'small': {'wide': 1000, 'deep': 30, 'many_small': (4, 8, 20), 'few_huge': (3, 8 * 1024 * 1024)},
+    'medium': {'wide': 10000, 'deep': 100, 'many_small': (8, 10, 50), 'few_huge': (4, 64 * 1024 * 1024)},
+    'large': {'wide': 50000, 'deep': 200, 'many_small': (16, 16, 100), 'few_huge': (4, 512 * 1024 * 1024)},
+}
+
+# Size of the file used for the read_file / write_file benchmarks (read_file caps at 1 MB)
+SAMPLE_FILE_SIZE = 512 * 1024
+
+TREE_OPERATIONS = ('get_directory_contents', 'get_file_tree', 'read_file', 'write_file', 'copy_item', 'delete_item')
+
+
+def _write_sample(path, size=SAMPLE_FILE_SIZE):
+    line = b'benchmark sample line with some text in it 0123456789\n'
+    with open(path, 'wb') as f:
+        f.write((line * (size // len(line) + 1))[:size])
+
+
+def _write_random(path, size, chunk=1024 * 1024):
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(os.urandom(min(chunk, remaining)))
+            remaining -= chunk
+
+
+def build_wide(root, count):
+    for index in range(count):
+        with open(os.path.join(root, f'file_{index:06d}.txt'), 'w') as f:
+            f.write(f'{index}\n')
+    _write_sample(os.path.join(root, 'sample.txt'))
+
+
+def build_deep(root, depth):
+    directory = root
+    for level in range(depth):
+        directory = os.path.join(directory, f'level_{level:03d}')
+        os.mkdir(directory)
+        with open(os.path.join(directory, 'marker.txt'), 'w') as f:
+            f.write(f'{level}\n')
+    _write_sample(os.path.join(root, 'sample.txt'))
+
+
+def build_many_small(root, shape):
+    branches, subdirs, files = shape
+    for branch in range(branches):
+        for subdir in range(subdirs):
+            directory = os.path.join(root, f'branch_{branch:02d}', f'dir_{subdir:02d}')
+            os.makedirs(directory)
+            for index in range(files):
+                with open(os.path.join(directory, f'small_{index:03d}.py'), 'w') as f:
+                    f.write(f'# file {branch}/{subdir}/{index}\nVALUE = {index}\n')
+    _write_sample(os.path.join(root, 'sample.txt'))
+
+
+def build_few_huge(root, shape):
+    count, size = shape
+    for index in range(count):
+        _write_random(os.path.join(root, f'huge_{index}.bin'), size)
+    _write_sample(os.path.join(root, 'sample.txt'))
+
+
+BUILDERS = {
+    'wide': build_wide,
+    'deep': build_deep,
+    'many_small': build_many_small,
+    'few_huge': build_few_huge,
+}
+
+
+def build_trees(workdir, scale, shapes):
+    """Create the synthetic trees, returning {shape: path}"""
+    trees = {}
+    for shape in shapes:
+        root = os.path.join(workdir, shape)
+        os.makedirs(root)
+        BUILDERS[shape](root, SCALES[scale][shape])
+        trees[shape] = root
+    return trees
+
+
+class DirectTarget:
+    """Calls FileManager methods directly"""
+
+    name = 'direct'
+
+    def __init__(self, file_manager):
+        self.fm = file_manager
+
+    def get_directory_contents(self, path):
+        return self.fm.get_directory_contents(path)
+
+    def get_file_tree(self, path):
+        return self.fm.get_file_tree(path)
+
+    def read_file(self, path):
+        return self.fm.read_file(path)
+
+    def write_file(self, path, content):
+        return self.fm.write_file(path, content)
+
+    def copy_item(self, source, destination):
+        return self.fm.copy_item(source, destination)
+
+    def delete_item(self, path):
+        return self.fm.delete_item(path)
+
+
+class FlaskTarget:
+    """Calls the same operations through the Flask test client"""
+
+    name = 'flask'
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def _post(self, url, payload):
+        response = self.client.post(url, json=payload)
+        return response.get_json()
+
+    def get_directory_contents(self, path):
+        return self._post('/api/directory', {'path': path})
+
+    def get_file_tree(self, path):
+        return self._post('/api/tree', {'path': path})
+
+    def read_file(self, path):
+        return self._post('/api/file/read', {'path': path})
+
+    def write_file(self, path, content):
+        return self._post('/api/file/write', {'path': path, 'content': content})
+
+    def copy_item(self, source, destination):
+        return self._post('/api/copy', {'source': source, 'destination': destination})
+
+    def delete_item(self, path):
+        return self._post('/api/delete', {'path': path})
+
+
+def _check(result):
+    if isinstance(result, dict) and result.get('error'):
+        raise RuntimeError(result['error'])
+    return result
+
+
+def bench_tree(target, shape, root, scratch, repeat, operations):
+    """Run the selected operations against one tree"""
+    results = {}
+    prefix = f'{shape}/{target.name}'
+    sample = os.path.join(root, 'sample.txt')
+
+    if 'get_directory_contents' in operations:
+        results[f'{prefix}/get_directory_contents'] = measure(
+            lambda: _check(target.get_directory_contents(root)), repeat)
+
+    if 'get_file_tree' in operations:
+        results[f'{prefix}/get_file_tree'] = measure(lambda: _check(target.get_file_tree(root)), repeat)
+
+    if 'read_file' in operations:
+        results[f'{prefix}/read_file'] = measure(lambda: _check(target.read_file(sample)), repeat)
+
+    if 'write_file' in operations:
+        with open(sample) as f:
+            content = f.read()
+        destination = os.path.join(scratch, f'{shape}_write.txt')
+        results[f'{prefix}/write_file'] = measure(lambda: _check(target.write_file(destination, content)), repeat)
+
+    # copy and delete are measured in pairs: each copy is removed by the next delete
+    if 'copy_item' in operations or 'delete_item' in operations:
+        copy_destination = os.path.join(scratch, f'{shape}_copy')
+
+        def remove_copy():
+            if os.path.exists(copy_destination):
+                shutil.rmtree(copy_destination)
+
+        def make_copy():
+            remove_copy()
+            shutil.copytree(root, copy_destination)
+
+        if 'copy_item' in operations:
+            results[f'{prefix}/copy_item'] = measure(
+                lambda: _check(target.copy_item(root, copy_destination)), repeat, setup=remove_copy)
+        if 'delete_item' in operations:
+            results[f'{prefix}/delete_item'] = measure(
+                lambda: _check(target.delete_item(copy_destination)), repeat, setup=make_copy)
+        remove_copy()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark (default: %(default)s)')
+    parser.add_argument('--shapes', default=','.join(BUILDERS), help='comma-separated tree shapes to build')
+    parser.add_argument('--operations', default=','.join(TREE_OPERATIONS), help='comma-separated operations to time')
+    parser.add_argument('--targets', default='direct,flask', help='direct, flask or both')
+    parser.add_argument('--workdir', help='directory for the synthetic trees (default: a fresh temp dir)')
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+
+    shapes = [shape for shape in args.shapes.split(',') if shape]
+    operations = set(args.operations.split(','))
+    unknown = (set(shapes) - set(BUILDERS)) | (operations - set(TREE_OPERATIONS))
+    if unknown:
+        parser.error(f"unknown shape or operation: {', '.join(sorted(unknown))}")
+
+    # Keep hashing side effects out of the user's cache
+    os.environ.setdefault('FILE_MANAGER_HASH_CACHE', ':memory:')
+    from file_manager import FileManager
+
+    targets = []
+    for target_name in args.targets.split(','):
+        if target_name == 'direct':
+            targets.append(DirectTarget(FileManager()))
+        elif target_name == 'flask':
+            try:
+                from app import app
+            except ImportError as e:
+                print(f'Skipping Flask benchmarks: {e}', file=sys.stderr)
+                continue
+            targets.append(FlaskTarget(app))
+
+    workdir = tempfile.mkdtemp(prefix='fm_bench_', dir=args.workdir)
+    try:
+        trees_root = os.path.join(workdir, 'trees')
+        scratch = os.path.join(workdir, 'scratch')
+        os.makedirs(scratch)
+        print(f'Building {args.scale} trees in {workdir}...', file=sys.stderr)
+        trees = build_trees(trees_root, args.scale, shapes)
+
+        results = {}
+        for target in targets:
+            for shape, root in trees.items():
+                print(f'  {shape} via {target.name}', file=sys.stderr)
+                results.update(bench_tree(target, shape, root, scratch, args.repeat, operations))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    meta = metadata(benchmark='file_manager', scale=args.scale, repeat=args.repeat)
+    return finish(args, meta, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
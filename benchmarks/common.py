@@ -0,0 +1,152 @@
+"""
+Shared helpers for the benchmark scripts
+Timing, result files and baseline comparison
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+
+# A benchmark counts as regressed when its median is this much slower than the baseline
+DEFAULT_THRESHOLD = 0.20
+
+
+def summarize(samples):
+    """Summarize a list of durations in seconds as milliseconds"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 4),
+        'median_ms': round(statistics.median(ordered) * 1000, 4),
+        'p95_ms': round(ordered[p95_index] * 1000, 4),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 4),
+    }
+
+
+def measure(func, repeat, setup=None, warmup=1):
+    """Time func() repeat times, running setup() untimed before each call"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def git_revision():
+    """Get the current git commit, if available"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def metadata(**extra):
+    """Describe the environment a benchmark ran in"""
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'revision': git_revision(),
+    }
+    meta.update(extra)
+    return meta
+
+
+def write_results(path, meta, results):
+    """Write benchmark results as JSON with stable key order, so runs diff cleanly"""
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare_to_baseline(results, baseline_path, threshold=DEFAULT_THRESHOLD):
+    """Compare medians against a baseline file, returning (rows, regressions)"""
+    with open(baseline_path) as f:
+        baseline = json.load(f).get('results', {})
+
+    rows = []
+    regressions = []
+    for name in sorted(results):
+        current = results[name].get('median_ms')
+        previous = baseline.get(name, {}).get('median_ms')
+        if current is None or not previous:
+            rows.append((name, previous, current, None, 'new'))
+            continue
+        ratio = current / previous
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, previous, current, ratio, status))
+    return rows, regressions
+
+
+def print_results(results):
+    """Print a results table"""
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'median ms':>10}  {'p95 ms':>10}  {'min ms':>10}  {'runs':>5}")
+    for name in sorted(results):
+        row = results[name]
+        if 'skipped' in row:
+            print(f"{name:<{width}}  skipped: {row['skipped']}")
+            continue
+        print(f"{name:<{width}}  {row['median_ms']:>10.3f}  {row['p95_ms']:>10.3f}  {row['min_ms']:>10.3f}  {row['runs']:>5}")
+
+
+def print_comparison(rows):
+    """Print a baseline comparison table"""
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"\n{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'ratio':>7}  status")
+    for name, previous, current, ratio, status in rows:
+        previous_text = f'{previous:.3f}' if previous else '-'
+        current_text = f'{current:.3f}' if current is not None else '-'
+        ratio_text = f'{ratio:.2f}x' if ratio is not None else '-'
+        print(f'{name:<{width}}  {previous_text:>10}  {current_text:>10}  {ratio_text:>7}  {status}')
+
+
+def add_common_arguments(parser):
+    """Add the options shared by all benchmark scripts"""
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--baseline', help='compare against a results JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown that counts as a regression (default: %(default)s)')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='exit with status 1 if any benchmark regressed')
+
+
+def finish(args, meta, results):
+    """Print, save and compare results; returns the process exit code"""
+    print_results(results)
+    if args.output:
+        write_results(args.output, meta, results)
+        print(f'\nResults written to {args.output}')
+
+    if args.baseline:
+        rows, regressions = compare_to_baseline(results, args.baseline, args.threshold)
+        print_comparison(rows)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over {args.threshold:.0%}', file=sys.stderr)
+            if args.fail_on_regression:
+                return 1
+    return 0
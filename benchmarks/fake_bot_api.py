@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram Bot API server
+Implements enough of the Bot API (getUpdates, setWebhook, sendMessage,
+sendDocument, getFile and file downloads) to run m.TelegramBot locally
+without Telegram; other methods (editMessageText, answerCallbackQuery, ...)
+are recorded as events
+
+Usage:
+    python -m benchmarks.fake_bot_api --port 8081
+    TELEGRAM_API_ROOT=http://127.0.0.1:8081 python m.py
+    curl -H 'Content-Type: application/json' -d '{"chat_id": 1, "text": "ls"}' http://127.0.0.1:8081/_push
+
+Webhook mode: once the bot calls setWebhook, pushed updates are POSTed to it
+    TELEGRAM_API_ROOT=http://127.0.0.1:8081 WEBHOOK_URL=http://127.0.0.1:8443/webhook python m.py
+"""
+
+import sys
+import json
+import time
+import uuid
+import queue
+import argparse
+import threading
+import urllib.request
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+
+class FakeBotAPI:
+    """In-memory Bot API state plus an HTTP server exposing it"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.updates = []
+        self.events = []
+        self.files = {}
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._condition = threading.Condition()
+        self._closed = False
+        self.webhook = None
+        self._deliveries = queue.Queue()
+        self._delivery_thread = None
+
+        handler = type('Handler', (_Handler,), {'api': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-bot-api', daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    # State used by tests and load generators
+
+    def add_file(self, data, file_name='upload.bin'):
+        """Store a file as if a user had sent it, returning its document dict"""
+        file_id = uuid.uuid4().hex
+        self.files[file_id] = {'data': data, 'file_path': f'documents/{file_id}_{file_name}'}
+        return {'file_id': file_id, 'file_name': file_name, 'file_size': len(data)}
+
+    def push_update(self, chat_id, text=None, document=None, user_id=None, **fields):
+        """Queue an incoming message update, returning its update_id"""
+        with self._condition:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            message = {
+                'message_id': self._new_message_id(),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': user_id or chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'},
+                'date': int(time.time()),
+            }
+            if text is not None:
+                message['text'] = text
+            if document is not None:
+                message['document'] = document
+            message.update(fields)
+            update = {'update_id': update_id, 'message': message}
+            if self.webhook is not None:
+                self._deliveries.put((self.webhook, update))
+            else:
+                self.updates.append(update)
+            self._condition.notify_all()
+        return update_id
+
+    def push_callback_query(self, chat_id, message_id, data, user_id=None):
+        """Queue an inline button press on a message the bot sent, returning its update_id"""
+        with self._condition:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            update = {'update_id': update_id, 'callback_query': {
+                'id': uuid.uuid4().hex,
+                'from': {'id': user_id or chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'},
+                'message': {'message_id': message_id, 'chat': {'id': chat_id, 'type': 'private'}},
+                'data': data,
+            }}
+            if self.webhook is not None:
+                self._deliveries.put((self.webhook, update))
+            else:
+                self.updates.append(update)
+            self._condition.notify_all()
+        return update_id
+
+    def event_count(self):
+        with self._condition:
+            return len(self.events)
+
+    def wait_for_event(self, predicate, start=0, timeout=30.0):
+        """Wait for the first event at index >= start matching predicate; returns (index, event) or None"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            index = start
+            while True:
+                while index < len(self.events):
+                    if predicate(self.events[index]):
+                        return index, self.events[index]
+                    index += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    return None
+                self._condition.wait(remaining)
+
+    # Bot API methods
+
+    def _new_message_id(self):
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    def _record(self, method, chat_id, **fields):
+        with self._condition:
+            event = {'method': method, 'chat_id': chat_id, 'time': time.perf_counter(),
+                     'message_id': self._new_message_id()}
+            event.update(fields)
+            self.events.append(event)
+            self._condition.notify_all()
+        return event
+
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        timeout = min(float(params.get('timeout') or 0), 50.0)
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            # Confirmed updates are dropped, as Telegram does
+            if offset:
+                self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            while not self.updates and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return list(self.updates[:100])
+
+    def set_webhook(self, params):
+        with self._condition:
+            if not params.get('url'):
+                self.webhook = None
+                return True
+            self.webhook = {'url': params['url'], 'secret': params.get('secret_token', '')}
+            # Telegram drops the polling queue into the webhook too
+            for update in self.updates:
+                self._deliveries.put((self.webhook, update))
+            self.updates = []
+        if self._delivery_thread is None:
+            self._delivery_thread = threading.Thread(target=self._deliver, name='fake-bot-api-webhook', daemon=True)
+            self._delivery_thread.start()
+        return True
+
+    def delete_webhook(self, params):
+        with self._condition:
+            self.webhook = None
+        return True
+
+    def _deliver(self):
+        """POST queued updates to the webhook in order, retrying failures briefly"""
+        while True:
+            webhook, update = self._deliveries.get()
+            request = urllib.request.Request(
+                webhook['url'], data=json.dumps(update).encode(),
+                headers={'Content-Type': 'application/json',
+                         'X-Telegram-Bot-Api-Secret-Token': webhook['secret']}
+            )
+            for attempt in range(5):
+                try:
+                    with urllib.request.urlopen(request, timeout=10):
+                        break
+                except OSError:
+                    time.sleep(0.2 * (attempt + 1))
+
+    def send_message(self, params):
+        chat_id = int(params['chat_id'])
+        event = self._record('sendMessage', chat_id, text=params.get('text', ''))
+        return self._message_result(event, text=event['text'])
+
+    def send_document(self, params, files):
+        chat_id = int(params['chat_id'])
+        document = files.get('document')
+        if document is not None:
+            file_name, data = document
+            stored = self.add_file(data, file_name)
+        else:
+            # Re-sending by file_id
+            file_id = params.get('document', '')
+            if file_id not in self.files:
+                return None
+            stored = {'file_id': file_id, 'file_name': self.files[file_id]['file_path'].rsplit('/', 1)[-1],
+                      'file_size': len(self.files[file_id]['data'])}
+        event = self._record('sendDocument', chat_id, caption=params.get('caption'), document=stored)
+        return self._message_result(event, document=stored, caption=params.get('caption'))
+
+    def get_file(self, params):
+        file_id = params.get('file_id', '')
+        stored = self.files.get(file_id)
+        if stored is None:
+            return None
+        return {'file_id': file_id, 'file_size': len(stored['data']), 'file_path': stored['file_path']}
+
+    def generic(self, method, params):
+        chat_id = params.get('chat_id')
+        event = self._record(method, int(chat_id) if chat_id else None, params=params)
+        return self._message_result(event) if chat_id else True
+
+    def _message_result(self, event, **fields):
+        result = {'message_id': event['message_id'], 'chat': {'id': event['chat_id']}, 'date': int(time.time())}
+        result.update(fields)
+        return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    api = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_params(self):
+        """Merge query string, form, JSON and multipart parameters"""
+        parsed = urlparse(self.path)
+        params = dict(parse_qsl(parsed.query))
+        files = {}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+
+        if content_type.startswith('application/json') and body:
+            params.update(json.loads(body))
+        elif content_type.startswith('application/x-www-form-urlencoded'):
+            params.update(parse_qsl(body.decode()))
+        elif content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+            )
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                file_name = part.get_filename()
+                payload = part.get_payload(decode=True) or b''
+                if file_name is not None:
+                    files[name] = (file_name, payload)
+                else:
+                    params[name] = payload.decode()
+        return parsed.path, params, files
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        path, params, files = self._read_params()
+        parts = path.strip('/').split('/')
+
+        # Manual testing: POST /_push {"chat_id": ..., "text": ...} queues an incoming message
+        if path == '/_push':
+            chat_id = int(params.pop('chat_id', 1))
+            self._send_json({'ok': True, 'result': self.api.push_update(chat_id, **params)})
+            return
+
+        # File downloads: /file/bot<token>/<file_path>
+        if len(parts) >= 3 and parts[0] == 'file' and parts[1].startswith('bot'):
+            file_path = '/'.join(parts[2:])
+            for stored in self.api.files.values():
+                if stored['file_path'] == file_path:
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(stored['data'])))
+                    self.end_headers()
+                    self.wfile.write(stored['data'])
+                    return
+            self._send_json({'ok': False, 'error_code': 404, 'description': 'Not Found'}, 404)
+            return
+
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            self._send_json({'ok': False, 'error_code': 404, 'description': 'Not Found'}, 404)
+            return
+
+        method = parts[1]
+        if method == 'getUpdates' and self.api.webhook is not None:
+            self._send_json({'ok': False, 'error_code': 409,
+                             'description': "Conflict: can't use getUpdates method while webhook is active"}, 409)
+            return
+        if method == 'getUpdates':
+            result = self.api.get_updates(params)
+        elif method == 'setWebhook':
+            result = self.api.set_webhook(params)
+        elif method == 'deleteWebhook':
+            result = self.api.delete_webhook(params)
+        elif method == 'sendMessage':
+            result = self.api.send_message(params)
+        elif method == 'sendDocument':
+            result = self.api.send_document(params, files)
+        elif method == 'getFile':
+            result = self.api.get_file(params)
+        else:
+            result = self.api.generic(method, params)
+
+        if result is None:
+            self._send_json({'ok': False, 'error_code': 400, 'description': 'Bad Request: wrong file identifier'}, 400)
+        else:
+            self._send_json({'ok': True, 'result': result})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a fake Telegram Bot API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args(argv)
+
+    api = FakeBotAPI(args.host, args.port)
+    print(f'Fake Bot API listening on {api.url} (set TELEGRAM_API_ROOT={api.url})', file=sys.stderr)
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
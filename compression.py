@@ -0,0 +1,118 @@
+"""
+HTTP response compression
+gzip is always available; brotli and zstd are used when the optional
+brotli / zstandard packages are installed
+"""
+
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Responses smaller than this are sent uncompressed
+MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+# Compression levels tuned for speed over ratio, since bodies are compressed per request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+# Mimetypes worth compressing; everything else (archives, images, ...) is sent as is
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/x-ndjson', 'application/javascript',
+)
+
+
+def available_encodings():
+    """Get supported content codings, most preferred first"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+ENCODINGS = available_encodings()
+
+
+def is_compressible(mimetype):
+    return mimetype in COMPRESSIBLE_TYPES
+
+
+def compress(data, encoding):
+    """Compress a complete body"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+class _StreamCompressor:
+    """Incremental compressor that flushes after every chunk
+
+    Flushing keeps streamed responses (NDJSON progress, command output)
+    arriving promptly instead of waiting for the compressor's buffer to fill.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f'Unsupported encoding: {encoding}')
+
+    def compress(self, chunk):
+        if self.encoding == 'gzip':
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        if self.encoding == 'gzip':
+            return self._compressor.flush()
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+class CompressedStream:
+    """Wrap a response iterable, compressing it chunk by chunk"""
+
+    def __init__(self, iterable, encoding):
+        self.iterable = iterable
+        self.encoding = encoding
+
+    def __iter__(self):
+        compressor = _StreamCompressor(self.encoding)
+        for chunk in self.iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                compressed = compressor.compress(chunk)
+                if compressed:
+                    yield compressed
+        yield compressor.finish()
+
+    def close(self):
+        if hasattr(self.iterable, 'close'):
+            self.iterable.close()
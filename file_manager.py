@@ -1,19 +1,385 @@
 
 import os
+import re
+import functools
+import mmap
+import queue
+import sqlite3
+import hashlib
+import threading
+import time
+import uuid
+import tempfile
 import shutil
 import mimetypes
 import stat
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import jsonify
 import json
+from profiler import profiler
+
+# Default number of worker threads used by run_batch
+BATCH_MAX_WORKERS = 8
+
+# fsync policy for writes: 'none', 'file' (flush file data) or 'full' (also flush the directory entry)
+FSYNC_POLICY = os.environ.get('FILE_MANAGER_FSYNC', 'file')
+FSYNC_POLICIES = ('none', 'file', 'full')
+
+# Process umask, needed to give newly created files the usual permissions; see _process_umask
+_umask = None
+_umask_lock = threading.Lock()
+
+# Hash algorithms accepted by hash_file / hash_directory
+HASH_ALGORITHMS = ('md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512', 'blake2b', 'blake2s', 'sha3_256', 'sha3_512')
+HASH_MAX_WORKERS = min(8, os.cpu_count() or 1)
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Bytes read from each end of a file when pruning duplicate candidates
+PARTIAL_HASH_BLOCK = 64 * 1024
+
+# Finished background jobs kept around for clients to collect results
+MAX_FINISHED_JOBS = 20
+
+# Duplicate scans walking and hashing at once; each one can keep the disk busy on its own
+MAX_RUNNING_SCANS = 2
+
+# Persistent hash cache; set FILE_MANAGER_HASH_CACHE to ':memory:' to keep it in-process only
+HASH_CACHE_PATH = os.environ.get(
+    'FILE_MANAGER_HASH_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'file_manager', 'hashes.sqlite3')
+)
+
+# Matches a unified diff hunk header such as "@@ -12,3 +12,4 @@"
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# Range reads for the paged editor: default window, hard cap (a window is extended to a whole line)
+RANGE_READ_SIZE = 256 * 1024
+MAX_RANGE_READ = 4 * 1024 * 1024
+# Buffer used when copying the unchanged parts of a file around edited ranges
+RANGE_COPY_CHUNK = 1024 * 1024
+
+# Fields accepted by get_directory_contents(fields=...), per listing format
+LISTING_FIELDS = ('name', 'path', 'type', 'size', 'modified', 'permissions', 'mime_type')
+COMPACT_LISTING_FIELDS = ('name', 'type', 'size', 'mtime', 'mode', 'mime_type')
+DEFAULT_COMPACT_FIELDS = ('name', 'type', 'size', 'mtime', 'mode')
+
+# Bytes read from the start of a file for content sniffing, and how many results to remember
+SNIFF_BYTES = 512
+SNIFF_CACHE_SIZE = 10000
+
+# Magic numbers checked by sniff_types: (offset, signature, mime type)
+MAGIC_SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'PK\x05\x06', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'BZh', 'application/x-bzip2'),
+    (0, b'\xfd7zXZ\x00', 'application/x-xz'),
+    (0, b'\x28\xb5\x2f\xfd', 'application/zstd'),
+    (0, b"7z\xbc\xaf\x27\x1c", 'application/x-7z-compressed'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (257, b'ustar', 'application/x-tar'),
+    (0, b'\x7fELF', 'application/x-executable'),
+    (0, b'\xca\xfe\xba\xbe', 'application/java-vm'),
+    (0, b'\x00asm', 'application/wasm'),
+    (0, b'SQLite format 3\x00', 'application/vnd.sqlite3'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (0, b'%!PS', 'application/postscript'),
+    (0, b'{\\rtf', 'application/rtf'),
+)
+
+
+class PatchConflict(Exception):
+    """Raised when a patch does not apply to the current file contents"""
+
+
+def _split_lines(text):
+    """Split text into lines on newlines only, keeping line endings"""
+    return [line for line in re.split(r'(?<=\n)', text) if line]
+
+
+def _process_umask():
+    """Get the process umask without changing it where possible
+
+    os.umask can only be read by setting it, which would briefly affect
+    files created by other threads, so Linux's /proc/self/status is read
+    instead and the set-and-restore fallback runs once, under a lock.
+    """
+    global _umask
+    with _umask_lock:
+        if _umask is None:
+            try:
+                with open('/proc/self/status') as f:
+                    for line in f:
+                        if line.startswith('Umask:'):
+                            _umask = int(line.split()[1], 8)
+                            break
+            except (OSError, ValueError, IndexError):
+                pass
+            if _umask is None:
+                _umask = os.umask(0o022)
+                os.umask(_umask)
+        return _umask
+
+
+def _detect_newline(text):
+    """Get the line ending a text uses: CRLF, CR or LF"""
+    if '\r\n' in text:
+        return '\r\n'
+    if '\r' in text:
+        return '\r'
+    return '\n'
+
+
+def _normalize_newlines(text):
+    """Convert CRLF and CR line endings to LF, as text-mode reads do"""
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _apply_line_changes(lines, changes):
+    """Replace line ranges; each change is {'start', 'end', 'content'} with 0-based, end-exclusive lines"""
+    parsed = []
+    for change in changes:
+        try:
+            start = int(change['start'])
+            end = int(change.get('end', start))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each change needs integer start and end line numbers')
+        if start < 0 or end < start or end > len(lines):
+            raise PatchConflict(f'Line range {start}-{end} is outside the file')
+        parsed.append((start, end, _split_lines(change.get('content', ''))))
+    
+    parsed.sort(key=lambda change: change[0])
+    for previous, current in zip(parsed, parsed[1:]):
+        if current[0] < previous[1]:
+            raise ValueError('Changes must not overlap')
+    
+    # Apply from the bottom up so earlier line numbers stay valid
+    for start, end, replacement in reversed(parsed):
+        lines[start:end] = replacement
+    return lines
+
+
+def _apply_unified_diff(lines, diff):
+    """Apply a unified diff to a list of lines, checking every context and removed line"""
+    result = []
+    position = 0
+    last_line_owner = None
+    in_hunk = False
+    
+    for diff_line in _split_lines(diff):
+        header = HUNK_HEADER.match(diff_line)
+        if header:
+            old_start = int(header.group(1))
+            old_count = int(header.group(2)) if header.group(2) is not None else 1
+            # A hunk that removes nothing is anchored after old_start instead of at it
+            target = old_start if old_count == 0 else old_start - 1
+            if target < position or target > len(lines):
+                raise PatchConflict(f'Hunk at line {old_start} does not apply')
+            result.extend(lines[position:target])
+            position = target
+            in_hunk = True
+            continue
+        
+        if not in_hunk:
+            continue  # Skip ---/+++ file headers and any preamble
+        
+        marker, text = diff_line[:1], diff_line[1:].rstrip('\n')
+        if marker == '\n':
+            marker = ' '  # Some tools drop the space on empty context lines
+        
+        if marker in (' ', '-'):
+            if position >= len(lines) or lines[position].rstrip('\n') != text:
+                raise PatchConflict(f'Patch does not match file at line {position + 1}')
+            if marker == ' ':
+                result.append(lines[position])
+                last_line_owner = 'result'
+            else:
+                last_line_owner = None
+            position += 1
+        elif marker == '+':
+            result.append(text + '\n')
+            last_line_owner = 'result'
+        elif marker == '\\':
+            # "\ No newline at end of file" applies to the preceding line
+            if last_line_owner == 'result' and result and result[-1].endswith('\n'):
+                result[-1] = result[-1][:-1]
+        else:
+            in_hunk = False
+    
+    result.extend(lines[position:])
+    return result
+
+
+class HashCache:
+    """SQLite-backed digest cache keyed on (dev, inode, size, mtime_ns, algorithm)
+    
+    Any change to a file's contents changes its size or mtime, so stale
+    entries are never returned; they are simply never looked up again.
+    """
+    
+    def __init__(self, db_path=HASH_CACHE_PATH):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        if self._conn is None:
+            try:
+                if self.db_path != ':memory:':
+                    os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            except (OSError, sqlite3.Error):
+                # Fall back to an in-process cache if the cache file is unusable
+                self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS hashes ('
+                'dev INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, algorithm TEXT, '
+                'digest TEXT NOT NULL, path TEXT, '
+                'PRIMARY KEY (dev, inode, size, mtime_ns, algorithm)) WITHOUT ROWID'
+            )
+        return self._conn
+    
+    def get(self, key):
+        """Get a cached digest for key, or None"""
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT digest FROM hashes WHERE dev=? AND inode=? AND size=? AND mtime_ns=? AND algorithm=?',
+                key
+            ).fetchone()
+        return row[0] if row else None
+    
+    def put(self, key, digest, path=None):
+        """Store a digest for key"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)', (*key, digest, path))
+            conn.commit()
+
+
+def _file_version(file_stat):
+    """Identify a file's contents by dev/inode/size/mtime, as used for ETags and range writes"""
+    return f'{file_stat.st_dev:x}-{file_stat.st_ino:x}-{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}'
+
+
+def _guess_mime(name, path, item_stat):
+    return mimetypes.guess_type(path)[0] if stat.S_ISREG(item_stat.st_mode) else None
+
+
+# How each listing field is derived from (name, path, stat); only requested fields are computed
+_LISTING_GETTERS = {
+    'name': lambda name, path, item_stat: name,
+    'path': lambda name, path, item_stat: path,
+    'type': lambda name, path, item_stat: 'directory' if stat.S_ISDIR(item_stat.st_mode) else 'file',
+    'size': lambda name, path, item_stat: item_stat.st_size,
+    'modified': lambda name, path, item_stat: datetime.fromtimestamp(item_stat.st_mtime).isoformat(),
+    'permissions': lambda name, path, item_stat: oct(item_stat.st_mode)[-3:],
+    'mime_type': _guess_mime,
+}
+_COMPACT_GETTERS = {
+    'name': lambda name, path, item_stat: name,
+    'type': lambda name, path, item_stat: 'd' if stat.S_ISDIR(item_stat.st_mode) else 'f',
+    'size': lambda name, path, item_stat: item_stat.st_size,
+    'mtime': lambda name, path, item_stat: int(item_stat.st_mtime),
+    'mode': lambda name, path, item_stat: item_stat.st_mode & 0o777,
+    'mime_type': _guess_mime,
+}
+
+
+def _sniff_bytes(header):
+    """Identify content from its first bytes, falling back to a text/binary guess"""
+    if not header:
+        return 'application/x-empty'
+    for offset, signature, mime_type in MAGIC_SIGNATURES:
+        if header.startswith(signature, offset):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'audio/wav'
+    if header[4:8] == b'ftyp':
+        return 'video/mp4'
+    if header.startswith(b'#!'):
+        return 'text/x-script'
+    if b'\x00' in header:
+        return 'application/octet-stream'
+    try:
+        # A multi-byte character may be cut off at the end of the sample
+        header.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(header) - 3:
+            return 'application/octet-stream'
+    return 'text/plain'
+
+
+def _timed(method):
+    """Report the duration of a FileManager call to its observer and the profiler"""
+    name = method.__name__
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with profiler.phase(name):
+            observer = self.observer
+            if observer is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                observer(name, time.perf_counter() - start)
+    
+    return wrapper
+
+
+def _stat_key(file_stat, algorithm):
+    """Build the hash cache key for a stat result"""
+    return (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns, algorithm)
+
 
 class FileManager:
     def __init__(self):
         self.allowed_operations = ['read', 'write', 'delete', 'rename', 'move', 'copy']
+        self.hash_cache = HashCache()
+        # Optional callable(method_name, seconds) invoked after each timed call
+        self.observer = None
+        self.jobs = {}
+        self._jobs_lock = threading.Lock()
+        # (dev, inode, size, mtime_ns) -> sniffed mime type, least recently used first
+        self._sniff_cache = OrderedDict()
+        self._sniff_lock = threading.Lock()
     
-    def get_directory_contents(self, path):
-        """Get contents of a directory"""
+    @_timed
+    def get_directory_contents(self, path, compact=False, fields=None):
+        """Get contents of a directory
+
+        With compact=True the listing is returned as parallel column arrays
+        (name, type, size, mtime as integer epoch seconds, mode) instead of
+        one dict per item. fields (a list or comma-separated string) limits
+        the listing to the given fields, so derived ones such as mime_type or
+        modified are only computed when asked for.
+        """
         try:
+            if isinstance(fields, str):
+                fields = [field.strip() for field in fields.split(',') if field.strip()]
+            getters = _COMPACT_GETTERS if compact else _LISTING_GETTERS
+            if not fields:
+                fields = DEFAULT_COMPACT_FIELDS if compact else LISTING_FIELDS
+            unknown = [field for field in fields if field not in getters]
+            if unknown:
+                return {'error': f"Unknown field(s): {', '.join(unknown)}"}
+            selected = [(field, getters[field]) for field in fields]
+            needs_stat = any(field not in ('name', 'path') for field in fields)
+            
             if not os.path.exists(path):
                 return {'error': 'Directory does not exist'}
             
@@ -21,35 +387,46 @@ class FileManager:
                 return {'error': 'Path is not a directory'}
             
             items = []
+            columns = {field: [] for field in fields}
             try:
-                for item_name in sorted(os.listdir(path)):
+                with profiler.phase('listdir'):
+                    names = os.listdir(path)
+                with profiler.phase('sort'):
+                    names.sort()
+                
+                item_stat = None
+                for item_name in names:
                     if item_name.startswith('.'):
                         continue  # Skip hidden files for now
                     
                     item_path = os.path.join(path, item_name)
-                    item_stat = os.stat(item_path)
+                    if needs_stat:
+                        with profiler.phase('stat'):
+                            item_stat = os.stat(item_path)
                     
-                    item_info = {
-                        'name': item_name,
-                        'path': item_path,
-                        'type': 'directory' if os.path.isdir(item_path) else 'file',
-                        'size': item_stat.st_size,
-                        'modified': datetime.fromtimestamp(item_stat.st_mtime).isoformat(),
-                        'permissions': oct(item_stat.st_mode)[-3:],
-                        'mime_type': mimetypes.guess_type(item_path)[0] if os.path.isfile(item_path) else None
-                    }
-                    items.append(item_info)
+                    with profiler.phase('format'):
+                        if compact:
+                            for field, getter in selected:
+                                columns[field].append(getter(item_name, item_path, item_stat))
+                        else:
+                            items.append({field: getter(item_name, item_path, item_stat) for field, getter in selected})
                 
-                return {
+                result = {
                     'path': path,
-                    'items': items,
                     'parent': os.path.dirname(path) if path != '/' else None
                 }
+                if compact:
+                    result['format'] = 'compact'
+                    result['columns'] = columns
+                else:
+                    result['items'] = items
+                return result
             except PermissionError:
                 return {'error': 'Permission denied'}
         except Exception as e:
             return {'error': str(e)}
     
+    @_timed
     def read_file(self, file_path):
         """Read file contents"""
         try:
@@ -59,20 +436,22 @@ class FileManager:
             if not os.path.isfile(file_path):
                 return {'error': 'Path is not a file'}
             
-            # Check file size (limit to 1MB for text files)
+            # Check file size (limit to 1MB for text files; larger ones go through read_range)
             file_size = os.path.getsize(file_path)
             if file_size > 1024 * 1024:
-                return {'error': 'File too large to display'}
+                return {'error': 'File too large to display', 'too_large': True, 'size': file_size}
             
             # Try to read as text
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+                content = _normalize_newlines(data.decode('utf-8'))
                 return {
                     'path': file_path,
                     'content': content,
                     'type': 'text',
-                    'size': file_size
+                    'size': file_size,
+                    'sha256': hashlib.sha256(data).hexdigest()
                 }
             except UnicodeDecodeError:
                 return {'error': 'Binary file cannot be displayed as text'}
@@ -82,24 +461,305 @@ class FileManager:
         except Exception as e:
             return {'error': str(e)}
     
-    def write_file(self, file_path, content):
-        """Write content to file"""
+    def _atomic_write(self, file_path, data, fsync=None):
+        """Write bytes (or an iterable of byte chunks) to a temp file next to file_path and rename it into place
+        
+        Readers see either the old or the new contents, never a partial file.
+        """
+        fsync = fsync or FSYNC_POLICY
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'Unknown fsync policy: {fsync}')
+        
+        # Write through symlinks rather than replacing the link itself
+        target = os.path.realpath(file_path) if os.path.islink(file_path) else file_path
+        directory = os.path.dirname(target) or '.'
+        
+        try:
+            existing = os.stat(target)
+        except FileNotFoundError:
+            existing = None
+        
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(target)}.', suffix='.tmp')
+        except PermissionError:
+            # A writable file in a read-only directory cannot be replaced, only rewritten
+            if existing is None:
+                raise
+            self._write_in_place(target, data, fsync)
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if isinstance(data, (bytes, bytearray)):
+                    f.write(data)
+                else:
+                    # An iterable of chunks, so large files need not be held in memory
+                    for chunk in data:
+                        f.write(chunk)
+                f.flush()
+                if fsync != 'none':
+                    os.fsync(f.fileno())
+            
+            # Keep the permissions (and, where allowed, ownership) of the file being replaced
+            if existing is not None:
+                os.chmod(temp_path, stat.S_IMODE(existing.st_mode))
+                try:
+                    os.chown(temp_path, existing.st_uid, existing.st_gid)
+                except (PermissionError, AttributeError):
+                    pass
+            else:
+                os.chmod(temp_path, 0o666 & ~_process_umask())
+            
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        
+        if fsync == 'full':
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+    
+    def _write_in_place(self, target, data, fsync):
+        """Overwrite an existing file's contents (not atomic; used when no temp file can be created)"""
+        if not isinstance(data, (bytes, bytearray)):
+            # Chunks may be read from the target itself (write_ranges), so collect them before truncating
+            spooled = tempfile.TemporaryFile()
+            for chunk in data:
+                spooled.write(chunk)
+            spooled.seek(0)
+        else:
+            spooled = None
+        try:
+            with open(target, 'r+b') as f:
+                if spooled is None:
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(spooled, f, RANGE_COPY_CHUNK)
+                f.truncate()
+                f.flush()
+                if fsync != 'none':
+                    os.fsync(f.fileno())
+        finally:
+            if spooled is not None:
+                spooled.close()
+    
+    @_timed
+    def write_file(self, file_path, content, fsync=None):
+        """Write content to file atomically"""
         try:
             # Create directory if it doesn't exist
             directory = os.path.dirname(file_path)
             if directory and not os.path.exists(directory):
                 os.makedirs(directory)
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            data = content.encode('utf-8')
+            self._atomic_write(file_path, data, fsync)
+            
+            return {
+                'success': True,
+                'path': file_path,
+                'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest()
+            }
+        
+        except PermissionError:
+            return {'error': 'Permission denied'}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    @_timed
+    def patch_file(self, file_path, base_sha256, changes=None, diff=None, fsync=None):
+        """Apply line-range changes or a unified diff to a file
+        
+        base_sha256 is the hash returned by read_file; if the file changed since,
+        nothing is written and a conflict is reported.
+        """
+        try:
+            if not os.path.isfile(file_path):
+                return {'error': 'File does not exist'}
+            
+            if changes is None and diff is None:
+                return {'error': 'Either changes or diff is required'}
             
-            return {'success': True, 'path': file_path}
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            
+            current_sha256 = hashlib.sha256(data).hexdigest()
+            if current_sha256 != base_sha256:
+                return {
+                    'error': 'File has been modified since it was loaded',
+                    'conflict': True,
+                    'sha256': current_sha256
+                }
+            
+            try:
+                text = data.decode('utf-8')
+            except UnicodeDecodeError:
+                return {'error': 'Binary file cannot be patched'}
+            newline = _detect_newline(text)
+            lines = _split_lines(_normalize_newlines(text))
+            
+            try:
+                if diff is not None:
+                    lines = _apply_unified_diff(lines, diff)
+                else:
+                    lines = _apply_line_changes(lines, changes)
+            except PatchConflict as e:
+                return {'error': str(e), 'conflict': True, 'sha256': current_sha256}
+            
+            # Patches work on LF lines; write the file back with the line ending it had
+            new_text = _normalize_newlines(''.join(lines))
+            if newline != '\n':
+                new_text = new_text.replace('\n', newline)
+            new_data = new_text.encode('utf-8')
+            self._atomic_write(file_path, new_data, fsync)
+            
+            return {
+                'success': True,
+                'path': file_path,
+                'size': len(new_data),
+                'sha256': hashlib.sha256(new_data).hexdigest()
+            }
+        
+        except PermissionError:
+            return {'error': 'Permission denied'}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    @_timed
+    def read_range(self, file_path, offset=0, length=RANGE_READ_SIZE):
+        """Read a window of a text file for paged editing
+        
+        offset should be the start of a line (0 or a previous window's
+        next_offset). The window is trimmed back to its last newline, or
+        extended to the end of the line if it holds none, so windows always
+        cover whole lines and can be edited and written back independently.
+        """
+        try:
+            offset = int(offset)
+            length = min(max(1, int(length)), MAX_RANGE_READ)
+            if not os.path.isfile(file_path):
+                return {'error': 'File does not exist'}
+            
+            with open(file_path, 'rb') as f:
+                file_stat = os.fstat(f.fileno())
+                if offset < 0 or offset > file_stat.st_size:
+                    return {'error': 'Offset is outside the file'}
+                
+                data = os.pread(f.fileno(), length, offset)
+                end = offset + len(data)
+                if end < file_stat.st_size:
+                    cut = data.rfind(b'\n')
+                    if cut >= 0:
+                        data = data[:cut + 1]
+                    else:
+                        # A single line longer than the window: read on to its end
+                        while end < file_stat.st_size and b'\n' not in data[-length:]:
+                            if len(data) >= MAX_RANGE_READ:
+                                return {'error': 'Line too long for paged editing'}
+                            more = os.pread(f.fileno(), length, end)
+                            if not more:
+                                break
+                            data += more
+                            end += len(more)
+                        cut = data.find(b'\n')
+                        if cut >= 0:
+                            data = data[:cut + 1]
+            
+            try:
+                content = data.decode('utf-8')
+            except UnicodeDecodeError:
+                return {'error': 'Binary file cannot be displayed as text'}
+            
+            next_offset = offset + len(data)
+            return {
+                'path': file_path,
+                'offset': offset,
+                'length': len(data),
+                'next_offset': next_offset,
+                'eof': next_offset >= file_stat.st_size,
+                'size': file_stat.st_size,
+                'newline': '\r\n' if b'\r\n' in data else '\n',
+                'content': content,
+                'version': _file_version(file_stat)
+            }
         
+        except (TypeError, ValueError):
+            return {'error': 'offset and length must be integers'}
         except PermissionError:
             return {'error': 'Permission denied'}
         except Exception as e:
             return {'error': str(e)}
     
+    @_timed
+    def write_ranges(self, file_path, version, ranges, fsync=None):
+        """Replace byte ranges of a file, copying everything else from the current contents
+        
+        Each range is {'offset', 'length', 'content'} in terms of the file as
+        it was at version (from read_range); if the file changed since,
+        nothing is written and a conflict is reported.
+        """
+        try:
+            if not os.path.isfile(file_path):
+                return {'error': 'File does not exist'}
+            
+            try:
+                edits = sorted(
+                    (int(item['offset']), int(item['length']), item['content'].encode('utf-8'))
+                    for item in ranges
+                )
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return {'error': 'Each range needs integer offset and length, and string content'}
+            
+            with open(file_path, 'rb') as f:
+                file_stat = os.fstat(f.fileno())
+                current_version = _file_version(file_stat)
+                if current_version != version:
+                    return {
+                        'error': 'File has been modified since it was loaded',
+                        'conflict': True,
+                        'version': current_version
+                    }
+                
+                position = 0
+                for offset, length, _content in edits:
+                    if offset < position or length < 0 or offset + length > file_stat.st_size:
+                        return {'error': 'Ranges overlap or fall outside the file'}
+                    position = offset + length
+                
+                def chunks():
+                    position = 0
+                    for offset, length, content in edits + [(file_stat.st_size, 0, b'')]:
+                        while position < offset:
+                            chunk = os.pread(f.fileno(), min(RANGE_COPY_CHUNK, offset - position), position)
+                            if not chunk:
+                                raise OSError('File was truncated while writing')
+                            position += len(chunk)
+                            yield chunk
+                        yield content
+                        position = offset + length
+                
+                self._atomic_write(file_path, chunks(), fsync)
+            
+            new_stat = os.stat(file_path)
+            return {
+                'success': True,
+                'path': file_path,
+                'size': new_stat.st_size,
+                'version': _file_version(new_stat)
+            }
+        
+        except PermissionError:
+            return {'error': 'Permission denied'}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    @_timed
     def create_directory(self, dir_path):
         """Create a new directory"""
         try:
@@ -114,6 +774,7 @@ class FileManager:
         except Exception as e:
             return {'error': str(e)}
     
+    @_timed
     def delete_item(self, item_path):
         """Delete file or directory"""
         try:
@@ -132,6 +793,7 @@ class FileManager:
         except Exception as e:
             return {'error': str(e)}
     
+    @_timed
     def rename_item(self, old_path, new_name):
         """Rename file or directory"""
         try:
@@ -152,6 +814,7 @@ class FileManager:
         except Exception as e:
             return {'error': str(e)}
     
+    @_timed
     def move_item(self, source_path, destination_path):
         """Move file or directory"""
         try:
@@ -173,6 +836,7 @@ class FileManager:
         except Exception as e:
             return {'error': str(e)}
     
+    @_timed
     def copy_item(self, source_path, destination_path):
         """Copy file or directory"""
         try:
@@ -198,6 +862,7 @@ class FileManager:
         except Exception as e:
             return {'error': str(e)}
     
+    @_timed
     def get_file_tree(self, root_path, max_depth=3):
         """Get file tree structure"""
         def build_tree(path, current_depth=0):
@@ -241,5 +906,544 @@ class FileManager:
         except Exception as e:
             return {'error': str(e)}
 
+    def _sniff_one(self, path):
+        """Sniff one path, answering from the cache while its inode and mtime are unchanged
+
+        Only regular files are opened (non-blocking, so a FIFO swapped in
+        after the stat cannot hang the worker); other types are named from
+        their mode.
+        """
+        file_stat = os.stat(path)
+        if not stat.S_ISREG(file_stat.st_mode):
+            if stat.S_ISDIR(file_stat.st_mode):
+                return 'inode/directory'
+            if stat.S_ISFIFO(file_stat.st_mode):
+                return 'inode/fifo'
+            if stat.S_ISSOCK(file_stat.st_mode):
+                return 'inode/socket'
+            if stat.S_ISCHR(file_stat.st_mode):
+                return 'inode/chardevice'
+            if stat.S_ISBLK(file_stat.st_mode):
+                return 'inode/blockdevice'
+            return 'application/octet-stream'
+        
+        key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+        with self._sniff_lock:
+            mime_type = self._sniff_cache.get(key)
+            if mime_type is not None:
+                self._sniff_cache.move_to_end(key)
+                return mime_type
+        
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            if not stat.S_ISREG(os.fstat(fd).st_mode):
+                return 'application/octet-stream'
+            mime_type = _sniff_bytes(os.pread(fd, SNIFF_BYTES, 0))
+        finally:
+            os.close(fd)
+        
+        with self._sniff_lock:
+            self._sniff_cache[key] = mime_type
+            if len(self._sniff_cache) > SNIFF_CACHE_SIZE:
+                self._sniff_cache.popitem(last=False)
+        return mime_type
+    
+    @_timed
+    def sniff_types(self, paths, max_workers=BATCH_MAX_WORKERS):
+        """Get content-sniffed (magic byte) types for a batch of paths"""
+        try:
+            types = {}
+            errors = []
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(paths) or 1))) as executor:
+                futures = [executor.submit(self._sniff_one, path) for path in paths]
+                for path, future in zip(paths, futures):
+                    try:
+                        types[path] = future.result()
+                    except OSError as e:
+                        errors.append({'path': path, 'error': e.strerror or str(e)})
+                    except (TypeError, ValueError) as e:
+                        errors.append({'path': path, 'error': str(e)})
+            return {'success': True, 'types': types, 'errors': errors}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    @_timed
+    def get_etag(self, path, kind='file', max_depth=3):
+        """Get a strong ETag for a file read ('file'), listing ('directory') or tree ('tree')
+        
+        Files are identified by dev/inode/size/mtime. Listings fold in the stat
+        of every visible entry and trees the stat of every directory they cover,
+        so revalidating costs one stat pass rather than a full listing,
+        formatting and serialization. Returns None if the path cannot be stat'ed.
+        """
+        try:
+            path_stat = os.stat(path)
+            if kind == 'file':
+                return _file_version(path_stat)
+            
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(f'{kind}:{path_stat.st_dev}:{path_stat.st_ino}:{path_stat.st_mtime_ns}\n'.encode())
+            if kind == 'directory':
+                entries = []
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        entry_stat = entry.stat()
+                        entries.append(f'{entry.name}\0{entry_stat.st_ino}\0{entry_stat.st_size}\0'
+                                       f'{entry_stat.st_mtime_ns}\0{entry_stat.st_mode}\n')
+                entries.sort()
+                digest.update(''.join(entries).encode('utf-8', 'surrogateescape'))
+            elif kind == 'tree':
+                # Mirrors get_file_tree: only the directories it would descend into matter
+                pending = [(path, 0)]
+                while pending:
+                    directory, depth = pending.pop()
+                    for name in sorted(os.listdir(directory))[:50]:
+                        child = os.path.join(directory, name)
+                        if name.startswith('.') or depth >= max_depth - 1 or not os.path.isdir(child):
+                            continue
+                        try:
+                            child_stat = os.stat(child)
+                        except OSError:
+                            continue
+                        digest.update(f'{child}\0{child_stat.st_ino}\0{child_stat.st_mtime_ns}\n'
+                                      .encode('utf-8', 'surrogateescape'))
+                        pending.append((child, depth + 1))
+            else:
+                raise ValueError(f'Unknown ETag kind: {kind}')
+            return digest.hexdigest()
+        except OSError:
+            return None
+
+    def _compute_hash(self, file_path, algorithm):
+        """Hash a regular file with mmap-backed reads, returning (digest, stat, cached)"""
+        with open(file_path, 'rb') as f:
+            before = os.fstat(f.fileno())
+            key = _stat_key(before, algorithm)
+            
+            cached = self.hash_cache.get(key)
+            if cached is not None:
+                return cached, before, True
+            
+            hasher = hashlib.new(algorithm)
+            if before.st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        mapped.madvise(mmap.MADV_SEQUENTIAL)
+                    view = memoryview(mapped)
+                    try:
+                        # hashlib releases the GIL on large buffers, so pool threads hash in parallel
+                        for offset in range(0, before.st_size, HASH_CHUNK_SIZE):
+                            hasher.update(view[offset:offset + HASH_CHUNK_SIZE])
+                    finally:
+                        view.release()
+            digest = hasher.hexdigest()
+            
+            # Only cache if the file was not modified while we were reading it
+            if _stat_key(os.fstat(f.fileno()), algorithm) == key:
+                self.hash_cache.put(key, digest, file_path)
+            return digest, before, False
+    
+    @_timed
+    def hash_file(self, file_path, algorithm='sha256'):
+        """Get the checksum of a file"""
+        try:
+            if algorithm not in HASH_ALGORITHMS:
+                return {'error': f'Unsupported algorithm: {algorithm}'}
+            
+            if not os.path.exists(file_path):
+                return {'error': 'File does not exist'}
+            
+            if not os.path.isfile(file_path):
+                return {'error': 'Path is not a file'}
+            
+            digest, file_stat, cached = self._compute_hash(file_path, algorithm)
+            return {
+                'path': file_path,
+                'algorithm': algorithm,
+                'digest': digest,
+                'size': file_stat.st_size,
+                'cached': cached
+            }
+        
+        except PermissionError:
+            return {'error': 'Permission denied'}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def _walk_files(self, root_path, recursive=True, include_hidden=True):
+        """Yield regular files below root_path without following symlinks"""
+        pending = [root_path]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if not include_hidden and entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive:
+                                    pending.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                yield entry
+                        except OSError:
+                            continue
+            except (PermissionError, OSError):
+                continue
+    
+    @_timed
+    def hash_directory(self, dir_path, algorithm='sha256', recursive=True, include_hidden=True,
+                       max_workers=HASH_MAX_WORKERS):
+        """Get checksums of every file in a directory, e.g. to build a manifest"""
+        try:
+            if algorithm not in HASH_ALGORITHMS:
+                return {'error': f'Unsupported algorithm: {algorithm}'}
+            
+            if not os.path.exists(dir_path):
+                return {'error': 'Directory does not exist'}
+            
+            if not os.path.isdir(dir_path):
+                return {'error': 'Path is not a directory'}
+            
+            paths = [entry.path for entry in self._walk_files(dir_path, recursive, include_hidden)]
+            
+            files = []
+            errors = []
+            cached_count = 0
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                futures = [executor.submit(self._compute_hash, path, algorithm) for path in paths]
+                for path, future in zip(paths, futures):
+                    try:
+                        digest, file_stat, cached = future.result()
+                    except OSError as e:
+                        errors.append({'path': path, 'error': e.strerror or str(e)})
+                        continue
+                    cached_count += cached
+                    files.append({
+                        'path': path,
+                        'relative_path': os.path.relpath(path, dir_path),
+                        'digest': digest,
+                        'size': file_stat.st_size
+                    })
+            
+            files.sort(key=lambda item: item['relative_path'])
+            return {
+                'path': dir_path,
+                'algorithm': algorithm,
+                'files': files,
+                'errors': errors,
+                'total_size': sum(item['size'] for item in files),
+                'cached': cached_count
+            }
+        
+        except PermissionError:
+            return {'error': 'Permission denied'}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def _partial_hash(self, file_path, size):
+        """Hash the first and last block of a file, returning (digest, bytes_read)"""
+        hasher = hashlib.blake2b(digest_size=16)
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            head = os.pread(fd, PARTIAL_HASH_BLOCK, 0)
+            hasher.update(head)
+            bytes_read = len(head)
+            if size > PARTIAL_HASH_BLOCK:
+                tail_offset = max(PARTIAL_HASH_BLOCK, size - PARTIAL_HASH_BLOCK)
+                tail = os.pread(fd, PARTIAL_HASH_BLOCK, tail_offset)
+                hasher.update(tail)
+                bytes_read += len(tail)
+        finally:
+            os.close(fd)
+        return hasher.hexdigest(), bytes_read
+    
+    def find_duplicates(self, root_path, min_size=1, algorithm='sha256', include_hidden=True,
+                        stats=None, cancelled=None, max_workers=HASH_MAX_WORKERS):
+        """Yield groups of identical files below root_path
+        
+        Files are bucketed by size, then by a hash of their first and last
+        block, and only the survivors are hashed in full. stats, if given, is
+        updated in place with progress counters; cancelled is an optional
+        threading.Event that stops the scan early.
+        """
+        if stats is None:
+            stats = {}
+        stats.update({'files_scanned': 0, 'bytes_total': 0, 'bytes_read': 0, 'groups': 0, 'phase': 'scanning'})
+        
+        def is_cancelled():
+            return cancelled is not None and cancelled.is_set()
+        
+        # Bucket by size; hard links to one inode are the same file, not duplicates
+        by_size = {}
+        seen_inodes = set()
+        for entry in self._walk_files(root_path, include_hidden=include_hidden):
+            if is_cancelled():
+                return
+            try:
+                entry_stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if entry_stat.st_size < min_size or (entry_stat.st_dev, entry_stat.st_ino) in seen_inodes:
+                continue
+            seen_inodes.add((entry_stat.st_dev, entry_stat.st_ino))
+            stats['files_scanned'] += 1
+            stats['bytes_total'] += entry_stat.st_size
+            by_size.setdefault(entry_stat.st_size, []).append(entry.path)
+        
+        candidates = [(size, paths) for size, paths in by_size.items() if len(paths) > 1]
+        # Largest files first, so the groups that free the most space arrive early
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        
+        stats['phase'] = 'hashing'
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for size, paths in candidates:
+                if is_cancelled():
+                    return
+                
+                by_partial = {}
+                for path, future in zip(paths, [executor.submit(self._partial_hash, path, size) for path in paths]):
+                    try:
+                        partial, bytes_read = future.result()
+                    except OSError:
+                        continue
+                    stats['bytes_read'] += bytes_read
+                    by_partial.setdefault(partial, []).append(path)
+                
+                for partial, same_partial in by_partial.items():
+                    if len(same_partial) < 2:
+                        continue
+                    
+                    # The partial hash already covered the whole file
+                    if size <= 2 * PARTIAL_HASH_BLOCK:
+                        stats['groups'] += 1
+                        yield {'size': size, 'digest': None, 'paths': sorted(same_partial)}
+                        continue
+                    
+                    by_digest = {}
+                    futures = [executor.submit(self._compute_hash, path, algorithm) for path in same_partial]
+                    for path, future in zip(same_partial, futures):
+                        try:
+                            digest, _, cached = future.result()
+                        except OSError:
+                            continue
+                        if not cached:
+                            stats['bytes_read'] += size
+                        by_digest.setdefault(digest, []).append(path)
+                    
+                    for digest, same_digest in by_digest.items():
+                        if len(same_digest) > 1:
+                            stats['groups'] += 1
+                            yield {'size': size, 'digest': digest, 'paths': sorted(same_digest)}
+        
+        stats['phase'] = 'done'
+    
+    def _prune_jobs(self):
+        """Drop the oldest finished jobs beyond MAX_FINISHED_JOBS"""
+        finished = sorted(
+            (job for job in self.jobs.values() if job['status'] != 'running'),
+            key=lambda job: job['finished'] or 0
+        )
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job['id']]
+    
+    def start_duplicate_scan(self, root_path, min_size=1, algorithm='sha256', include_hidden=True):
+        """Start a background duplicate scan and return its job id"""
+        if algorithm not in HASH_ALGORITHMS:
+            return {'error': f'Unsupported algorithm: {algorithm}'}
+        
+        if not os.path.isdir(root_path):
+            return {'error': 'Directory does not exist'}
+        
+        options = (os.path.realpath(root_path), min_size, algorithm, bool(include_hidden))
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': 'duplicates',
+            'path': root_path,
+            'options': options,
+            'status': 'running',
+            'groups': [],
+            'stats': {},
+            'error': None,
+            'started': time.time(),
+            'finished': None,
+            'cancel_event': threading.Event()
+        }
+        
+        def run():
+            status, error = 'done', None
+            try:
+                for group in self.find_duplicates(root_path, min_size, algorithm, include_hidden,
+                                                  stats=job['stats'], cancelled=job['cancel_event']):
+                    job['groups'].append(group)
+                if job['cancel_event'].is_set():
+                    status = 'cancelled'
+            except Exception as e:
+                status, error = 'failed', str(e)
+            # Status and finish time change together, so _prune_jobs never sees one without the other
+            with self._jobs_lock:
+                job['error'] = error
+                job['finished'] = time.time()
+                job['status'] = status
+        
+        with self._jobs_lock:
+            running = [other for other in self.jobs.values() if other['status'] == 'running']
+            for other in running:
+                # The same scan requested again follows the one already running
+                if other['options'] == options and not other['cancel_event'].is_set():
+                    return {'success': True, 'job_id': other['id'], 'reused': True}
+            if len(running) >= MAX_RUNNING_SCANS:
+                return {'error': f'Too many duplicate scans running (at most {MAX_RUNNING_SCANS}); try again later'}
+            self._prune_jobs()
+            self.jobs[job['id']] = job
+        threading.Thread(target=run, name=f"duplicates-{job['id'][:8]}", daemon=True).start()
+        return {'success': True, 'job_id': job['id']}
+    
+    def get_job(self, job_id, since=0):
+        """Get a background job's status and the results produced after index since"""
+        job = self.jobs.get(job_id)
+        if not job:
+            return {'error': 'Job not found'}
+        
+        groups = job['groups'][since:]
+        return {
+            'job_id': job_id,
+            'status': job['status'],
+            'error': job['error'],
+            'stats': dict(job['stats']),
+            'groups': groups,
+            'next': since + len(groups),
+            'elapsed': (job['finished'] or time.time()) - job['started']
+        }
+    
+    def cancel_job(self, job_id):
+        """Ask a running background job to stop"""
+        job = self.jobs.get(job_id)
+        if not job:
+            return {'error': 'Job not found'}
+        
+        job['cancel_event'].set()
+        return {'success': True, 'job_id': job_id}
+    
+    def _batch_operation_paths(self, operation):
+        """Get the paths a batch operation reads or modifies"""
+        if not isinstance(operation, dict):
+            return []
+        paths = [operation.get(key) for key in ('path', 'source') if operation.get(key)]
+        source, destination = operation.get('source'), operation.get('destination')
+        if isinstance(destination, str) and destination:
+            # Moves and copies into a directory only touch the entry they create there,
+            # so several of them into the same folder can still run in parallel
+            if isinstance(source, str) and source and os.path.isdir(destination):
+                destination = os.path.join(destination, os.path.basename(source.rstrip(os.sep)))
+            paths.append(destination)
+        renamed, new_name = operation.get('path'), operation.get('new_name')
+        if operation.get('op') == 'rename' and isinstance(renamed, str) and isinstance(new_name, str):
+            if renamed and new_name:
+                paths.append(os.path.join(os.path.dirname(renamed), new_name))
+        return [os.path.abspath(path) for path in paths if isinstance(path, str)]
+    
+    def _batch_lanes(self, operations):
+        """Group operations that touch overlapping paths into ordered lanes"""
+        parent = list(range(len(operations)))
+        
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+        
+        def union(a, b):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        
+        # A path conflicts with itself, its ancestors and its descendants
+        exact_owner = {}
+        prefix_owner = {}
+        for index, operation in enumerate(operations):
+            for path in self._batch_operation_paths(operation):
+                if path in prefix_owner:
+                    union(index, prefix_owner[path])
+                ancestor = path
+                while True:
+                    if ancestor in exact_owner:
+                        union(index, exact_owner[ancestor])
+                    prefix_owner.setdefault(ancestor, index)
+                    parent_dir = os.path.dirname(ancestor)
+                    if parent_dir == ancestor:
+                        break
+                    ancestor = parent_dir
+                exact_owner.setdefault(path, index)
+        
+        lanes = {}
+        for index in range(len(operations)):
+            lanes.setdefault(find(index), []).append(index)
+        return list(lanes.values())
+    
+    def run_batch_operation(self, operation):
+        """Run a single batch operation through the matching FileManager method"""
+        try:
+            if not isinstance(operation, dict):
+                return {'error': 'Operation must be an object'}
+            
+            op = operation.get('op')
+            path = operation.get('path')
+            source = operation.get('source')
+            destination = operation.get('destination')
+            
+            if op in ('delete', 'mkdir', 'write', 'rename') and not path:
+                return {'error': 'Path is required'}
+            if op in ('move', 'copy') and (not source or not destination):
+                return {'error': 'Source and destination are required'}
+            # Integers would be taken for file descriptors by os.path and os.stat
+            for key in ('path', 'source', 'destination', 'new_name'):
+                if operation.get(key) is not None and not isinstance(operation[key], str):
+                    return {'error': f'{key} must be a string'}
+            
+            if op == 'delete':
+                return self.delete_item(path)
+            if op == 'mkdir':
+                return self.create_directory(path)
+            if op == 'write':
+                return self.write_file(path, operation.get('content', ''), operation.get('fsync'))
+            if op == 'rename':
+                new_name = operation.get('new_name')
+                if not new_name:
+                    return {'error': 'Path and new name are required'}
+                return self.rename_item(path, new_name)
+            if op == 'move':
+                return self.move_item(source, destination)
+            if op == 'copy':
+                return self.copy_item(source, destination)
+            return {'error': f'Unsupported operation: {op}'}
+        except Exception as e:
+            return {'error': str(e)}
+    
+    def run_batch(self, operations, max_workers=BATCH_MAX_WORKERS):
+        """Run a list of operations, yielding (index, result) as each one completes
+        
+        Operations touching overlapping paths run sequentially in request order;
+        independent ones run concurrently on up to max_workers threads.
+        """
+        if not operations:
+            return
+        
+        lanes = self._batch_lanes(operations)
+        results = queue.Queue()
+        
+        def run_lane(indices):
+            for index in indices:
+                results.put((index, self.run_batch_operation(operations[index])))
+        
+        workers = max(1, min(max_workers, len(lanes)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for lane in lanes:
+                executor.submit(run_lane, lane)
+            for _ in range(len(operations)):
+                yield results.get()
+
 # Global file manager instance
 file_manager = FileManager()
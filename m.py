@@ -4,30 +4,124 @@ Standalone Telegram Remote System Administration Bot
 Complete implementation in a single file with all features
 """
 
+import time
+
+# Taken before the remaining imports so the startup report includes them
+_PROCESS_STARTED = time.perf_counter()
+
 import os
 import sys
 import subprocess
 import requests
 import json
-import time
 import logging
-import tempfile
 import shutil
-import hashlib
 import re
+import hmac
+import queue
+import select
+import sqlite3
+import secrets
+import signal
 import threading
-from pathlib import Path
+import importlib
+import heapq
+import itertools
+from array import array
+import importlib.util
+import importlib.metadata
+from collections import OrderedDict, deque
 from typing import Dict, Tuple, Optional, List
 
 # Bot Configuration - You'll need to update this with your bot token
 BOT_TOKEN = os.getenv("BOT_TOKEN", "7814902912:AAHlmK87m7cp_7gJj2a3aPInyEVvAWpO9EI")
-TELEGRAM_BASE_URL = "https://api.telegram.org/bot"
+# Point TELEGRAM_API_ROOT at a local Bot API server (or the benchmark fake) instead of Telegram
+TELEGRAM_API_ROOT = os.getenv("TELEGRAM_API_ROOT", "https://api.telegram.org").rstrip('/')
+
+# Webhook mode: set WEBHOOK_URL to the public https URL Telegram should push updates to.
+# The embedded receiver listens on WEBHOOK_LISTEN:WEBHOOK_PORT and serves the URL's path;
+# set WEBHOOK_CERT/WEBHOOK_KEY to terminate TLS here instead of behind a reverse proxy.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_CERT = os.getenv("WEBHOOK_CERT", "")
+WEBHOOK_KEY = os.getenv("WEBHOOK_KEY", "")
+# Upload WEBHOOK_CERT to Telegram when it is self-signed
+WEBHOOK_SELF_SIGNED = os.getenv("WEBHOOK_SELF_SIGNED", "") not in ("", "0", "false")
+# Skip setWebhook, e.g. when testing the receiver locally with curl
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "1") not in ("", "0", "false")
+
+# Update types the bot handles, for both getUpdates and setWebhook
+ALLOWED_UPDATES = ['message', 'callback_query']
 
 # Configuration Constants
 MAX_UPLOAD_SIZE = 2000 * 1024 * 1024  # 20MB
 MAX_DOWNLOAD_SIZE = 5000 * 1024 * 1024  # 50MB
 COMMAND_TIMEOUT = 600  # 10 minutes
 MAX_MESSAGE_LENGTH = 4000
+MAX_CAPTION_LENGTH = 1024
+
+# Files above Telegram's per-document limit are sent as numbered parts of this size,
+# a few at a time; set BOT_SPLIT_COMPRESS=1 to gzip them before splitting
+DOCUMENT_PART_SIZE = int(os.getenv("BOT_DOCUMENT_PART_SIZE", str(49 * 1024 * 1024)))
+DOCUMENT_UPLOAD_CONCURRENCY = int(os.getenv("BOT_UPLOAD_CONCURRENCY", "3"))
+SPLIT_COMPRESS = os.getenv("BOT_SPLIT_COMPRESS", "") not in ("", "0", "false")
+
+# Command history: entries kept in memory per user, rows kept on disk per user,
+# and how often buffered records are written to SQLite
+HISTORY_PER_USER = 500
+HISTORY_DB_PER_USER = 10000
+HISTORY_FLUSH_INTERVAL = 2.0
+HISTORY_DB_PATH = os.getenv("BOT_HISTORY_DB", os.path.join("data", "history.sqlite3"))
+HISTORY_SHOWN = 15
+
+# Telegram file_ids of sent documents, reused while the file is unchanged
+FILE_ID_CACHE_PATH = os.getenv("BOT_FILE_ID_CACHE", os.path.join("data", "file_ids.sqlite3"))
+FILE_ID_CACHE_SIZE = 10000
+# A cached id is only dropped when Telegram says it is invalid; rate limits are waited out
+FILE_ID_REJECTED = re.compile(r'file identifier|file_id|file id|file reference|expired', re.IGNORECASE)
+FILE_ID_SEND_ATTEMPTS = 3
+MAX_RETRY_AFTER = 30
+
+# Packages the bot cannot run without; checked once per interpreter and cached in the marker
+REQUIRED_PACKAGES = ['requests']
+DEPENDENCY_MARKER = os.path.join("data", "dependencies.json")
+
+# Time from process start to the first completed poll that the startup report warns above
+STARTUP_TARGET_MS = float(os.getenv("BOT_STARTUP_TARGET_MS", "1500"))
+
+# Snapshot of per-user directories and background processes, restored on restart
+STATE_PATH = os.getenv("BOT_STATE_PATH", os.path.join("data", "state.json"))
+STATE_SNAPSHOT_INTERVAL = 5.0
+# Longest gap between liveness checks of a re-adopted process when no pidfd is available
+ADOPTED_POLL_MAX = 1.0
+
+# Host metrics sampler: seconds between samples, seconds of history kept, rows shown by /top
+METRICS_INTERVAL = float(os.getenv("BOT_METRICS_INTERVAL", "5"))
+METRICS_RETENTION = int(os.getenv("BOT_METRICS_RETENTION", str(24 * 3600)))
+TOP_PROCESSES = 10
+MIN_METRICS_INTERVAL = 0.5
+
+# Job scheduler: background jobs running at once per user, jobs running in total; lower
+# priority values run first. Each user also gets one foreground job, so long-running
+# background processes never keep interactive commands waiting
+MAX_BACKGROUND_JOBS_PER_USER = int(os.getenv("BOT_MAX_BACKGROUND_JOBS_PER_USER", "3"))
+MAX_JOBS = int(os.getenv("BOT_MAX_JOBS", "16"))
+JOB_PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+FINISHED_JOBS_KEPT = 50
+
+# /install: pip's cache is shared with bot scripts, and wheels dropped into the
+# wheelhouse are preferred, so repeated installs do not download again
+PIP_CACHE_DIR = os.path.abspath(os.getenv("BOT_PIP_CACHE_DIR", os.path.join("data", "pip-cache")))
+WHEELHOUSE_DIR = os.path.abspath(os.getenv("BOT_WHEELHOUSE", os.path.join("data", "wheelhouse")))
+INSTALL_TIMEOUT = 900
+INSTALL_PROGRESS_INTERVAL = 3.0
+
+# /browse: entries per page, cached listings per chat and how long they are trusted
+BROWSE_PAGE_SIZE = 20
+BROWSE_CACHE_SIZE = 20
+BROWSE_CACHE_TTL = 30.0
 
 # Emojis for better UX
 EMOJIS = {
@@ -36,23 +130,878 @@ EMOJIS = {
     'info': 'ℹ️', 'rocket': '🚀', 'gear': '⚙️', 'terminal': '💻'
 }
 
+_optional_modules = {}
+
+
+def optional_import(name: str):
+    """Import an optional module on first use, returning None if it is not installed
+
+    Failed imports are remembered too, so a missing module does not cost a
+    search of sys.path on every call.
+    """
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+    return _optional_modules[name]
+
+
+class StartupTimer:
+    """Wall-clock phases from process start until the bot first hears from Telegram"""
+
+    def __init__(self, imported_at: float):
+        self.phases = [('imports', imported_at - _PROCESS_STARTED)]
+        self.total = imported_at - _PROCESS_STARTED
+        self._last = time.perf_counter()
+        self.ready = threading.Event()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self.total += now - self._last
+        self._last = now
+
+    def finish(self, phase: str) -> str:
+        """Record the last phase and return the report"""
+        self.mark(phase)
+        self.ready.set()
+        return self.report()
+
+    def report(self) -> str:
+        phases = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases)
+        return f"{phases} (total {self.total * 1000:.1f}ms, target {STARTUP_TARGET_MS:.0f}ms)"
+
+    @property
+    def over_target(self) -> bool:
+        return self.total * 1000 > STARTUP_TARGET_MS
+
+
+def _process_start_time(pid: int) -> Optional[int]:
+    """Kernel start time of a live process, used to tell it apart from a reused PID
+
+    Returns None if the process is gone (or a zombie) or cannot be inspected.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        psutil = optional_import('psutil')
+        if psutil is None:
+            return None
+        try:
+            process = psutil.Process(pid)
+            if process.status() == psutil.STATUS_ZOMBIE:
+                return None
+            return int(process.create_time() * 100)
+        except psutil.Error:
+            return None
+    # Fields after the parenthesised command name: state is field 3, starttime field 22
+    fields = stat[stat.rfind(')') + 2:].split()
+    if fields[0] == 'Z':
+        return None
+    return int(fields[19])
+
+
+class AdoptedProcess:
+    """Popen-like handle for a background process started before the last restart"""
+
+    def __init__(self, pid: int, start_time: int):
+        self.pid = pid
+        self.start_time = start_time
+        self.returncode = None
+
+    def poll(self) -> Optional[int]:
+        # The exit status went to the previous bot process, so it is unknown here
+        if self.returncode is None and _process_start_time(self.pid) != self.start_time:
+            self.returncode = -1
+        return self.returncode
+
+    def _signal(self, sig: int):
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self._signal(signal.SIGTERM)
+
+    def kill(self):
+        self._signal(signal.SIGKILL)
+
+    def _open_pidfd(self) -> Optional[int]:
+        """A pidfd for the process (Linux 5.3+), readable once it exits; None if unavailable"""
+        pidfd_open = getattr(os, 'pidfd_open', None)
+        if pidfd_open is None:
+            return None
+        try:
+            pidfd = pidfd_open(self.pid)
+        except OSError:
+            return None
+        # The pidfd pins whatever process has the PID now; make sure it is still ours
+        if _process_start_time(self.pid) != self.start_time:
+            os.close(pidfd)
+            return None
+        return pidfd
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """Wait for the process to exit, on a pidfd where possible, else polling with backoff"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pidfd = self._open_pidfd()
+        delay = 0.05
+        try:
+            while self.poll() is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise subprocess.TimeoutExpired(str(self.pid), timeout)
+                if pidfd is not None:
+                    readable, _, _ = select.select([pidfd], [], [], remaining)
+                    if readable and self.poll() is None:
+                        # Exited but not yet reaped; wait for that by polling
+                        os.close(pidfd)
+                        pidfd = None
+                    continue
+                time.sleep(delay if remaining is None else min(delay, remaining))
+                delay = min(delay * 2, ADOPTED_POLL_MAX)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+        return self.returncode
+
+
+def _read_host_counters() -> Optional[dict]:
+    """Cumulative host counters: CPU ticks, memory, disk and network bytes, load
+
+    Uses psutil when installed and /proc otherwise; returns None when neither works.
+    """
+    psutil = optional_import('psutil')
+    if psutil is not None:
+        cpu = psutil.cpu_times()
+        disk = psutil.disk_io_counters()
+        net = psutil.net_io_counters(pernic=True)
+        return {
+            'cpu_idle': cpu.idle + getattr(cpu, 'iowait', 0.0),
+            # The same fields as /proc/stat's first eight; guest time is already included in user
+            'cpu_total': sum(getattr(cpu, field, 0.0) for field in
+                             ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')),
+            'memory': psutil.virtual_memory().percent,
+            'disk_read': disk.read_bytes if disk else 0,
+            'disk_write': disk.write_bytes if disk else 0,
+            'net_rx': sum(nic.bytes_recv for name, nic in net.items() if name != 'lo'),
+            'net_tx': sum(nic.bytes_sent for name, nic in net.items() if name != 'lo'),
+            'load': os.getloadavg()[0],
+        }
+    
+    try:
+        with open('/proc/stat') as f:
+            cpu = [int(value) for value in f.readline().split()[1:9]]
+        with open('/proc/meminfo') as f:
+            meminfo = dict(line.split(':', 1) for line in f)
+        total = int(meminfo['MemTotal'].split()[0])
+        available = int(meminfo['MemAvailable'].split()[0])
+        
+        disk_read = disk_write = 0
+        with open('/proc/diskstats') as f:
+            for line in f:
+                fields = line.split()
+                # Whole disks only; partitions would be counted twice
+                if _is_block_device(fields[2]):
+                    disk_read += int(fields[5]) * 512
+                    disk_write += int(fields[9]) * 512
+        
+        net_rx = net_tx = 0
+        with open('/proc/net/dev') as f:
+            for line in f.readlines()[2:]:
+                name, values = line.split(':', 1)
+                if name.strip() != 'lo':
+                    values = values.split()
+                    net_rx += int(values[0])
+                    net_tx += int(values[8])
+    except (OSError, KeyError, ValueError, IndexError):
+        return None
+    
+    return {
+        'cpu_idle': cpu[3] + cpu[4],
+        'cpu_total': sum(cpu),
+        'memory': 100.0 * (total - available) / total if total else 0.0,
+        'disk_read': disk_read,
+        'disk_write': disk_write,
+        'net_rx': net_rx,
+        'net_tx': net_tx,
+        'load': os.getloadavg()[0],
+    }
+
+
+_block_devices = {}
+
+
+def _is_block_device(name: str) -> bool:
+    if name not in _block_devices:
+        _block_devices[name] = (os.path.exists(f'/sys/block/{name}')
+                                and not name.startswith(('loop', 'ram')))
+    return _block_devices[name]
+
+
+def _read_processes() -> Dict[int, tuple]:
+    """Map each PID to (name, CPU seconds, RSS bytes)"""
+    psutil = optional_import('psutil')
+    processes = {}
+    if psutil is not None:
+        for process in psutil.process_iter(['name', 'cpu_times', 'memory_info']):
+            info = process.info
+            if info['cpu_times'] is None or info['memory_info'] is None:
+                continue
+            processes[process.pid] = (info['name'] or '?', info['cpu_times'].user + info['cpu_times'].system,
+                                      info['memory_info'].rss)
+        return processes
+    
+    ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        end = stat.rfind(')')
+        fields = stat[end + 2:].split()
+        processes[int(entry)] = (stat[stat.find('(') + 1:end], (int(fields[11]) + int(fields[12])) / ticks,
+                                 int(fields[21]) * page_size)
+    return processes
+
+
+class HostMetrics:
+    """Background sampler keeping host metrics in fixed-size ring buffers
+
+    Every interval it stores one row of derived rates (CPU %, memory %,
+    disk and network bytes/s, load) in preallocated arrays and the top
+    processes by CPU since the previous sample, so /top and /stats never
+    touch the system themselves.
+    """
+
+    COLUMNS = ('time', 'cpu', 'memory', 'disk_read', 'disk_write', 'net_rx', 'net_tx', 'load')
+
+    def __init__(self, interval: float = METRICS_INTERVAL, retention: int = METRICS_RETENTION):
+        self.interval = max(MIN_METRICS_INTERVAL, interval)
+        self.capacity = max(2, int(retention / self.interval))
+        self._columns = {name: array('d', bytes(8 * self.capacity)) for name in self.COLUMNS}
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._previous = None
+        self._previous_processes = None
+        self.top = []
+        self.available = True
+
+    def run(self, stop_event: threading.Event):
+        """Sample until stop_event is set"""
+        while self.available and not stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.sample()
+            except Exception:
+                # One bad read (e.g. a malformed /proc line) must not stop sampling for good
+                logging.getLogger(__name__).exception("Host metrics sample failed")
+            stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def sample(self):
+        now = time.time()
+        counters = _read_host_counters()
+        if counters is None:
+            self.available = False
+            return
+        processes = _read_processes()
+        
+        previous, self._previous = self._previous, (now, counters)
+        previous_processes, self._previous_processes = self._previous_processes, (now, processes)
+        if previous is None:
+            return
+        
+        elapsed = now - previous[0]
+        if elapsed <= 0:
+            return
+        old = previous[1]
+        cpu_total = counters['cpu_total'] - old['cpu_total']
+        row = {
+            'time': now,
+            'cpu': 100.0 * (1 - (counters['cpu_idle'] - old['cpu_idle']) / cpu_total) if cpu_total > 0 else 0.0,
+            'memory': counters['memory'],
+            'load': counters['load'],
+        }
+        for name in ('disk_read', 'disk_write', 'net_rx', 'net_tx'):
+            row[name] = max(0, counters[name] - old[name]) / elapsed
+        
+        top = []
+        old_processes = previous_processes[1]
+        for pid, (name, cpu_seconds, rss) in processes.items():
+            before = old_processes.get(pid)
+            cpu = 100.0 * (cpu_seconds - before[1]) / elapsed if before else 0.0
+            top.append((cpu, rss, pid, name))
+        top.sort(reverse=True)
+        
+        with self._lock:
+            for name, value in row.items():
+                self._columns[name][self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self.top = top[:TOP_PROCESSES]
+
+    def window(self, seconds: float) -> Dict[str, List[float]]:
+        """Samples from the last seconds, oldest first, one list per column"""
+        with self._lock:
+            count = min(self._count, max(1, int(seconds / self.interval)))
+            start = (self._next - count) % self.capacity
+            indexes = [(start + i) % self.capacity for i in range(count)]
+            return {name: [column[i] for i in indexes] for name, column in self._columns.items()}
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        with self._lock:
+            if not self._count:
+                return None
+            index = (self._next - 1) % self.capacity
+            return {name: column[index] for name, column in self._columns.items()}
+
+
+def _format_rate(value: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return f"{value:.0f} {unit}/s" if unit == 'B' else f"{value:.1f} {unit}/s"
+        value /= 1024
+
+
+def _parse_duration(text: str) -> Optional[int]:
+    """Parse durations such as 90, 15m, 1h or 2d into seconds"""
+    match = re.fullmatch(r'(\d+)([smhd]?)', text.strip().lower())
+    if not match:
+        return None
+    return int(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+
+class MultipartFileBody:
+    """Streaming multipart/form-data body for one file region
+
+    requests buffers multipart bodies built from files=, so large documents
+    would be held in memory in full; this reads the region from disk as the
+    connection consumes it and reports its length up front, so the request
+    is still sent with a Content-Length.
+    """
+
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, fields: dict, field_name: str, file_name: str, path: str,
+                 offset: int = 0, length: Optional[int] = None):
+        self.boundary = secrets.token_hex(16)
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.path = path
+        self.offset = offset
+        self.length = os.path.getsize(path) - offset if length is None else length
+        
+        preamble = []
+        for name, value in fields.items():
+            preamble.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+        quoted = file_name.replace('"', '%22').replace('\r', '').replace('\n', '')
+        preamble.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field_name}"; filename="{quoted}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        )
+        self._preamble = ''.join(preamble).encode('utf-8')
+        self._epilogue = f'\r\n--{self.boundary}--\r\n'.encode()
+        self._file = None
+        self._remaining = self.length
+        self._buffer = self._preamble
+
+    def __len__(self) -> int:
+        return len(self._preamble) + self.length + len(self._epilogue)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self)
+        while len(self._buffer) < size and (self._remaining or self._epilogue):
+            if self._remaining:
+                if self._file is None:
+                    self._file = open(self.path, 'rb')
+                    self._file.seek(self.offset)
+                chunk = self._file.read(min(self._remaining, max(size, self.CHUNK_SIZE)))
+                if not chunk:
+                    raise IOError(f"{self.path} shrank while being sent")
+                self._remaining -= len(chunk)
+                self._buffer += chunk
+            else:
+                self._buffer += self._epilogue
+                self._epilogue = b''
+                self.close()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def terminate_process_group(process, timeout: float = 5.0):
+    """SIGTERM a process's whole group, escalating to SIGKILL after timeout
+
+    Shell commands fork children that outlive a signal to the shell alone,
+    so the group is signalled; processes are started in their own session
+    for this, and the bot's own group is never touched.
+    """
+    try:
+        group = os.getpgid(process.pid)
+    except ProcessLookupError:
+        group = None
+    if group is None or group == os.getpgrp():
+        process.terminate()
+    else:
+        try:
+            os.killpg(group, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if group is None or group == os.getpgrp():
+            process.kill()
+        else:
+            try:
+                os.killpg(group, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        process.wait()
+
+
+class Job:
+    """One scheduled command and its lifecycle: queued, running, then done, failed or cancelled"""
+    __slots__ = ('id', 'user_id', 'chat_id', 'command', 'priority', 'background', 'target',
+                 'state', 'created', 'started', 'finished', 'process', 'cancelled')
+
+    def __init__(self, job_id: str, user_id: int, chat_id: int, command: str, priority: int,
+                 background: bool, target):
+        self.id = job_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.command = command
+        self.priority = priority
+        self.background = background
+        self.target = target
+        self.state = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.process = None
+        self.cancelled = False
+
+
+class JobScheduler:
+    """Priority queue of jobs with per-user and global concurrency caps
+
+    A job's target runs on its own thread and holds a slot until it
+    returns; background jobs hold theirs until their process exits. A
+    user's foreground jobs run one at a time, in the order they were sent,
+    and do not count against the user's background cap.
+    """
+
+    def __init__(self, background_per_user: int = MAX_BACKGROUND_JOBS_PER_USER, total: int = MAX_JOBS):
+        self.background_per_user = background_per_user
+        self.total = total
+        self.next_id = 1
+        self._queue = []
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._finished = deque(maxlen=FINISHED_JOBS_KEPT)
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def new_id(self, prefix: str = 'job') -> str:
+        """Allocate an id that stays unique across restarts (next_id is persisted)"""
+        with self._lock:
+            job_id = f"{prefix}_{self.next_id}"
+            self.next_id += 1
+        return job_id
+
+    def submit(self, user_id: int, chat_id: int, command: str, target, priority: str = 'normal',
+               background: bool = False) -> Job:
+        """Queue a job; target(job) is called on a worker thread once a slot is free"""
+        job = Job(self.new_id(), user_id, chat_id, command, JOB_PRIORITIES[priority], background, target)
+        with self._lock:
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (job.priority, next(self._sequence), job))
+            self._dispatch()
+        return job
+
+    def adopt(self, job_id: str, user_id: int, command: str, process):
+        """Track a background process re-adopted after a restart as a running job"""
+        job = Job(job_id, user_id, None, command, JOB_PRIORITIES['low'], True, None)
+        job.state, job.started, job.process = 'running', time.time(), process
+        with self._lock:
+            self._jobs[job_id] = job
+        threading.Thread(target=self._wait_adopted, args=(job,), name=f'job-{job_id}', daemon=True).start()
+
+    def _wait_adopted(self, job: Job):
+        job.process.wait()
+        self._finish(job, 'done')
+
+    def _running(self) -> List[Job]:
+        return [job for job in self._jobs.values() if job.state == 'running']
+
+    def _dispatch(self):
+        """Start queued jobs while caps allow; called with the lock held"""
+        running = self._running()
+        background = {}
+        busy_foreground = set()
+        for job in running:
+            if job.background:
+                background[job.user_id] = background.get(job.user_id, 0) + 1
+            else:
+                busy_foreground.add(job.user_id)
+        
+        waiting = []
+        while self._queue and len(running) < self.total:
+            entry = heapq.heappop(self._queue)
+            job = entry[2]
+            if job.state != 'queued':
+                continue
+            if job.background:
+                blocked = background.get(job.user_id, 0) >= self.background_per_user
+            else:
+                # Later foreground jobs of this user must wait behind this one
+                blocked = job.user_id in busy_foreground
+                busy_foreground.add(job.user_id)
+            if blocked:
+                waiting.append(entry)
+                continue
+            job.state = 'running'
+            job.started = time.time()
+            running.append(job)
+            if job.background:
+                background[job.user_id] = background.get(job.user_id, 0) + 1
+            threading.Thread(target=self._run, args=(job,), name=f'job-{job.id}', daemon=True).start()
+        for entry in waiting:
+            heapq.heappush(self._queue, entry)
+
+    def _run(self, job: Job):
+        state = 'done'
+        try:
+            if job.target(job) is False:
+                state = 'failed'
+            if job.background and job.process is not None:
+                job.process.wait()
+        except Exception as e:
+            self.logger.error(f"Job {job.id} failed: {e}")
+            state = 'failed'
+        self._finish(job, state)
+
+    def _finish(self, job: Job, state: str):
+        with self._lock:
+            job.state = 'cancelled' if job.cancelled else state
+            job.finished = time.time()
+            job.process = None
+            self._jobs.pop(job.id, None)
+            self._finished.append(job)
+            self._dispatch()
+
+    def position(self, job: Job) -> int:
+        """1-based place of a queued job in the run order, 0 once it left the queue"""
+        with self._lock:
+            queued = sorted(entry[:2] + (entry[2],) for entry in self._queue if entry[2].state == 'queued')
+        for index, (_, _, queued_job) in enumerate(queued, 1):
+            if queued_job is job:
+                return index
+        return 0
+
+    def cancel(self, job_id: str, user_id: Optional[int] = None) -> Optional[Job]:
+        """Cancel a queued job or terminate a running one's process group"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (user_id is not None and job.user_id != user_id):
+                return None
+            job.cancelled = True
+            if job.state == 'queued':
+                job.state = 'cancelled'
+                job.finished = time.time()
+                self._jobs.pop(job_id)
+                self._finished.append(job)
+                return job
+            process = job.process
+        if process is not None:
+            terminate_process_group(process)
+        return job
+
+    def jobs_for(self, user_id: int) -> Tuple[List[Job], List[Job]]:
+        """A user's active (running and queued) and recently finished jobs"""
+        with self._lock:
+            active = sorted((job for job in self._jobs.values() if job.user_id == user_id),
+                            key=lambda job: (job.state != 'running', job.priority, job.created))
+            finished = [job for job in self._finished if job.user_id == user_id]
+        return active, finished[::-1]
+
+    def counts(self) -> Tuple[int, int]:
+        with self._lock:
+            running = len(self._running())
+            return running, len(self._jobs) - running
+
+
+class HistoryRecord:
+    """One executed command; slotted to keep per-user buffers small"""
+    __slots__ = ('timestamp', 'command', 'directory', 'success')
+
+    def __init__(self, timestamp: float, command: str, directory: str, success: bool):
+        self.timestamp = timestamp
+        self.command = command
+        self.directory = directory
+        self.success = success
+
+
+class CommandHistory:
+    """Per-user ring buffers of recent commands, persisted to SQLite in the background
+
+    Records are appended to a bounded deque and queued for a writer thread
+    that inserts them in batches. Searches go through a trigram FTS index,
+    so substring matches do not scan the whole table.
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB_PATH, per_user: int = HISTORY_PER_USER):
+        self.db_path = db_path
+        self.per_user = per_user
+        self._buffers: Dict[int, deque] = {}
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = None
+        self._fts = False
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS history ('
+                'id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, timestamp REAL NOT NULL, '
+                'command TEXT NOT NULL, directory TEXT NOT NULL, success INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id)')
+            try:
+                # External-content FTS index over commands, kept in sync by triggers
+                conn.executescript(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+                    "command, content='history', content_rowid='id', tokenize='trigram');"
+                    "CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN "
+                    "INSERT INTO history_fts (rowid, command) VALUES (new.id, new.command); END;"
+                    "CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN "
+                    "INSERT INTO history_fts (history_fts, rowid, command) VALUES ('delete', old.id, old.command); END;"
+                )
+                self._fts = True
+            except sqlite3.OperationalError:
+                # SQLite without FTS5 or the trigram tokenizer: fall back to LIKE over the user's rows
+                self._fts = False
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _buffer(self, user_id: int) -> deque:
+        """Get a user's ring buffer, loading it from disk after a restart"""
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            buffer = deque(maxlen=self.per_user)
+            with self._db_lock:
+                rows = self._connect().execute(
+                    'SELECT timestamp, command, directory, success FROM history '
+                    'WHERE user_id = ? ORDER BY id DESC LIMIT ?', (user_id, self.per_user)
+                ).fetchall()
+            for timestamp, command, directory, success in reversed(rows):
+                buffer.append(HistoryRecord(timestamp, command, sys.intern(directory), bool(success)))
+            self._buffers[user_id] = buffer
+        return buffer
+
+    def add(self, user_id: int, command: str, directory: str, success: bool):
+        """Record a command; it reaches SQLite on the next background flush"""
+        record = HistoryRecord(time.time(), command, sys.intern(directory), success)
+        with self._lock:
+            self._buffer(user_id).append(record)
+            self._pending.append((user_id, record.timestamp, command, directory, int(success)))
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_behind, name='history-writer', daemon=True)
+                self._writer.start()
+
+    def recent(self, user_id: int, limit: int = HISTORY_SHOWN) -> List[HistoryRecord]:
+        """Most recent commands, newest first, straight from the ring buffer"""
+        with self._lock:
+            buffer = self._buffer(user_id)
+            return [buffer[-i] for i in range(1, min(limit, len(buffer)) + 1)]
+
+    def search(self, user_id: int, pattern: str, limit: int = HISTORY_SHOWN) -> List[HistoryRecord]:
+        """Commands containing pattern, newest first"""
+        self.flush()
+        with self._db_lock:
+            conn = self._connect()
+            if self._fts and len(pattern) >= 3:
+                rows = conn.execute(
+                    'SELECT h.timestamp, h.command, h.directory, h.success FROM history_fts '
+                    'JOIN history h ON h.id = history_fts.rowid '
+                    'WHERE history_fts MATCH ? AND h.user_id = ? ORDER BY h.id DESC LIMIT ?',
+                    ('"' + pattern.replace('"', '""') + '"', user_id, limit)
+                ).fetchall()
+            else:
+                escaped = pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                rows = conn.execute(
+                    "SELECT timestamp, command, directory, success FROM history "
+                    "WHERE user_id = ? AND command LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT ?",
+                    (user_id, f'%{escaped}%', limit)
+                ).fetchall()
+        return [HistoryRecord(timestamp, command, directory, bool(success))
+                for timestamp, command, directory, success in rows]
+
+    def flush(self):
+        """Write buffered records to SQLite in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    'INSERT INTO history (user_id, timestamp, command, directory, success) VALUES (?, ?, ?, ?, ?)',
+                    pending
+                )
+                # Keep the on-disk history bounded per user as well
+                for user_id in {row[0] for row in pending}:
+                    conn.execute(
+                        'DELETE FROM history WHERE user_id = ? AND id <= ('
+                        'SELECT id FROM history WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                        (user_id, user_id, HISTORY_DB_PER_USER)
+                    )
+
+    def _write_behind(self):
+        while not self._closed:
+            self._wakeup.wait(HISTORY_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.getLogger(__name__).error(f"Failed to persist command history: {e}")
+
+    def close(self):
+        """Flush outstanding records and stop the writer"""
+        self._closed = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logging.getLogger(__name__).error(f"Failed to persist command history: {e}")
+
+
+class FileIdCache:
+    """Persistent LRU map from a file region's identity to the file_id Telegram gave it
+
+    Entries are keyed on (path, dev, inode, size, mtime_ns, offset, length),
+    so any change to the file makes the old id unreachable instead of wrong.
+    """
+
+    KEY = 'path = ? AND dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND offset = ? AND length = ?'
+
+    def __init__(self, db_path: str = FILE_ID_CACHE_PATH, max_entries: int = FILE_ID_CACHE_SIZE):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS file_ids ('
+                'path TEXT NOT NULL, dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, '
+                'mtime_ns INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, '
+                'file_id TEXT NOT NULL, last_used REAL NOT NULL, '
+                'UNIQUE (path, dev, ino, size, mtime_ns, offset, length))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS file_ids_last_used ON file_ids (last_used)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _key(path: str, stat: os.stat_result, offset: int, length: int) -> tuple:
+        return (os.path.realpath(path), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, offset, length)
+
+    def get(self, path: str, stat: os.stat_result, offset: int, length: int) -> Optional[str]:
+        key = self._key(path, stat, offset, length)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f'SELECT file_id FROM file_ids WHERE {self.KEY}', key).fetchone()
+            if row is None:
+                return None
+            with conn:
+                conn.execute(f'UPDATE file_ids SET last_used = ? WHERE {self.KEY}', (time.time(),) + key)
+        return row[0]
+
+    def put(self, path: str, stat: os.stat_result, offset: int, length: int, file_id: str):
+        key = self._key(path, stat, offset, length)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO file_ids (path, dev, ino, size, mtime_ns, offset, length, file_id, last_used) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', key + (file_id, time.time())
+                )
+                # Evict least recently used entries beyond the cap
+                conn.execute(
+                    'DELETE FROM file_ids WHERE rowid IN (SELECT rowid FROM file_ids ORDER BY last_used DESC '
+                    'LIMIT -1 OFFSET ?)', (self.max_entries,)
+                )
+
+    def discard(self, path: str, stat: os.stat_result, offset: int, length: int):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(f'DELETE FROM file_ids WHERE {self.KEY}', self._key(path, stat, offset, length))
+
+
 class TelegramBot:
-    def __init__(self, token):
+    def __init__(self, token, api_root: Optional[str] = None, webhook_url: Optional[str] = None):
+        self.startup = StartupTimer(_MODULE_LOADED)
         self.token = token
-        self.api_url = f"{TELEGRAM_BASE_URL}{token}"
+        self.api_root = (api_root or TELEGRAM_API_ROOT).rstrip('/')
+        self.api_url = f"{self.api_root}/bot{token}"
+        self.webhook_url = WEBHOOK_URL if webhook_url is None else webhook_url
+        self.webhook_secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self._webhook_server = None
+        self._stop_event = threading.Event()
+        self._long_polling = False
         self.user_directories = {}
         self.upload_directories = {}
         self.running_bots = {}
-        self.command_history = {}
+        self.command_history = CommandHistory()
+        self.file_ids = FileIdCache()
+        self.host_metrics = HostMetrics()
+        self.jobs = JobScheduler()
+        self._browse_sessions = {}
         
         # Setup logging
         self._setup_logging()
         
         # Create necessary directories
         self._ensure_directories()
+        self._saved_state = None
+        self._restore_state()
         
         # Install dependencies
         self._install_dependencies()
+        self.startup.mark('init')
         
     def _setup_logging(self):
         """Setup logging configuration"""
@@ -65,19 +1014,147 @@ class TelegramBot:
         
     def _ensure_directories(self):
         """Ensure necessary directories exist"""
-        dirs = ['downloads', 'uploads', 'logs', 'scripts']
+        dirs = ['downloads', 'uploads', 'logs', 'scripts', 'data']
         for directory in dirs:
             os.makedirs(directory, exist_ok=True)
             
-    def _install_dependencies(self):
-        """Install required dependencies"""
-        required_packages = ['requests']
-        for package in required_packages:
+    def _snapshot_state(self) -> dict:
+        processes = {}
+        for process_id, info in list(self.running_bots.items()):
+            process = info['process']
+            start_time = getattr(process, 'start_time', None) or _process_start_time(process.pid)
+            if start_time is None or process.poll() is not None:
+                continue
+            record = {key: value for key, value in info.items() if key != 'process'}
+            record.update(pid=process.pid, start_time=start_time)
+            processes[process_id] = record
+        return {
+            'user_directories': dict(self.user_directories),
+            'upload_directories': dict(self.upload_directories),
+            'processes': processes,
+            'next_job_id': self.jobs.next_id,
+        }
+
+    def save_state(self):
+        """Write the state snapshot if it changed since the last write"""
+        data = json.dumps(self._snapshot_state(), separators=(',', ':'))
+        if data == self._saved_state:
+            return
+        temp_path = f"{STATE_PATH}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, STATE_PATH)
+            self._saved_state = data
+        except OSError as e:
+            self.logger.error(f"Failed to save state: {e}")
+
+    def _restore_state(self):
+        """Restore directories and re-adopt background processes that survived a restart"""
+        try:
+            with open(STATE_PATH) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable state file: {e}")
+            return
+        if not isinstance(state, dict):
+            self.logger.warning("Ignoring state file that is not a JSON object")
+            return
+        
+        def section(key: str) -> dict:
+            value = state.get(key, {})
+            if not isinstance(value, dict):
+                self.logger.warning(f"Ignoring malformed {key} in state file")
+                return {}
+            return value
+        
+        for key in ('user_directories', 'upload_directories'):
+            directories = getattr(self, key)
+            for user_id, directory in section(key).items():
+                try:
+                    user_id = int(user_id)
+                    if not isinstance(directory, str):
+                        raise TypeError(directory)
+                except (TypeError, ValueError):
+                    self.logger.warning(f"Skipping malformed {key} entry for {user_id}")
+                    continue
+                if os.path.isdir(directory):
+                    directories[user_id] = directory
+        
+        next_job_id = state.get('next_job_id', 1)
+        if isinstance(next_job_id, int):
+            self.jobs.next_id = max(self.jobs.next_id, next_job_id)
+        adopted = 0
+        for process_id, record in section('processes').items():
             try:
-                __import__(package)
-            except ImportError:
-                self.logger.info(f"Installing {package}...")
-                subprocess.check_call([sys.executable, '-m', 'pip', 'install', package])
+                pid = int(record.pop('pid'))
+                start_time = record.pop('start_time')
+            except (KeyError, TypeError, ValueError, AttributeError):
+                self.logger.warning(f"Skipping malformed state record for {process_id}")
+                continue
+            # A different start time means the PID now belongs to an unrelated process
+            if _process_start_time(pid) != start_time:
+                continue
+            record['process'] = AdoptedProcess(pid, start_time)
+            self.running_bots[process_id] = record
+            if 'command' in record:
+                # Background commands keep holding their job slot until they exit
+                self.jobs.adopt(process_id, record.get('user_id'), record['command'], record['process'])
+            adopted += 1
+        self.logger.info(f"Restored state for {len(self.user_directories)} users, "
+                         f"re-adopted {adopted} background processes")
+
+    def _snapshot_loop(self):
+        while not self._stop_event.wait(STATE_SNAPSHOT_INTERVAL):
+            self.save_state()
+
+    def _start_logged_process(self, process_id: str, args, **kwargs) -> Tuple[subprocess.Popen, str]:
+        """Start a detached process writing to logs/<process_id>.log
+
+        Its own session keeps it out of the bot's process group, so it survives
+        a bot restart and can be re-adopted; the log file replaces the pipes
+        nothing would read after the restart.
+        """
+        log_path = os.path.join('logs', f"{process_id}.log")
+        with open(log_path, 'ab') as log:
+            process = subprocess.Popen(
+                args,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+                **kwargs
+            )
+        return process, log_path
+
+    def _install_dependencies(self):
+        """Install required dependencies that are missing
+
+        The result is cached in a marker keyed on the interpreter, so warm
+        starts skip both the module lookups and pip.
+        """
+        marker = {'python': sys.executable, 'version': sys.version, 'packages': REQUIRED_PACKAGES}
+        try:
+            with open(DEPENDENCY_MARKER) as f:
+                if json.load(f) == marker:
+                    return
+        except (OSError, ValueError):
+            pass
+        
+        missing = [package for package in REQUIRED_PACKAGES if importlib.util.find_spec(package) is None]
+        for package in missing:
+            self.logger.info(f"Installing {package}...")
+            subprocess.check_call([sys.executable, '-m', 'pip', 'install', package])
+        if missing:
+            importlib.invalidate_caches()
+        
+        try:
+            with open(DEPENDENCY_MARKER, 'w') as f:
+                json.dump(marker, f)
+        except OSError as e:
+            self.logger.warning(f"Could not write dependency marker: {e}")
 
     def escape_markdown(self, text: str) -> str:
         """Escape special characters for Telegram markdown formatting"""
@@ -87,7 +1164,8 @@ class TelegramBot:
         return text
 
     def send_message(self, chat_id: int, text: str, parse_mode: str = 'Markdown', 
-                    reply_to_message_id: Optional[int] = None) -> Optional[dict]:
+                    reply_to_message_id: Optional[int] = None,
+                    reply_markup: Optional[dict] = None) -> Optional[dict]:
         """Send message to Telegram chat"""
         try:
             if len(text) > MAX_MESSAGE_LENGTH:
@@ -101,6 +1179,8 @@ class TelegramBot:
             
             if reply_to_message_id:
                 payload['reply_to_message_id'] = reply_to_message_id
+            if reply_markup is not None:
+                payload['reply_markup'] = json.dumps(reply_markup)
             
             response = requests.post(f"{self.api_url}/sendMessage", data=payload, timeout=30)
             return response.json() if response.status_code == 200 else None
@@ -109,6 +1189,34 @@ class TelegramBot:
             self.logger.error(f"Failed to send message: {e}")
             return None
 
+    def edit_message_text(self, chat_id: int, message_id: int, text: str,
+                          parse_mode: str = 'Markdown', reply_markup: Optional[dict] = None) -> Optional[dict]:
+        """Replace the text of a message the bot sent earlier"""
+        try:
+            payload = {
+                'chat_id': chat_id,
+                'message_id': message_id,
+                'text': text[:MAX_MESSAGE_LENGTH],
+                'parse_mode': parse_mode
+            }
+            if reply_markup is not None:
+                payload['reply_markup'] = json.dumps(reply_markup)
+            response = requests.post(f"{self.api_url}/editMessageText", data=payload, timeout=30)
+            return response.json() if response.status_code == 200 else None
+        except Exception as e:
+            self.logger.error(f"Failed to edit message: {e}")
+            return None
+
+    def answer_callback_query(self, callback_query_id: str, text: Optional[str] = None):
+        """Acknowledge an inline button press so the client stops its spinner"""
+        try:
+            payload = {'callback_query_id': callback_query_id}
+            if text:
+                payload['text'] = text
+            requests.post(f"{self.api_url}/answerCallbackQuery", data=payload, timeout=30)
+        except Exception as e:
+            self.logger.error(f"Failed to answer callback query: {e}")
+
     def _send_long_message(self, chat_id: int, text: str, parse_mode: str, 
                           reply_to_message_id: Optional[int] = None):
         """Send long message in chunks"""
@@ -121,30 +1229,148 @@ class TelegramBot:
                 self.send_message(chat_id, chunk, parse_mode)
             time.sleep(0.5)  # Avoid rate limiting
 
-    def send_document(self, chat_id: int, file_path: str, caption: Optional[str] = None) -> Optional[dict]:
-        """Send document to Telegram chat"""
+    def send_document(self, chat_id: int, file_path: str, caption: Optional[str] = None,
+                      cache: bool = True) -> Optional[dict]:
+        """Send document to Telegram chat, splitting it into parts above DOCUMENT_PART_SIZE
+
+        Unchanged files that were sent before are re-sent by file_id instead of
+        uploaded; pass cache=False for temporary files.
+        """
         try:
             if not os.path.exists(file_path):
                 return None
             
-            if os.path.getsize(file_path) > MAX_DOWNLOAD_SIZE:
+            file_size = os.path.getsize(file_path)
+            if file_size > MAX_DOWNLOAD_SIZE:
                 self.send_message(chat_id, f"{EMOJIS['error']} File too large (max {MAX_DOWNLOAD_SIZE//1024//1024}MB)")
                 return None
             
-            with open(file_path, 'rb') as file:
-                files = {'document': file}
-                data = {'chat_id': chat_id}
-                
-                if caption:
-                    data['caption'] = caption
-                
-                response = requests.post(f"{self.api_url}/sendDocument", files=files, data=data, timeout=120)
-                return response.json() if response.status_code == 200 else None
+            if file_size > DOCUMENT_PART_SIZE:
+                return self._send_split_document(chat_id, file_path, caption, cache)
+            return self._send_document_part(chat_id, file_path, os.path.basename(file_path), 0, file_size,
+                                            caption, cache)
                 
         except Exception as e:
             self.logger.error(f"Failed to send document: {e}")
             return None
 
+    def _send_cached_document(self, fields: dict, file_id: str) -> Tuple[bool, Optional[dict]]:
+        """Send a document by cached file_id
+
+        Returns (True, response) once the send is settled, successful or not;
+        (False, error) when Telegram rejected the id itself, so the caller should
+        forget it and upload; and (False, None) when the request failed on the
+        way, so the caller should upload but keep the id.
+        """
+        for _ in range(FILE_ID_SEND_ATTEMPTS):
+            try:
+                response = requests.post(f"{self.api_url}/sendDocument", data=dict(fields, document=file_id),
+                                         timeout=30)
+                result = response.json()
+            except (requests.RequestException, ValueError) as e:
+                self.logger.warning(f"Sending cached file_id failed: {e}")
+                return False, None
+            if response.status_code == 200 and result.get('ok'):
+                return True, result
+            if response.status_code == 429:
+                # Rate limited: the id is fine, wait as told and send it again
+                retry_after = (result.get('parameters') or {}).get('retry_after', 1)
+                time.sleep(min(max(1, int(retry_after)), MAX_RETRY_AFTER))
+                continue
+            if response.status_code == 400 and FILE_ID_REJECTED.search(result.get('description', '')):
+                return False, result
+            self.logger.warning(f"Sending cached file_id failed: {result.get('description', response.status_code)}")
+            return True, None
+        return True, None
+
+    def _send_document_part(self, chat_id: int, file_path: str, file_name: str, offset: int, length: int,
+                            caption: Optional[str] = None, cache: bool = True) -> Optional[dict]:
+        """Upload one region of a file as a document, streaming it from disk"""
+        fields = {'chat_id': chat_id}
+        if caption:
+            fields['caption'] = caption
+        
+        stat = os.stat(file_path) if cache else None
+        if stat is not None:
+            file_id = self.file_ids.get(file_path, stat, offset, length)
+            if file_id:
+                sent, result = self._send_cached_document(fields, file_id)
+                if sent:
+                    return result
+                if result is not None:
+                    # Telegram no longer knows the id; forget it and upload the bytes
+                    self.logger.info(f"Cached file_id for {file_path} was rejected, uploading again")
+                    self.file_ids.discard(file_path, stat, offset, length)
+        
+        body = MultipartFileBody(fields, 'document', file_name, file_path, offset, length)
+        try:
+            response = requests.post(f"{self.api_url}/sendDocument", data=body,
+                                     headers={'Content-Type': body.content_type}, timeout=120)
+        finally:
+            body.close()
+        result = response.json() if response.status_code == 200 else None
+        
+        if stat is not None and result and result.get('ok'):
+            document = result.get('result', {}).get('document') or {}
+            after = os.stat(file_path)
+            # A file modified mid-upload may not match what Telegram stored
+            if document.get('file_id') and (after.st_size, after.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                self.file_ids.put(file_path, stat, offset, length, document['file_id'])
+        return result
+
+    def _send_split_document(self, chat_id: int, file_path: str, caption: Optional[str],
+                             cache: bool = True) -> Optional[dict]:
+        """Send an oversize file as numbered parts, uploaded in parallel"""
+        # Only needed for files over the document limit, so kept out of startup
+        import gzip
+        import shlex
+        from concurrent.futures import ThreadPoolExecutor
+        
+        name = os.path.basename(file_path)
+        compressed_path = None
+        try:
+            if SPLIT_COMPRESS:
+                compressed_path = os.path.join('downloads', f"{int(time.time() * 1000)}_{name}.gz")
+                with open(file_path, 'rb') as source, gzip.open(compressed_path, 'wb', compresslevel=6) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                # Already-compressed data can grow; only keep the gzip if it pays off
+                if os.path.getsize(compressed_path) < os.path.getsize(file_path):
+                    file_path, name = compressed_path, f"{name}.gz"
+                    cache = False
+            
+            file_size = os.path.getsize(file_path)
+            if file_size <= DOCUMENT_PART_SIZE:
+                return self._send_document_part(chat_id, file_path, name, 0, file_size, caption, cache)
+            
+            count = -(-file_size // DOCUMENT_PART_SIZE)
+            # Quote the name, leaving the glob outside the quotes so the shell still expands it
+            parts = f"{shlex.quote(name + '.part')}*"
+            if file_path == compressed_path:
+                hint = f"cat {parts} | gunzip > {shlex.quote(name[:-3])}"
+            else:
+                hint = f"cat {parts} > {shlex.quote(name)}"
+            
+            def send_part(index: int) -> Optional[dict]:
+                offset = index * DOCUMENT_PART_SIZE
+                suffix = f" (part {index + 1}/{count})\nReassemble: {hint}"
+                label = caption or name
+                room = MAX_CAPTION_LENGTH - len(suffix)
+                if len(label) > room:
+                    label = label[:max(0, room - 1)] + '…'
+                part_caption = label + suffix
+                return self._send_document_part(chat_id, file_path, f"{name}.part{index + 1:03d}", offset,
+                                                min(DOCUMENT_PART_SIZE, file_size - offset), part_caption, cache)
+            
+            with ThreadPoolExecutor(max_workers=max(1, DOCUMENT_UPLOAD_CONCURRENCY)) as executor:
+                results = list(executor.map(send_part, range(count)))
+            
+            if not all(result and result.get('ok') for result in results):
+                return None
+            return {'ok': True, 'result': [result['result'] for result in results]}
+        finally:
+            if compressed_path and os.path.exists(compressed_path):
+                os.remove(compressed_path)
+
     def download_file(self, file_id: str, download_path: str) -> tuple:
         """Download file from Telegram"""
         try:
@@ -165,7 +1391,7 @@ class TelegramBot:
                 return False, f"File too large (max {MAX_UPLOAD_SIZE//1024//1024}MB)"
             
             # Download file
-            file_url = f"https://api.telegram.org/file/bot{self.token}/{file_path}"
+            file_url = f"{self.api_root}/file/bot{self.token}/{file_path}"
             file_response = requests.get(file_url, timeout=120)
             
             if file_response.status_code == 200:
@@ -178,20 +1404,55 @@ class TelegramBot:
         except Exception as e:
             return False, f"Download error: {str(e)}"
 
-    def get_updates(self, offset: Optional[int] = None) -> Optional[dict]:
+    def get_updates(self, offset: Optional[int] = None, timeout: int = 30) -> Optional[dict]:
         """Get updates from Telegram"""
         try:
-            params = {'timeout': 30}
+            params = {'timeout': timeout, 'allowed_updates': json.dumps(ALLOWED_UPDATES)}
             if offset:
                 params['offset'] = offset
             
             response = requests.get(f"{self.api_url}/getUpdates", params=params, timeout=35)
+            if response.status_code == 409:
+                # A webhook left over from webhook mode blocks getUpdates
+                self.logger.warning("Webhook is set; removing it to switch to long polling")
+                self.delete_webhook()
             return response.json() if response.status_code == 200 else None
             
         except Exception as e:
             self.logger.error(f"Failed to get updates: {e}")
             return None
 
+    def set_webhook(self) -> bool:
+        """Register self.webhook_url with Telegram"""
+        data = {
+            'url': self.webhook_url,
+            'secret_token': self.webhook_secret,
+            'allowed_updates': json.dumps(ALLOWED_UPDATES)
+        }
+        try:
+            if WEBHOOK_CERT and WEBHOOK_SELF_SIGNED:
+                with open(WEBHOOK_CERT, 'rb') as cert:
+                    response = requests.post(f"{self.api_url}/setWebhook", data=data,
+                                             files={'certificate': cert}, timeout=30)
+            else:
+                response = requests.post(f"{self.api_url}/setWebhook", data=data, timeout=30)
+            result = response.json()
+            if not result.get('ok'):
+                self.logger.error(f"setWebhook failed: {result.get('description')}")
+            return bool(result.get('ok'))
+        except Exception as e:
+            self.logger.error(f"Failed to set webhook: {e}")
+            return False
+
+    def delete_webhook(self) -> bool:
+        """Remove the webhook so getUpdates works again"""
+        try:
+            response = requests.post(f"{self.api_url}/deleteWebhook", timeout=30)
+            return bool(response.json().get('ok'))
+        except Exception as e:
+            self.logger.error(f"Failed to delete webhook: {e}")
+            return False
+
     def get_user_directory(self, user_id: int) -> str:
         """Get current directory for user"""
         return self.user_directories.get(user_id, os.getcwd())
@@ -221,7 +1482,8 @@ class TelegramBot:
         
         return True, "Command is safe"
 
-    def execute_command(self, command: str, current_dir: str, user_id: int) -> Tuple[bool, str]:
+    def execute_command(self, command: str, current_dir: str, user_id: int,
+                        job: Optional[Job] = None) -> Tuple[bool, str]:
         """Execute shell command with safety checks"""
         # Safety check
         is_safe, safety_message = self.is_safe_command(command)
@@ -230,43 +1492,52 @@ class TelegramBot:
         
         # Handle background commands
         if command.strip().endswith('&'):
-            return self._execute_background_command(command, current_dir, user_id)
+            return self._execute_background_command(command, current_dir, user_id, job)
         
         try:
-            # Execute command
-            result = subprocess.run(
+            # Execute command in its own session so a timeout or /cancel can stop all of it
+            process = subprocess.Popen(
                 command,
                 shell=True,
                 cwd=current_dir,
-                capture_output=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
-                timeout=COMMAND_TIMEOUT,
-                env=dict(os.environ, PYTHONPATH=current_dir)
+                env=dict(os.environ, PYTHONPATH=current_dir),
+                start_new_session=True
             )
+            if job is not None:
+                job.process = process
+                if job.cancelled:
+                    terminate_process_group(process)
+            
+            try:
+                stdout, stderr = process.communicate(timeout=COMMAND_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                terminate_process_group(process)
+                process.communicate()
+                raise
+            
+            if job is not None and job.cancelled:
+                return False, f"{EMOJIS['warning']} Job cancelled: `{job.id}`"
             
             # Combine stdout and stderr with backslash suppression
             output = ""
-            if result.stdout:
+            if stdout:
                 # Apply backslash escaping for output suppression
-                cleaned_stdout = result.stdout.replace('\\', '\\\\')
+                cleaned_stdout = stdout.replace('\\', '\\\\')
                 output += cleaned_stdout
-            if result.stderr:
+            if stderr:
                 # Apply backslash escaping for stderr suppression  
-                cleaned_stderr = result.stderr.replace('\\', '\\\\')
+                cleaned_stderr = stderr.replace('\\', '\\\\')
                 output += f"\nSTDERR:\n{cleaned_stderr}"
             
             if not output:
                 output = f"{EMOJIS['success']} Command executed successfully (no output)"
             
             # Update command history
-            if user_id not in self.command_history:
-                self.command_history[user_id] = []
-            self.command_history[user_id].append({
-                'command': command,
-                'directory': current_dir,
-                'timestamp': time.time(),
-                'success': result.returncode == 0
-            })
+            self.command_history.add(user_id, command, current_dir, process.returncode == 0)
             
             return True, output[:8000]  # Limit output length
             
@@ -275,27 +1546,28 @@ class TelegramBot:
         except Exception as e:
             return False, f"{EMOJIS['error']} Command failed: {str(e)}"
 
-    def _execute_background_command(self, command: str, current_dir: str, user_id: int) -> Tuple[bool, str]:
+    def _execute_background_command(self, command: str, current_dir: str, user_id: int,
+                                    job: Optional[Job] = None) -> Tuple[bool, str]:
         """Execute command in background"""
         try:
             command = command.rstrip('&').strip()
             
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                cwd=current_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            process_id = job.id if job is not None else self.jobs.new_id('bg')
+            process, log_path = self._start_logged_process(process_id, command, shell=True, cwd=current_dir)
+            if job is not None:
+                job.process = process
+                if job.cancelled:
+                    # /cancel ran before there was a process to kill, and has already answered
+                    terminate_process_group(process)
+                    return False, f"{EMOJIS['warning']} Cancelled `{process_id}`"
             
             # Store process info
-            process_id = f"bg_{user_id}_{int(time.time())}"
             self.running_bots[process_id] = {
                 'process': process,
                 'command': command,
                 'started': time.time(),
-                'user_id': user_id
+                'user_id': user_id,
+                'log': log_path
             }
             
             return True, f"{EMOJIS['rocket']} Command started in background: `{process_id}`"
@@ -364,21 +1636,98 @@ class TelegramBot:
                 reply_to_message_id=message_id
             )
 
+    def _resolve_download_target(self, current_dir: str, file_path: str) -> Tuple[str, str, Optional[str], Optional[int]]:
+        """Split `/download` arguments into (path, full_path, archive_format, level)
+        
+        Directories accept an optional trailing archive format and level,
+        e.g. `/download logs tar.gz 9`.
+        """
+        from archiver import ARCHIVE_FORMATS
+        
+        def full(path):
+            return path if path.startswith('/') else os.path.join(current_dir, path)
+        
+        parts = file_path.rsplit(None, 2)
+        candidates = []
+        if len(parts) == 3 and parts[1] in ARCHIVE_FORMATS and parts[2].isdigit():
+            candidates.append((parts[0], parts[1], int(parts[2])))
+        if len(parts) >= 2 and parts[-1] in ARCHIVE_FORMATS:
+            candidates.append((file_path.rsplit(None, 1)[0], parts[-1], None))
+        
+        for path, archive_format, level in candidates:
+            if os.path.isdir(full(path)):
+                return path, full(path), archive_format, level
+        return file_path, full(file_path), None, None
+    
+    def handle_directory_download(self, chat_id: int, file_path: str, full_path: str,
+                                  archive_format: Optional[str], level: Optional[int],
+                                  job: Optional[Job] = None) -> bool:
+        """Archive a directory on the fly and send it as a document
+
+        Runs as a background job (see handle_download_command), since building
+        and uploading a large archive can take minutes.
+        """
+        try:
+            from archiver import write_archive, archive_filename, ArchiveError
+        except ImportError:
+            self.send_message(chat_id, f"{EMOJIS['error']} Cannot download directory: archiver module not available")
+            return False
+        
+        archive_format = archive_format or 'zip'
+        archive_path = os.path.join('downloads', f"{int(time.time() * 1000)}_{archive_filename(full_path, archive_format)}")
+        
+        # Telegram needs a complete upload, so the archive is streamed into the downloads directory first
+        try:
+            self.send_message(chat_id, f"{EMOJIS['gear']} Archiving `{file_path}` as {archive_format}...")
+            with open(archive_path, 'wb') as archive_file:
+                write_archive(archive_file, full_path, archive_format, level)
+            if job is not None and job.cancelled:
+                # /cancel already answered
+                return False
+            
+            archive_size = os.path.getsize(archive_path)
+            if archive_size > MAX_DOWNLOAD_SIZE:
+                self.send_message(
+                    chat_id,
+                    f"{EMOJIS['error']} Archive too large: {archive_size//1024//1024}MB (max {MAX_DOWNLOAD_SIZE//1024//1024}MB)"
+                )
+                return False
+            
+            result = self.send_document(chat_id, archive_path, f"📥 Downloaded: {archive_filename(full_path, archive_format)}",
+                                        cache=False)
+            if result:
+                self.send_message(chat_id, f"{EMOJIS['download']} Directory sent successfully: `{file_path}`")
+                return True
+            self.send_message(chat_id, f"{EMOJIS['error']} Failed to send directory: `{file_path}`")
+            return False
+        except ArchiveError as e:
+            self.send_message(chat_id, f"{EMOJIS['error']} {e}")
+            return False
+        except Exception as e:
+            self.send_message(chat_id, f"{EMOJIS['error']} Failed to archive directory: {str(e)}")
+            return False
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+    
     def handle_download_command(self, chat_id: int, user_id: int, file_path: str):
         """Handle file download command"""
         current_dir = self.get_user_directory(user_id)
         
-        if not file_path.startswith('/'):
-            full_path = os.path.join(current_dir, file_path)
-        else:
-            full_path = file_path
+        file_path, full_path, archive_format, level = self._resolve_download_target(current_dir, file_path)
         
         if not os.path.exists(full_path):
             self.send_message(chat_id, f"{EMOJIS['error']} File not found: `{file_path}`")
             return
         
         if os.path.isdir(full_path):
-            self.send_message(chat_id, f"{EMOJIS['error']} Cannot download directory: `{file_path}`")
+            # Archiving must not hold up the update loop, so it runs as a job like shell commands
+            job = self.jobs.submit(user_id, chat_id, f"/download {file_path}",
+                                   lambda job: self.handle_directory_download(chat_id, file_path, full_path,
+                                                                              archive_format, level, job),
+                                   priority='low', background=True)
+            if job.state == 'queued':
+                self.send_message(chat_id, f"⏳ Download queued as `{job.id}` (position {self.jobs.position(job)})")
             return
         
         file_size = os.path.getsize(full_path)
@@ -429,24 +1778,20 @@ class TelegramBot:
             
             # Create environment
             env = os.environ.copy()
+            env.setdefault('PIP_CACHE_DIR', PIP_CACHE_DIR)
             if bot_token:
                 env['BOT_TOKEN'] = bot_token
             
             # Start script
-            process = subprocess.Popen(
-                [sys.executable, script_path],
-                env=env,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            bot_id = self.jobs.new_id('bot')
+            process, log_path = self._start_logged_process(bot_id, [sys.executable, script_path], env=env)
             
             # Store process info
-            bot_id = f"bot_{int(time.time())}"
             self.running_bots[bot_id] = {
                 'process': process,
                 'script_name': script_name,
-                'started': time.time()
+                'started': time.time(),
+                'log': log_path
             }
             
             return True, f"{EMOJIS['rocket']} Bot script started!\n🤖 *Bot ID:* `{bot_id}`\n📝 *Script:* `{script_name}`"
@@ -484,6 +1829,7 @@ class TelegramBot:
                 f"📝 *Script:* `{info.get('script_name', 'Background Command')}`\n"
                 f"⏱️ *Runtime:* {runtime}s\n"
                 f"📊 *Status:* {status}\n"
+                f"📜 *Log:* `{info.get('log', '-')}`\n"
             )
         
         return '\n'.join(bot_list)
@@ -495,14 +1841,8 @@ class TelegramBot:
                 return False, f"{EMOJIS['error']} Bot ID not found: `{bot_id}`"
             
             bot_info = self.running_bots[bot_id]
-            process = bot_info['process']
-            
-            process.terminate()
-            try:
-                process.wait(timeout=10)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                process.wait()
+            if self.jobs.cancel(bot_id) is None:
+                terminate_process_group(bot_info['process'], timeout=10)
             
             del self.running_bots[bot_id]
             
@@ -511,11 +1851,288 @@ class TelegramBot:
         except Exception as e:
             return False, f"{EMOJIS['error']} Failed to stop bot: {str(e)}"
 
+    def _run_shell_job(self, job: Job, current_dir: str) -> bool:
+        """Job target for shell commands; replies in the job's chat"""
+        success, output = self.execute_command(job.command, current_dir, job.user_id, job)
+        if job.cancelled:
+            # /cancel already answered
+            return False
+        if success and not job.background:
+            escaped_output = self.escape_markdown(output)
+            self.send_message(job.chat_id, f"```\n{escaped_output}\n```")
+        else:
+            self.send_message(job.chat_id, output)
+        return success
+
+    def handle_jobs_command(self, chat_id: int, user_id: int):
+        """Handle /jobs: the user's running, queued and recent jobs"""
+        active, finished = self.jobs.jobs_for(user_id)
+        running, queued = self.jobs.counts()
+        lines = [f"{EMOJIS['gear']} *Jobs* — {running}/{self.jobs.total} running, {queued} queued\n"]
+        now = time.time()
+        for job in active:
+            if job.state == 'running':
+                detail = f"running {int(now - job.started)}s"
+            else:
+                detail = f"queued #{self.jobs.position(job)}"
+            lines.append(f"• `{job.id}` {detail} — `{job.command[:60]}`")
+        for job in finished[:10]:
+            lines.append(f"• `{job.id}` {job.state} after {int(job.finished - (job.started or job.created))}s — `{job.command[:60]}`")
+        if len(lines) == 1:
+            lines.append("No jobs yet")
+        self.send_message(chat_id, "\n".join(lines))
+
+    def handle_cancel_command(self, chat_id: int, user_id: int, job_id: str):
+        """Handle /cancel <id>: drop a queued job or kill a running job's process group"""
+        if not job_id:
+            self.send_message(chat_id, f"{EMOJIS['error']} Usage: `/cancel <id>`; `/jobs` lists your job ids")
+            return
+        if job_id.isdigit():
+            job_id = f"job_{job_id}"
+        job = self.jobs.cancel(job_id, user_id)
+        if job is None:
+            self.send_message(chat_id, f"{EMOJIS['error']} No active job `{job_id}`")
+            return
+        self.running_bots.pop(job_id, None)
+        self.send_message(chat_id, f"{EMOJIS['success']} Cancelled `{job_id}`")
+
+    def _browse_listing(self, chat_id: int, path: str) -> dict:
+        """Directory entries for /browse, directories first, from the chat's listing cache
+
+        A cached listing is reused while the directory's mtime is unchanged and
+        it is younger than BROWSE_CACHE_TTL (size changes do not touch the
+        directory mtime).
+        """
+        from file_manager import file_manager
+        
+        session = self._browse_sessions.setdefault(chat_id, {'cache': OrderedDict(), 'token': 0})
+        cache = session['cache']
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError as e:
+            return {'error': e.strerror or str(e)}
+        
+        cached = cache.get(path)
+        if cached and cached['mtime_ns'] == mtime_ns and time.monotonic() - cached['loaded'] < BROWSE_CACHE_TTL:
+            cache.move_to_end(path)
+            return cached
+        
+        result = file_manager.get_directory_contents(path, compact=True, fields='name,type,size')
+        if 'error' in result:
+            return result
+        columns = result['columns']
+        order = sorted(range(len(columns['name'])), key=lambda i: (columns['type'][i] != 'd', columns['name'][i].lower()))
+        listing = {
+            'path': path,
+            'parent': result['parent'],
+            'entries': [(columns['name'][i], columns['type'][i], columns['size'][i]) for i in order],
+            'mtime_ns': mtime_ns,
+            'loaded': time.monotonic(),
+        }
+        cache[path] = listing
+        while len(cache) > BROWSE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return listing
+
+    def _render_browse_page(self, chat_id: int, path: str, page: int) -> Tuple[str, Optional[dict]]:
+        """Text and inline keyboard for one page of a directory"""
+        listing = self._browse_listing(chat_id, path)
+        if 'error' in listing:
+            return f"{EMOJIS['error']} Cannot open `{path}`: {listing['error']}", None
+        
+        session = self._browse_sessions[chat_id]
+        # Buttons carry indexes, not paths (callback data is limited to 64 bytes); the
+        # token ties them to the page they were rendered for
+        session['token'] = token = (session['token'] + 1) % 1000
+        entries = listing['entries']
+        pages = max(1, -(-len(entries) // BROWSE_PAGE_SIZE))
+        page = min(max(page, 0), pages - 1)
+        # Button indexes are resolved against the entries as rendered, not a listing reloaded later
+        session.update(path=path, page=page, entries=entries)
+        
+        start = page * BROWSE_PAGE_SIZE
+        keyboard = []
+        for index, (name, entry_type, size) in enumerate(entries[start:start + BROWSE_PAGE_SIZE], start):
+            if entry_type == 'd':
+                label = f"{EMOJIS['folder']} {name}/"
+            else:
+                label = f"{EMOJIS['file']} {name} ({self._format_size(size)})"
+            keyboard.append([{'text': label[:60], 'callback_data': f"b:{token}:o:{index}"}])
+        
+        navigation = []
+        if page > 0:
+            navigation.append({'text': '◀️', 'callback_data': f"b:{token}:p:{page - 1}"})
+        if listing['parent'] is not None:
+            navigation.append({'text': '⬆️ Up', 'callback_data': f"b:{token}:u"})
+        navigation.append({'text': '🔄', 'callback_data': f"b:{token}:r"})
+        navigation.append({'text': '📌 cd here', 'callback_data': f"b:{token}:c"})
+        if page < pages - 1:
+            navigation.append({'text': '▶️', 'callback_data': f"b:{token}:p:{page + 1}"})
+        keyboard.append(navigation)
+        
+        if entries:
+            shown = f"{start + 1}–{min(start + BROWSE_PAGE_SIZE, len(entries))} of {len(entries)}"
+        else:
+            shown = "empty"
+        text = f"{EMOJIS['folder']} `{path}`\n{shown}, page {page + 1}/{pages}"
+        return text, {'inline_keyboard': keyboard}
+
+    @staticmethod
+    def _format_size(size: int) -> str:
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024 or unit == 'GB':
+                return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
+
+    def handle_browse_command(self, chat_id: int, user_id: int, path: str):
+        """Handle /browse [path]: send a directory page with inline navigation"""
+        try:
+            import file_manager
+        except ImportError:
+            self.send_message(chat_id, f"{EMOJIS['error']} Cannot browse: file_manager module not available")
+            return
+        
+        current_dir = self.get_user_directory(user_id)
+        full_path = os.path.normpath(os.path.join(current_dir, os.path.expanduser(path))) if path else current_dir
+        text, keyboard = self._render_browse_page(chat_id, full_path, 0)
+        self.send_message(chat_id, text, reply_markup=keyboard)
+
+    def handle_callback_query(self, callback_query: dict):
+        """Handle inline button presses from /browse, editing the same message"""
+        data = callback_query.get('data') or ''
+        message = callback_query.get('message')
+        if not data.startswith('b:') or not message:
+            self.answer_callback_query(callback_query['id'])
+            return
+        
+        chat_id = message['chat']['id']
+        message_id = message['message_id']
+        user_id = callback_query['from']['id']
+        session = self._browse_sessions.get(chat_id)
+        parts = data.split(':')
+        if session is None or 'path' not in session or parts[1] != str(session['token']):
+            # Pressed on an outdated page (or after a restart): redraw instead of guessing
+            path = session['path'] if session and 'path' in session else self.get_user_directory(user_id)
+            text, keyboard = self._render_browse_page(chat_id, path, session.get('page', 0) if session else 0)
+            self.edit_message_text(chat_id, message_id, text, reply_markup=keyboard)
+            self.answer_callback_query(callback_query['id'], "Listing was outdated, refreshed")
+            return
+        
+        action = parts[2]
+        path, page = session['path'], session['page']
+        notice = None
+        if action == 'o':
+            entries = session.get('entries', [])
+            index = int(parts[3])
+            if index >= len(entries) or not os.path.lexists(os.path.join(path, entries[index][0])):
+                notice = "Entry no longer exists"
+            else:
+                name, entry_type, _ = entries[index]
+                target = os.path.join(path, name)
+                if entry_type == 'd':
+                    path, page = target, 0
+                else:
+                    self.answer_callback_query(callback_query['id'], f"Sending {name}")
+                    result = self.send_document(chat_id, target, f"📥 Downloaded: {name}")
+                    if not result:
+                        self.send_message(chat_id, f"{EMOJIS['error']} Failed to send file: `{name}`")
+                    return
+        elif action == 'p':
+            page = int(parts[3])
+        elif action == 'u':
+            path, page = os.path.dirname(path) or '/', 0
+        elif action == 'r':
+            session['cache'].pop(path, None)
+        elif action == 'c':
+            self.set_user_directory(user_id, path)
+            notice = f"Working directory: {path}"
+        
+        text, keyboard = self._render_browse_page(chat_id, path, page)
+        self.edit_message_text(chat_id, message_id, text, reply_markup=keyboard)
+        self.answer_callback_query(callback_query['id'], notice)
+
+    def handle_logs_command(self, chat_id: int, process_id: str, lines: int = 40):
+        """Handle /logs <id>: show the tail of a background process's log"""
+        info = self.running_bots.get(process_id)
+        if info is None or not info.get('log'):
+            self.send_message(chat_id, f"{EMOJIS['error']} No log for: `{process_id}`")
+            return
+        try:
+            with open(info['log'], 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 16 * 1024))
+                tail = f.read().decode('utf-8', errors='replace').splitlines()[-lines:]
+        except OSError as e:
+            self.send_message(chat_id, f"{EMOJIS['error']} Failed to read log: {str(e)}")
+            return
+        output = self.escape_markdown("\n".join(tail)) or "(empty)"
+        self.send_message(chat_id, f"```\n{output}\n```")
+
+    def handle_top_command(self, chat_id: int):
+        """Handle /top: latest host sample and the busiest processes"""
+        latest = self.host_metrics.latest()
+        if latest is None:
+            reason = "collecting first samples" if self.host_metrics.available else "not available on this host"
+            self.send_message(chat_id, f"{EMOJIS['info']} Host metrics {reason}")
+            return
+        
+        lines = [
+            f"CPU {latest['cpu']:.1f}%  MEM {latest['memory']:.1f}%  LOAD {latest['load']:.2f}",
+            f"DISK r {_format_rate(latest['disk_read'])} w {_format_rate(latest['disk_write'])}",
+            f"NET rx {_format_rate(latest['net_rx'])} tx {_format_rate(latest['net_tx'])}",
+            "",
+            f"{'PID':>7} {'CPU%':>6} {'RSS MB':>8}  NAME",
+        ]
+        for cpu, rss, pid, name in self.host_metrics.top:
+            lines.append(f"{pid:>7} {cpu:>6.1f} {rss / 1024 / 1024:>8.1f}  {name}")
+        output = self.escape_markdown("\n".join(lines))
+        self.send_message(chat_id, f"{EMOJIS['terminal']} *Top:*\n```\n{output}\n```")
+
+    def handle_stats_command(self, chat_id: int, window: str):
+        """Handle /stats [window]: min/avg/p95 of each metric over the window"""
+        seconds = _parse_duration(window or '1h')
+        if not seconds:
+            self.send_message(chat_id, f"{EMOJIS['error']} Usage: `/stats [window]`, e.g. `/stats 15m` or `/stats 1h`")
+            return
+        
+        samples = self.host_metrics.window(seconds)
+        if not samples['time']:
+            reason = "collecting first samples" if self.host_metrics.available else "not available on this host"
+            self.send_message(chat_id, f"{EMOJIS['info']} Host metrics {reason}")
+            return
+        
+        formats = {
+            'cpu': ('CPU %', '{:.1f}'), 'memory': ('MEM %', '{:.1f}'), 'load': ('LOAD', '{:.2f}'),
+            'disk_read': ('DISK R', None), 'disk_write': ('DISK W', None),
+            'net_rx': ('NET RX', None), 'net_tx': ('NET TX', None),
+        }
+        lines = [f"{'':<7} {'min':>11} {'avg':>11} {'p95':>11}"]
+        for column, (label, fmt) in formats.items():
+            values = sorted(samples[column])
+            stats = (values[0], sum(values) / len(values), values[min(len(values) - 1, int(0.95 * len(values)))])
+            cells = [fmt.format(value) if fmt else _format_rate(value) for value in stats]
+            lines.append(f"{label:<7} " + " ".join(f"{cell:>11}" for cell in cells))
+        
+        covered = samples['time'][-1] - samples['time'][0] + self.host_metrics.interval
+        output = self.escape_markdown("\n".join(lines))
+        self.send_message(
+            chat_id,
+            f"{EMOJIS['terminal']} *Stats over {int(covered // 60)}m* ({len(samples['time'])} samples):\n```\n{output}\n```"
+        )
+
     def get_system_info(self) -> dict:
         """Get system information"""
         try:
             import platform
-            import psutil
+            psutil = optional_import('psutil')
+            if psutil is None:
+                # Fallback without psutil
+                return {
+                    'OS': platform.system(),
+                    'Platform': platform.platform(),
+                    'Architecture': platform.architecture()[0],
+                    'Python Version': platform.python_version()
+                }
             
             info = {
                 'OS': platform.system(),
@@ -531,49 +2148,164 @@ class TelegramBot:
             
             return info
             
-        except ImportError:
-            # Fallback without psutil
-            import platform
-            return {
-                'OS': platform.system(),
-                'Platform': platform.platform(),
-                'Architecture': platform.architecture()[0],
-                'Python Version': platform.python_version()
-            }
         except Exception:
             return None
 
-    def install_package(self, package_name: str) -> Tuple[bool, str]:
-        """Install package"""
+    def split_requirements(self, specs: List[str]) -> Tuple[List[str], List[str]]:
+        """Split requirement specs into already satisfied and missing, from installed metadata
+
+        Uses packaging to check version specifiers when it is installed;
+        without it, only bare names can be recognised as satisfied.
+        """
+        requirements = optional_import('packaging.requirements')
+        satisfied, missing = [], []
+        for spec in specs:
+            if requirements is not None:
+                try:
+                    requirement = requirements.Requirement(spec)
+                except requirements.InvalidRequirement:
+                    # Let pip report the problem
+                    missing.append(spec)
+                    continue
+                if requirement.marker is not None and not requirement.marker.evaluate():
+                    satisfied.append(spec)
+                    continue
+                if requirement.extras:
+                    # Extras' own dependencies are not checked here, so leave them to pip
+                    missing.append(spec)
+                    continue
+                name, specifier = requirement.name, requirement.specifier
+            else:
+                match = re.fullmatch(r'([A-Za-z0-9][A-Za-z0-9._-]*)', spec)
+                if not match:
+                    missing.append(spec)
+                    continue
+                name, specifier = match.group(1), None
+            
+            try:
+                installed = importlib.metadata.version(name)
+            except importlib.metadata.PackageNotFoundError:
+                missing.append(spec)
+                continue
+            if specifier is None or specifier.contains(installed, prereleases=True):
+                satisfied.append(spec)
+            else:
+                missing.append(spec)
+        return satisfied, missing
+
+    def install_packages(self, specs: List[str], job: Optional[Job] = None, progress=None) -> Tuple[bool, str]:
+        """Install packages with one pip run, skipping those already satisfied
+
+        progress(line) is called with pip's output as it arrives.
+        """
+        satisfied, missing = self.split_requirements(specs)
+        if not missing:
+            return True, f"{EMOJIS['success']} Already satisfied: {', '.join(satisfied)}"
+        
+        command = [sys.executable, '-m', 'pip', 'install', '--progress-bar', 'off', '--disable-pip-version-check']
+        if os.path.isdir(WHEELHOUSE_DIR) and os.listdir(WHEELHOUSE_DIR):
+            command += ['--find-links', WHEELHOUSE_DIR]
+        command += missing
+        
         try:
-            # Try pip first
-            result = subprocess.run(
-                [sys.executable, '-m', 'pip', 'install', package_name],
-                capture_output=True, text=True, timeout=300
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                env=dict(os.environ, PIP_CACHE_DIR=PIP_CACHE_DIR),
+                start_new_session=True
             )
+            if job is not None:
+                job.process = process
+                if job.cancelled:
+                    terminate_process_group(process)
             
-            if result.returncode == 0:
-                return True, f"{EMOJIS['success']} Package installed successfully: {package_name}"
-            else:
-                # Try apt if pip fails
+            # The timeout is enforced from another thread because reading the output blocks
+            timed_out = threading.Event()
+            
+            def expire():
+                timed_out.set()
+                terminate_process_group(process)
+            
+            timer = threading.Timer(INSTALL_TIMEOUT, expire)
+            timer.start()
+            output = deque(maxlen=20)
+            try:
+                for line in process.stdout:
+                    line = line.rstrip()
+                    if line:
+                        output.append(line)
+                        if progress is not None:
+                            progress(line)
+                process.wait()
+            finally:
+                timer.cancel()
+            importlib.invalidate_caches()
+            
+            if job is not None and job.cancelled:
+                return False, f"{EMOJIS['warning']} Installation cancelled"
+            if timed_out.is_set():
+                return False, f"{EMOJIS['error']} Package installation timed out after {INSTALL_TIMEOUT} seconds"
+            if process.returncode == 0:
+                message = f"{EMOJIS['success']} Installed: {', '.join(missing)}"
+                if satisfied:
+                    message += f"\nAlready satisfied: {', '.join(satisfied)}"
+                return True, message
+            
+            # A single name pip does not know may be a system package
+            if len(missing) == 1 and shutil.which('apt-get'):
                 try:
                     apt_result = subprocess.run(
-                        ['sudo', 'apt', 'install', '-y', package_name],
-                        capture_output=True, text=True, timeout=300
+                        ['sudo', '-n', 'apt-get', 'install', '-y', missing[0]],
+                        capture_output=True, text=True, timeout=INSTALL_TIMEOUT
                     )
                     if apt_result.returncode == 0:
-                        return True, f"{EMOJIS['success']} System package installed: {package_name}"
-                except:
+                        return True, f"{EMOJIS['success']} System package installed: {missing[0]}"
+                except (OSError, subprocess.TimeoutExpired):
                     pass
-                
-                error_output = result.stderr or result.stdout or "Unknown error"
-                return False, f"{EMOJIS['error']} Package installation failed: {error_output}"
-                
-        except subprocess.TimeoutExpired:
-            return False, f"{EMOJIS['error']} Package installation timed out"
+            
+            error_output = "\n".join(output) or "Unknown error"
+            return False, f"{EMOJIS['error']} Package installation failed:\n```\n{self.escape_markdown(error_output)}\n```"
         except Exception as e:
             return False, f"{EMOJIS['error']} Package installation failed: {str(e)}"
 
+    def _run_install_job(self, job: Job, specs: List[str]) -> bool:
+        """Job target for /install, editing one status message as pip progresses"""
+        sent = self.send_message(job.chat_id, f"📦 `{job.id}`: checking {', '.join(specs)}...")
+        message_id = (sent or {}).get('result', {}).get('message_id')
+        last_update = [0.0]
+        
+        def progress(line: str):
+            # Only pip's stage lines are interesting, and Telegram rate-limits edits
+            if not line.startswith(('Collecting', 'Downloading', 'Using cached', 'Building', 'Installing')):
+                return
+            now = time.monotonic()
+            if message_id and now - last_update[0] >= INSTALL_PROGRESS_INTERVAL:
+                last_update[0] = now
+                self.edit_message_text(job.chat_id, message_id, f"📦 `{job.id}`: {self.escape_markdown(line[:200])}")
+        
+        success, message_text = self.install_packages(specs, job, progress)
+        if job.cancelled:
+            return False
+        if message_id:
+            self.edit_message_text(job.chat_id, message_id, message_text)
+        else:
+            self.send_message(job.chat_id, message_text)
+        return success
+
+    def handle_install_command(self, chat_id: int, user_id: int, args: str):
+        """Handle /install <package> [...]: queue one install job for all packages"""
+        specs = args.split()
+        if not specs or any(spec.startswith('-') for spec in specs):
+            self.send_message(chat_id, f"{EMOJIS['error']} Usage: `/install <package> [package...]` (pip options are not accepted)")
+            return
+        job = self.jobs.submit(user_id, chat_id, f"/install {' '.join(specs)}",
+                               lambda job: self._run_install_job(job, specs), priority='low', background=True)
+        if job.state == 'queued':
+            self.send_message(chat_id, f"⏳ Install queued as `{job.id}` (position {self.jobs.position(job)})")
+
     def handle_start_command(self, chat_id: int):
         """Handle /start command"""
         msg = (
@@ -585,13 +2317,21 @@ class TelegramBot:
             f"{EMOJIS['terminal']} *Available Commands:*\n"
             "• `/start` — show this message\n"
             "• `/help` — show help information\n"
+            "• `/browse [path]` — browse files with buttons\n"
             "• `/download <file_path>` — download file\n"
+            "• `/download <dir> [zip|tar|tar.gz|tar.zst] [level]` — download directory as archive\n"
             "• `/upload <path>` — set upload directory\n"
             "• `/addbot <script>` — add and run bot script\n"
             "• `/listbots` — list running bots\n"
             "• `/stopbot <id>` — stop running bot\n"
-            "• `/install <package>` — install package\n"
+            "• `/jobs` — your running and queued commands\n"
+            "• `/cancel <id>` — cancel a queued or running command\n"
+            "• `/logs <id>` — show a bot or background command's log\n"
+            "• `/install <package> [...]` — install packages in the background\n"
             "• `/sysinfo` — show system information\n"
+            "• `/top` — host load and busiest processes\n"
+            "• `/stats [window]` — host metrics summary, e.g. `/stats 1h`\n"
+            "• `/history [pattern]` — show or search your command history\n"
             "• `pwd` — show current directory\n"
             "• `cd <path>` — change directory\n\n"
             f"{EMOJIS['upload']} *File Operations:*\n"
@@ -613,18 +2353,25 @@ class TelegramBot:
             f"{EMOJIS['folder']} *Navigation:*\n"
             "• `pwd` — show current directory\n"
             "• `cd <path>` — change directory\n"
-            "• `ls` — list directory contents\n\n"
+            "• `ls` — list directory contents\n"
+            "• `/browse [path]` — browse and download with inline buttons\n\n"
             f"{EMOJIS['upload']} *File Management:*\n"
             "• Send files directly to upload\n"
             "• `/download <file>` — download files\n"
+            "• `/download <dir> [format] [level]` — download a directory as zip/tar.gz/tar.zst\n"
             "• `/upload [path]` — set upload directory\n\n"
             f"{EMOJIS['robot']} *Bot Management:*\n"
             "• `/addbot <script>` — add Python bot script\n"
             "• `/listbots` — show running bots\n"
-            "• `/stopbot <id>` — stop bot by ID\n\n"
+            "• `/stopbot <id>` — stop bot by ID\n"
+            "• `/logs <id>` — tail a bot's or background command's log\n\n"
             f"{EMOJIS['gear']} *System:*\n"
-            "• `/install <package>` — install packages\n"
-            "• `/sysinfo` — system information\n\n"
+            "• `/install <package> [...]` — install packages as a background job (`/jobs`)\n"
+            "• `/sysinfo` — system information\n"
+            "• `/top` — current load and top processes\n"
+            "• `/stats [window]` — min/avg/p95 of host metrics (default 1h)\n"
+            "• `/history` — your recent commands\n"
+            "• `/history <pattern>` — search your command history\n\n"
             f"{EMOJIS['warning']} *Safety Features:*\n"
             "• Dangerous commands are blocked\n"
             "• File size limits enforced\n"
@@ -634,11 +2381,34 @@ class TelegramBot:
             "• Each user has their own working directory\n"
             "• Commands run in isolated environment\n"
             "• Use absolute paths for system-wide access\n"
-            "• Background processes tracked automatically\n\n"
+            "• Background processes tracked automatically\n"
+            f"• Commands run one at a time per user, plus up to {MAX_BACKGROUND_JOBS_PER_USER} in the background; "
+            "see `/jobs`, stop with `/cancel <id>`\n\n"
             f"{EMOJIS['warning']} Interactive commands may not work properly"
         )
         self.send_message(chat_id, help_msg)
 
+    def handle_history_command(self, chat_id: int, user_id: int, pattern: str):
+        """Handle /history and /history <pattern>"""
+        if pattern:
+            records = self.command_history.search(user_id, pattern)
+            title = f"{EMOJIS['info']} *Commands matching* `{pattern}`:"
+        else:
+            records = self.command_history.recent(user_id)
+            title = f"{EMOJIS['info']} *Recent commands:*"
+        
+        if not records:
+            self.send_message(chat_id, f"{EMOJIS['info']} No matching commands in history")
+            return
+        
+        lines = []
+        for record in records:
+            status = EMOJIS['success'] if record.success else EMOJIS['error']
+            when = time.strftime('%m-%d %H:%M', time.localtime(record.timestamp))
+            lines.append(f"{status} {when} {record.directory}$ {record.command}")
+        history_text = self.escape_markdown("\n".join(lines))
+        self.send_message(chat_id, f"{title}\n```\n{history_text}\n```")
+
     def process_message(self, message: dict):
         """Process incoming message"""
         chat_id = message['chat']['id']
@@ -690,9 +2460,15 @@ class TelegramBot:
             success, message_text = self.stop_bot(bot_id)
             self.send_message(chat_id, message_text)
         elif text.startswith('/install '):
-            package_name = text[9:].strip()
-            success, message_text = self.install_package(package_name)
-            self.send_message(chat_id, message_text)
+            self.handle_install_command(chat_id, user_id, text[9:].strip())
+        elif text.startswith('/logs '):
+            self.handle_logs_command(chat_id, text[6:].strip())
+        elif text == '/history' or text.startswith('/history '):
+            self.handle_history_command(chat_id, user_id, text[8:].strip())
+        elif text == '/top':
+            self.handle_top_command(chat_id)
+        elif text == '/stats' or text.startswith('/stats '):
+            self.handle_stats_command(chat_id, text[6:].strip())
         elif text.startswith('/sysinfo'):
             info = self.get_system_info()
             if info:
@@ -708,16 +2484,31 @@ class TelegramBot:
         elif text == 'pwd':
             current_dir = self.get_user_directory(user_id)
             self.send_message(chat_id, f"```\n{current_dir}\n```")
+        elif text == '/browse' or text.startswith('/browse '):
+            self.handle_browse_command(chat_id, user_id, text[7:].strip())
+        elif text == '/jobs':
+            self.handle_jobs_command(chat_id, user_id)
+        elif text == '/cancel' or text.startswith('/cancel '):
+            self.handle_cancel_command(chat_id, user_id, text[8:].strip())
         else:
-            # Handle regular shell commands
+            # Handle regular shell commands through the job scheduler, in the directory they were sent from
             current_dir = self.get_user_directory(user_id)
-            success, output = self.execute_command(text, current_dir, user_id)
-            
-            if success:
-                escaped_output = self.escape_markdown(output)
-                self.send_message(chat_id, f"```\n{escaped_output}\n```")
-            else:
-                self.send_message(chat_id, output)
+            background = text.endswith('&')
+            job = self.jobs.submit(user_id, chat_id, text,
+                                   lambda job: self._run_shell_job(job, current_dir),
+                                   priority='low' if background else 'normal', background=background)
+            if job.state == 'queued':
+                self.send_message(
+                    chat_id,
+                    f"⏳ Queued as `{job.id}` (position {self.jobs.position(job)}); `/cancel {job.id}` to drop it"
+                )
+
+    def process_update(self, update: dict):
+        """Dispatch one update; shared by long polling and the webhook receiver"""
+        if 'message' in update:
+            self.process_message(update['message'])
+        elif 'callback_query' in update:
+            self.handle_callback_query(update['callback_query'])
 
     def run(self):
         """Main bot loop"""
@@ -725,32 +2516,167 @@ class TelegramBot:
         self.logger.info(f"📁 Working directory: {os.getcwd()}")
         self.logger.info("💻 Send /start to begin")
         
+        if threading.current_thread() is threading.main_thread():
+            # systemctl stop / docker stop send SIGTERM; exit through the finally below
+            signal.signal(signal.SIGTERM, self._handle_sigterm)
+        threading.Thread(target=self._snapshot_loop, name='state-snapshot', daemon=True).start()
+        threading.Thread(target=self.host_metrics.run, args=(self._stop_event,),
+                         name='host-metrics', daemon=True).start()
+        try:
+            if self.webhook_url:
+                self.run_webhook()
+            else:
+                self.run_polling()
+        finally:
+            self.save_state()
+            self.command_history.close()
+
+    def _handle_sigterm(self, signum, frame):
+        self.logger.info("SIGTERM received, shutting down")
+        self._stop_event.set()
+        server = self._webhook_server
+        if server is not None:
+            server.shutdown()
+        if self._long_polling:
+            # Nothing from this poll has been handled yet, so leave it instead of waiting
+            # up to 30s; Telegram redelivers the updates since offset was not advanced
+            raise SystemExit(0)
+
+    def _report_startup(self, phase: str):
+        report = self.startup.finish(phase)
+        if self.startup.over_target:
+            self.logger.warning(f"⏱️ Slow startup: {report}")
+        else:
+            self.logger.info(f"⏱️ Startup: {report}")
+
+    def run_polling(self):
+        """Long-poll getUpdates until stopped"""
         offset = None
         
-        while True:
+        while not self._stop_event.is_set():
             try:
-                # Get updates from Telegram
-                updates = self.get_updates(offset)
+                # Get updates from Telegram; the first poll returns at once so startup can be timed
+                ready = self.startup.ready.is_set()
+                self._long_polling = True
+                try:
+                    if self._stop_event.is_set():
+                        break
+                    updates = self.get_updates(offset, timeout=30 if ready else 0)
+                finally:
+                    self._long_polling = False
+                if not ready and updates and updates.get('ok'):
+                    self._report_startup('first poll')
                 
                 if not updates or not updates.get('ok'):
-                    time.sleep(1)
+                    self._stop_event.wait(1)
                     continue
                 
                 for update in updates.get('result', []):
                     offset = update['update_id'] + 1
-                    
-                    if 'message' not in update:
-                        continue
-                    
-                    message = update['message']
-                    self.process_message(message)
+                    self.process_update(update)
                     
             except KeyboardInterrupt:
                 self.logger.info("Bot stopped by user")
                 break
             except Exception as e:
                 self.logger.error(f"Error in main loop: {e}")
-                time.sleep(5)
+                self._stop_event.wait(5)
+
+    def run_webhook(self):
+        """Receive updates pushed by Telegram instead of polling for them"""
+        from http.server import ThreadingHTTPServer
+        from urllib.parse import urlparse
+        
+        path = urlparse(self.webhook_url).path or '/'
+        updates = queue.Queue()
+        server = ThreadingHTTPServer((WEBHOOK_LISTEN, WEBHOOK_PORT), _make_webhook_handler(self, path, updates))
+        server.daemon_threads = True
+        if WEBHOOK_CERT:
+            import ssl
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(WEBHOOK_CERT, WEBHOOK_KEY or None)
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, name='webhook-receiver', daemon=True).start()
+        # Published only once serving, since shutdown() waits for serve_forever to return
+        self._webhook_server = server
+        
+        scheme = 'https' if WEBHOOK_CERT else 'http'
+        self.logger.info(f"🌐 Webhook receiver on {scheme}://{WEBHOOK_LISTEN}:{server.server_address[1]}{path}")
+        if WEBHOOK_REGISTER and not self.set_webhook():
+            self.logger.error("Webhook registration failed; updates will not arrive until it succeeds")
+        self._report_startup('webhook')
+        
+        # Updates are handled one at a time, in arrival order, as in polling mode.
+        # Telegram retries deliveries it considers failed, so recent update ids are remembered.
+        seen = deque(maxlen=1000)
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    update = updates.get(timeout=1)
+                except queue.Empty:
+                    continue
+                update_id = update.get('update_id')
+                if update_id is not None:
+                    if update_id in seen:
+                        continue
+                    seen.append(update_id)
+                try:
+                    self.process_update(update)
+                except Exception as e:
+                    self.logger.error(f"Error processing update: {e}")
+        except KeyboardInterrupt:
+            self.logger.info("Bot stopped by user")
+        finally:
+            server.shutdown()
+            server.server_close()
+            self._webhook_server = None
+    
+    def stop(self):
+        """Ask the main loop to exit after the current poll"""
+        self._stop_event.set()
+
+
+def _make_webhook_handler(bot: TelegramBot, path: str, updates: queue.Queue):
+    """Build the request handler class for the webhook receiver"""
+    from http.server import BaseHTTPRequestHandler
+    
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            bot.logger.debug("webhook: " + format % args)
+        
+        def _reply(self, status: int):
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        
+        def do_POST(self):
+            if self.path.split('?', 1)[0] != path:
+                self._reply(404)
+                return
+            
+            token = self.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+            if not hmac.compare_digest(token.encode(), bot.webhook_secret.encode()):
+                self._reply(403)
+                return
+            
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                update = json.loads(self.rfile.read(length))
+            except (ValueError, json.JSONDecodeError):
+                self._reply(400)
+                return
+            if not isinstance(update, dict):
+                self._reply(400)
+                return
+            
+            # Acknowledge right away; slow commands must not hold Telegram's request open
+            updates.put(update)
+            self._reply(200)
+    
+    return WebhookHandler
+
+
+_MODULE_LOADED = time.perf_counter()
 
 
 def main():
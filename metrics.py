@@ -0,0 +1,196 @@
+"""
+Prometheus-style metrics
+Counters, gauges and histograms rendered in the Prometheus text exposition format
+"""
+
+import bisect
+import math
+import threading
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Fold the shards of finished threads into the retired totals once this many exist
+MAX_SHARDS = 64
+
+
+class _Metric:
+    """Base class for metrics with per-thread shards
+
+    Each thread updates its own shard without taking a lock; shards are
+    only merged when the metric is collected. Shards of threads that have
+    exited are folded into a retired shard so their values are kept.
+    """
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                if len(self._shards) >= MAX_SHARDS:
+                    self._fold_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def _fold_dead_shards(self):
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._merge_into(self._retired, shard)
+        self._shards = alive
+
+    def _merge_into(self, target, shard):
+        for key, value in list(shard.items()):
+            target[key] = target.get(key, 0) + value
+
+    def _collect(self):
+        """Get the merged values of all shards"""
+        with self._lock:
+            self._fold_dead_shards()
+            merged = dict(self._retired)
+            for _, shard in self._shards:
+                self._merge_into(merged, shard)
+        return merged
+
+    def _format_labels(self, labelvalues, extra=None):
+        pairs = list(zip(self.labelnames, labelvalues))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{name}="{_escape(str(value))}"' for name, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self._render_samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _render_samples(self):
+        for labels, value in sorted(self._collect().items()):
+            yield f'{self.name}{self._format_labels(labels)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    """Value that can go up and down, such as requests in flight"""
+
+    type_name = 'gauge'
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, labels=()):
+        shard = self._shard()
+        counts = shard.get(labels)
+        if counts is None:
+            # One slot per bucket plus +Inf, followed by the running sum
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _merge_into(self, target, shard):
+        for key, counts in list(shard.items()):
+            existing = target.get(key)
+            if existing is None:
+                target[key] = list(counts)
+            else:
+                for index, value in enumerate(counts):
+                    existing[index] += value
+
+    def _render_samples(self):
+        for labels, counts in sorted(self._collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else _format_value(bound)
+                yield f'{self.name}_bucket{self._format_labels(labels, ("le", le))} {cumulative}'
+            yield f'{self.name}_sum{self._format_labels(labels)} {_format_value(counts[-1])}'
+            yield f'{self.name}_count{self._format_labels(labels)} {cumulative}'
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class CountingIterable:
+    """Wrap a response iterable, reporting the number of bytes it produced when closed"""
+
+    def __init__(self, iterable, callback):
+        self.iterable = iterable
+        self.callback = callback
+        self.total = 0
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.total += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self.callback(self.total)
+
+
+# Global registry used by default
+REGISTRY = Registry()
@@ -0,0 +1,198 @@
+"""
+Sampling request profiler
+Records per-phase timings for a configurable fraction of requests and
+exports them as the slowest requests or as flamegraph collapsed stacks
+"""
+
+import os
+import heapq
+import random
+import threading
+import time
+from contextlib import nullcontext
+from itertools import count
+
+# Shared no-op context returned for requests that are not sampled
+_NULL_PHASE = nullcontext()
+
+# Sample rate used when the profiler is enabled without one
+DEFAULT_SAMPLE_RATE = 0.01
+
+
+class _Phase:
+    """Context manager timing one phase of a sampled request"""
+
+    __slots__ = ('trace', 'name', 'start', 'child_time', 'path')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        stack = self.trace['stack']
+        self.path = stack[-1].path + ';' + self.name
+        self.child_time = 0.0
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        stack = self.trace['stack']
+        stack.pop()
+        stack[-1].child_time += duration
+
+        # Repeated phases (e.g. one stat per directory entry) aggregate into one entry
+        totals = self.trace['phases'].get(self.path)
+        if totals is None:
+            self.trace['phases'][self.path] = [duration, duration - self.child_time, 1]
+        else:
+            totals[0] += duration
+            totals[1] += duration - self.child_time
+            totals[2] += 1
+        return False
+
+
+class _Root:
+    """Bottom of a trace's phase stack"""
+
+    __slots__ = ('path', 'child_time')
+
+    def __init__(self, name):
+        self.path = name
+        self.child_time = 0.0
+
+
+class Profiler:
+    """Samples requests and keeps their phase timings"""
+
+    def __init__(self, sample_rate=0.0, max_slow=50):
+        self.sample_rate = sample_rate
+        self.enabled = sample_rate > 0
+        self.max_slow = max_slow
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sequence = count()
+        self.reset()
+
+    def reset(self):
+        """Discard all collected samples"""
+        with self._lock:
+            self._slow = []
+            self._stacks = {}
+            self.sampled = 0
+
+    def configure(self, enabled=None, sample_rate=None, max_slow=None):
+        """Change profiler settings at runtime
+
+        Enabling without a sample rate while none is set uses DEFAULT_SAMPLE_RATE;
+        enabling with an explicit rate of 0 is rejected, as it would never sample.
+        """
+        if sample_rate is not None:
+            sample_rate = float(sample_rate)
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError('sample_rate must be between 0 and 1')
+        if max_slow is not None:
+            max_slow = max(1, int(max_slow))
+        if enabled:
+            if sample_rate == 0.0:
+                raise ValueError('sample_rate must be above 0 to enable profiling')
+            if sample_rate is None and self.sample_rate == 0.0:
+                sample_rate = DEFAULT_SAMPLE_RATE
+
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if max_slow is not None:
+                self.max_slow = max_slow
+                if len(self._slow) > max_slow:
+                    # Keep the slowest records that still fit
+                    self._slow = heapq.nlargest(max_slow, self._slow)
+                    heapq.heapify(self._slow)
+            if enabled is not None:
+                self.enabled = bool(enabled)
+
+    def start(self, name):
+        """Begin a trace for the current thread if this request is sampled"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            self._local.trace = None
+            return
+        self._local.trace = {
+            'name': name,
+            'started': time.time(),
+            'start': time.perf_counter(),
+            'stack': [_Root(name)],
+            'phases': {}
+        }
+
+    def phase(self, name):
+        """Context manager timing a phase of the current request; free when not sampled"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return _NULL_PHASE
+        return _Phase(trace, name)
+
+    def finish(self, **extra):
+        """End the current thread's trace and store it"""
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return
+        self._local.trace = None
+
+        duration = time.perf_counter() - trace['start']
+        root = trace['stack'][0]
+        record = {
+            'name': trace['name'],
+            'started': trace['started'],
+            'duration_ms': round(duration * 1000, 3),
+            'phases': [
+                {
+                    'phase': path.split(';', 1)[1],
+                    'total_ms': round(total * 1000, 3),
+                    'self_ms': round(self_time * 1000, 3),
+                    'count': calls
+                }
+                for path, (total, self_time, calls) in sorted(trace['phases'].items(), key=lambda item: -item[1][0])
+            ]
+        }
+        record.update(extra)
+
+        with self._lock:
+            self.sampled += 1
+            self._add_stack(root.path, duration - root.child_time)
+            for path, (_, self_time, _) in trace['phases'].items():
+                self._add_stack(path, self_time)
+
+            entry = (duration, next(self._sequence), record)
+            if len(self._slow) < self.max_slow:
+                heapq.heappush(self._slow, entry)
+            elif duration > self._slow[0][0]:
+                heapq.heapreplace(self._slow, entry)
+
+    def _add_stack(self, path, seconds):
+        self._stacks[path] = self._stacks.get(path, 0.0) + seconds
+
+    def slowest(self, limit=None):
+        """Get the slowest sampled requests, slowest first"""
+        with self._lock:
+            records = [record for _, _, record in sorted(self._slow, reverse=True)]
+        return records[:limit] if limit else records
+
+    def collapsed_stacks(self):
+        """Render sampled time as flamegraph collapsed stacks, in microseconds"""
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        return ''.join(f'{path} {max(0, int(seconds * 1_000_000))}\n' for path, seconds in stacks)
+
+    def status(self):
+        """Get the current settings and sample count"""
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'max_slow': self.max_slow,
+            'sampled': self.sampled
+        }
+
+
+# Global profiler; PROFILER_SAMPLE_RATE enables sampling from startup
+profiler = Profiler(sample_rate=float(os.environ.get('PROFILER_SAMPLE_RATE', '0')))
@@ -0,0 +1,342 @@
+"""
+Directory watcher
+Shares one inotify instance between all clients watching directories and
+pushes debounced, coalesced add/remove/modify changes to their subscriptions.
+Falls back to polling where inotify is not available.
+"""
+
+import os
+import stat
+import errno
+import queue
+import select
+import struct
+import threading
+import time
+
+# A burst of changes is delivered once the directory has been quiet this long...
+DEBOUNCE_SECONDS = 0.1
+# ...or at the latest this long after its first change
+MAX_DELAY_SECONDS = 1.0
+# Scan interval for the polling fallback
+POLL_INTERVAL = 1.0
+# Events queued per subscription before it is told to resync instead
+MAX_PENDING_EVENTS = 256
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class WatchError(Exception):
+    pass
+
+
+class _Inotify:
+    """Minimal ctypes binding for the Linux inotify API"""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._init1 = libc.inotify_init1
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._get_errno = ctypes.get_errno
+
+        self.fd = self._init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self._get_errno(), os.strerror(self._get_errno()))
+
+    def add_watch(self, path, mask):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            code = self._get_errno()
+            raise OSError(code, os.strerror(code), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Read pending events as (wd, mask, name) tuples"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+
+def _entry_signature(directory, name):
+    """Stat an entry the way listings do, returning a comparable tuple or None if it is gone"""
+    try:
+        entry_stat = os.stat(os.path.join(directory, name))
+    except OSError:
+        return None
+    return (entry_stat.st_ino, entry_stat.st_size, entry_stat.st_mtime_ns, entry_stat.st_mode)
+
+
+def _snapshot(directory):
+    """Map every visible entry of a directory to its signature"""
+    entries = {}
+    for name in os.listdir(directory):
+        if name.startswith('.'):
+            continue
+        signature = _entry_signature(directory, name)
+        if signature is not None:
+            entries[name] = signature
+    return entries
+
+
+def _describe(name, signature):
+    """Format a changed entry with the same fields as a compact listing"""
+    ino, size, mtime_ns, mode = signature
+    return {
+        'name': name,
+        'type': 'd' if stat.S_ISDIR(mode) else 'f',
+        'size': size,
+        'mtime': mtime_ns // 1_000_000_000,
+        'mode': mode & 0o777,
+    }
+
+
+class Subscription:
+    """One client's view of a watched directory"""
+
+    def __init__(self, path, real_path):
+        self.path = path
+        self.real_path = real_path
+        self._queue = queue.Queue(MAX_PENDING_EVENTS)
+
+    def get(self, timeout=None):
+        """Wait for the next event; raises queue.Empty on timeout"""
+        return self._queue.get(timeout=timeout)
+
+    def _deliver(self, event):
+        event = dict(event, path=self.path)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # A slow client gets one resync instead of an unbounded backlog
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put_nowait({'path': self.path, 'resync': True})
+
+
+class _Watch:
+    def __init__(self, real_path):
+        self.real_path = real_path
+        self.subscribers = []
+        self.wd = None
+        self.entries = _snapshot(real_path)
+        self.dirty = set()
+        self.resync = False
+        self.first_change = None
+        self.last_change = None
+
+    def mark(self, now, name=None):
+        if name is None:
+            self.resync = True
+        else:
+            self.dirty.add(name)
+        if self.first_change is None:
+            self.first_change = now
+        self.last_change = now
+
+    def due(self, now, debounce, max_delay):
+        if self.first_change is None:
+            return False
+        return now - self.last_change >= debounce or now - self.first_change >= max_delay
+
+    def collect(self):
+        """Turn the marked names into an event, or None if nothing visible changed"""
+        self.first_change = self.last_change = None
+        if self.resync:
+            self.resync = False
+            self.dirty.clear()
+            try:
+                self.entries = _snapshot(self.real_path)
+            except OSError:
+                self.entries = {}
+            return {'resync': True}
+
+        changes = []
+        for name in sorted(self.dirty):
+            old = self.entries.get(name)
+            new = _entry_signature(self.real_path, name)
+            if old == new:
+                continue
+            if new is None:
+                del self.entries[name]
+                changes.append({'op': 'remove', 'name': name})
+            else:
+                self.entries[name] = new
+                changes.append(dict(_describe(name, new), op='add' if old is None else 'modify'))
+        self.dirty.clear()
+        return {'changes': changes} if changes else None
+
+    def poll(self):
+        """Diff a fresh snapshot against the last one (polling backend)"""
+        try:
+            current = _snapshot(self.real_path)
+        except OSError:
+            current = {}
+        self.dirty.update(name for name in current.keys() | self.entries.keys()
+                          if current.get(name) != self.entries.get(name))
+        return self.collect() if self.dirty else None
+
+
+class DirectoryWatcher:
+    """Reference-counted directory watches shared across subscribers"""
+
+    def __init__(self, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS, poll_interval=POLL_INTERVAL):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.backend = None
+        self._inotify = None
+        self._watches = {}
+        self._by_wd = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        try:
+            self._inotify = _Inotify()
+            self.backend = 'inotify'
+        except (OSError, AttributeError):
+            self.backend = 'poll'
+        self._thread = threading.Thread(target=self._run, name='directory-watcher', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, path):
+        """Start watching a directory, returning a Subscription"""
+        real_path = os.path.realpath(path)
+        if not os.path.isdir(real_path):
+            raise WatchError('Directory does not exist' if not os.path.exists(real_path) else 'Path is not a directory')
+
+        with self._lock:
+            self._ensure_started()
+            watch = self._watches.get(real_path)
+            if watch is None:
+                try:
+                    watch = _Watch(real_path)
+                    if self._inotify is not None:
+                        watch.wd = self._inotify.add_watch(real_path, WATCH_MASK)
+                        self._by_wd[watch.wd] = watch
+                except OSError as e:
+                    if e.errno == errno.ENOSPC:
+                        raise WatchError('inotify watch limit reached (fs.inotify.max_user_watches)')
+                    raise WatchError(e.strerror or str(e))
+                self._watches[real_path] = watch
+            subscription = Subscription(path, real_path)
+            watch.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop a subscription, dropping the watch when it was the last one"""
+        with self._lock:
+            watch = self._watches.get(subscription.real_path)
+            if watch is None or subscription not in watch.subscribers:
+                return
+            watch.subscribers.remove(subscription)
+            if not watch.subscribers:
+                del self._watches[subscription.real_path]
+                if watch.wd is not None:
+                    self._by_wd.pop(watch.wd, None)
+                    self._inotify.rm_watch(watch.wd)
+
+    def status(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'watches': len(self._watches),
+                'subscriptions': sum(len(watch.subscribers) for watch in self._watches.values()),
+            }
+
+    def _run(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            with self._lock:
+                pending = any(watch.first_change is not None for watch in self._watches.values())
+            timeout = self.debounce if pending else self.poll_interval
+
+            if self._inotify is not None:
+                ready, _, _ = select.select([self._inotify.fd], [], [], timeout)
+                if ready:
+                    self._handle_events(self._inotify.read_events())
+            else:
+                time.sleep(timeout)
+                if time.monotonic() >= next_poll:
+                    next_poll = time.monotonic() + self.poll_interval
+                    self._poll()
+            self._flush()
+
+    def _handle_events(self, events):
+        now = time.monotonic()
+        with self._lock:
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    for watch in self._watches.values():
+                        watch.mark(now)
+                    continue
+                watch = self._by_wd.get(wd)
+                if watch is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    watch.mark(now)
+                elif name and not name.startswith('.'):
+                    watch.mark(now, name)
+
+    def _poll(self):
+        with self._lock:
+            for watch in self._watches.values():
+                event = watch.poll()
+                if event is not None:
+                    for subscription in watch.subscribers:
+                        subscription._deliver(event)
+
+    def _flush(self):
+        now = time.monotonic()
+        with self._lock:
+            for watch in self._watches.values():
+                if not watch.due(now, self.debounce, self.max_delay):
+                    continue
+                event = watch.collect()
+                if event is not None:
+                    for subscription in watch.subscribers:
+                        subscription._deliver(event)
+
+
+watcher = DirectoryWatcher()